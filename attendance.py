@@ -0,0 +1,240 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+# ----- Attendance Log -----
+# Recognitions are recorded into an in-memory buffer and written to the database in
+# bulk by a background thread (write-behind), so a check-in never waits on a DB write.
+# The buffer is flushed every flush_interval seconds, or sooner once max_batch entries
+# are waiting, which turns a shift-start burst into a handful of insert_many calls.
+# Repeated sightings of the same person within dedupe_window seconds are dropped.
+#
+# If the primary sink fails (e.g. MongoDB is unreachable) the batch goes to a local
+# fallback (SQLite or a JSON-lines file). It is replayed into the primary once a write
+# succeeds again.
+
+DEDUPE_WINDOW = 300.0  # Seconds during which repeat sightings of a user are ignored
+FLUSH_INTERVAL = 2.0  # Seconds between flushes
+MAX_BATCH = 500  # Entries per insert_many; reaching it triggers an early flush
+MAX_BUFFER = 100_000  # Entries kept in memory while every sink is failing; oldest dropped beyond this
+
+# ----- Sinks -----
+class MongoSink:
+    """Blocking pymongo collection."""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def write(self, records):
+        self.collection.insert_many([dict(record) for record in records], ordered=False)
+
+class AsyncMongoSink:
+    """Async (motor) collection, written from the flush thread through the owning event loop."""
+
+    def __init__(self, collection, loop, timeout=30.0):
+        self.collection = collection
+        self.loop = loop
+        self.timeout = timeout
+
+    def write(self, records):
+        coroutine = self.collection.insert_many([dict(record) for record in records], ordered=False)
+        asyncio.run_coroutine_threadsafe(coroutine, self.loop).result(self.timeout)
+
+def _to_json(record):
+    return json.dumps({**record, "timestamp": record["timestamp"].isoformat()})
+
+def _from_json(line):
+    record = json.loads(line)
+    record["timestamp"] = datetime.fromisoformat(record["timestamp"])
+    return record
+
+class JsonlSink:
+    """Append-only JSON-lines file, for running offline."""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def write(self, records):
+        with self.lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write("".join(_to_json(record) + "\n" for record in records))
+
+    def replay(self, sink):
+        """Moves everything written so far into sink. Returns the number of entries replayed."""
+        with self.lock:
+            if not os.path.exists(self.path):
+                return 0
+            with open(self.path, encoding="utf-8") as f:
+                records = [_from_json(line) for line in f if line.strip()]
+            if records:
+                sink.write(records)
+            os.remove(self.path)
+            return len(records)
+
+class SqliteSink:
+    """Local SQLite table, for running offline."""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        with self._connect() as db:
+            db.execute("CREATE TABLE IF NOT EXISTS attendance (id INTEGER PRIMARY KEY, record TEXT NOT NULL)")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, check_same_thread=False)
+
+    def write(self, records):
+        with self.lock, self._connect() as db:
+            db.executemany("INSERT INTO attendance (record) VALUES (?)", [(_to_json(record),) for record in records])
+
+    def replay(self, sink, batch_size=MAX_BATCH):
+        replayed = 0
+        with self.lock, self._connect() as db:
+            while True:
+                rows = db.execute("SELECT id, record FROM attendance ORDER BY id LIMIT ?", (batch_size,)).fetchall()
+                if not rows:
+                    return replayed
+                sink.write([_from_json(record) for _, record in rows])
+                db.execute("DELETE FROM attendance WHERE id <= ?", (rows[-1][0],))
+                db.commit()
+                replayed += len(rows)
+
+# ----- Buffer -----
+class AttendanceLog:
+    """
+    Deduplicating write-behind buffer for attendance entries.
+
+    Args:
+        sink: Primary sink (MongoSink, AsyncMongoSink, ...), anything with write(records)
+        fallback: Local sink used while the primary fails, with write() and replay(sink); None to retry from memory
+        dedupe_window (float): Seconds during which repeat sightings of a user are ignored
+        flush_interval (float): Seconds between flushes
+        max_batch (int): Entries per write; reaching it triggers an early flush
+        max_buffer (int): Entries kept in memory while writes fail
+    """
+
+    def __init__(self, sink, fallback=None, dedupe_window=DEDUPE_WINDOW, flush_interval=FLUSH_INTERVAL,
+                 max_batch=MAX_BATCH, max_buffer=MAX_BUFFER):
+        self.sink = sink
+        self.fallback = fallback
+        self.dedupe_window = dedupe_window
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.buffer = deque(maxlen=max_buffer)
+        self.last_seen = {}  # user_id -> monotonic time of the last accepted entry
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.running = False
+        self.thread = None
+        self.fallback_pending = fallback is not None  # Replay anything left over from a previous run
+        self.recorded = 0
+        self.duplicates = 0
+        self.written = 0
+        self.fallback_written = 0
+        self.failures = 0
+
+    def start(self):
+        if self.thread is None:
+            self.running = True
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        """Stops the flush thread and writes whatever is still buffered."""
+        self.running = False
+        self.wakeup.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        self.flush()
+
+    def record(self, user_id, name=None, score=None, source="single", session=None, timestamp=None):
+        """Queues one entry. Returns False if it was dropped as a repeat sighting."""
+        return self._add({"user_id": user_id, "name": name, "score": score, "source": source,
+                          "session": session, "timestamp": timestamp or datetime.now(timezone.utc)})
+
+    def record_many(self, records):
+        """Queues prebuilt entries (see group_recognition.attendance_records). Returns those accepted."""
+        return [record for record in records if self._add(record)]
+
+    def _add(self, record):
+        now = time.monotonic()
+        with self.lock:
+            last = self.last_seen.get(record["user_id"])
+            if last is not None and now - last < self.dedupe_window:
+                self.duplicates += 1
+                return False
+            self.last_seen[record["user_id"]] = now
+            self.buffer.append(record)
+            self.recorded += 1
+            if len(self.buffer) >= self.max_batch:
+                self.wakeup.set()
+        return True
+
+    def _run(self):
+        while self.running:
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        """Writes the buffer in batches of max_batch. Returns the number of entries written."""
+        written = 0
+        with self.flush_lock:
+            self._prune()
+            while True:
+                with self.lock:
+                    batch = [self.buffer.popleft() for _ in range(min(self.max_batch, len(self.buffer)))]
+                if not batch:
+                    break
+                if not self._write(batch):
+                    break
+                written += len(batch)
+        return written
+
+    def _write(self, batch):
+        try:
+            if self.fallback_pending:
+                self.written += self.fallback.replay(self.sink)
+                self.fallback_pending = False
+            self.sink.write(batch)
+            self.written += len(batch)
+            return True
+        except Exception as e:
+            self.failures += 1
+            print(f"Attendance write failed: {e}")
+        if self.fallback is not None:
+            try:
+                self.fallback.write(batch)
+                self.fallback_pending = True
+                self.fallback_written += len(batch)
+                return True
+            except Exception as e:
+                print(f"Attendance fallback write failed: {e}")
+        with self.lock:
+            self.buffer.extendleft(reversed(batch))  # Retry on the next flush
+        return False
+
+    def _prune(self):
+        cutoff = time.monotonic() - self.dedupe_window
+        with self.lock:
+            for user_id in [uid for uid, seen in self.last_seen.items() if seen < cutoff]:
+                del self.last_seen[user_id]
+
+    def stats(self):
+        with self.lock:
+            return {
+                "buffered": len(self.buffer),
+                "recorded": self.recorded,
+                "duplicates": self.duplicates,
+                "written": self.written,
+                "fallback_written": self.fallback_written,
+                "failures": self.failures,
+            }
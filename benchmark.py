@@ -0,0 +1,301 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+
+# ----- Benchmark Suite -----
+# Reproducible timings for the hot paths, written to JSON so runs can be diffed across commits:
+#   python benchmark.py                                   # everything but server, synthetic inputs
+#   python benchmark.py --sections search --gallery-size 100000
+#   python benchmark.py --images samples/ --output results/$(git rev-parse --short HEAD).json
+#
+# Sections:
+#   detection  detect + encode per resolution and detector model (HOG / CNN)
+#   search     top-1 latency and recall@1 per backend (and quantised precision) on a synthetic gallery
+#   liveness   per-frame cost of the vectorised eye-aspect-ratio update
+#   server     /recognize_face throughput and p50/p99 under concurrent load (in-process ASGI client)
+#
+# Everything runs offline: Qdrant in ":memory:" mode and mongomock_motor for the server.
+# Generated images contain no faces, so detection times are for a full scan and encoding
+# uses a fixed box; pass --images with real photos to measure the whole path. The server
+# section needs --images: without faces every /recognize_face would be a 400.
+
+RESOLUTIONS = [(640, 480), (1280, 720), (1920, 1080), (4032, 3024)]
+SEARCH_BACKENDS = ["qdrant", "flat", "flat_int8", "ivf", "hnsw", "mapped"]
+SECTIONS = ["detection", "search", "liveness", "server"]
+
+def percentiles(samples):
+    """Latency summary in milliseconds."""
+    ms = np.asarray(samples) * 1000
+    return {
+        "mean_ms": round(float(ms.mean()), 3),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "samples": len(ms),
+    }
+
+def synthetic_image(width, height, seed=0):
+    # Smooth gradients plus noise: the detector has to scan the whole image
+    rng = np.random.default_rng(seed)
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    base = (x[None, :] * 0.5 + y * 0.5)[..., None] + rng.normal(0, 20, (height, width, 3))
+    return np.clip(base, 0, 255).astype(np.uint8)
+
+def load_images(image_dir):
+    import face_recognition
+    names = sorted(name for name in os.listdir(image_dir) if name.lower().endswith((".jpg", ".jpeg", ".png")))
+    return [(name, face_recognition.load_image_file(os.path.join(image_dir, name))) for name in names]
+
+def synthetic_gallery(size, queries, dim=128, noise=0.05, seed=0):
+    """Random unit vectors plus noisy copies of some of them as queries, with exact top-1 ids."""
+    rng = np.random.default_rng(seed)
+    gallery = rng.normal(size=(size, dim)).astype(np.float32)
+    gallery /= np.linalg.norm(gallery, axis=1, keepdims=True)
+    targets = rng.choice(size, queries, replace=size < queries)
+    query_vectors = gallery[targets] + rng.normal(0, noise, (queries, dim)).astype(np.float32)
+    query_vectors /= np.linalg.norm(query_vectors, axis=1, keepdims=True)
+    truth = np.argmax(query_vectors @ gallery.T, axis=1)
+    return np.arange(1, size + 1), gallery, query_vectors, truth + 1
+
+# ----- Detection / Encoding -----
+def bench_detection(args):
+    import face_recognition
+    from face_pipeline import detect_faces
+
+    if args.images:
+        images = load_images(args.images)
+    else:
+        images = [(f"synthetic_{w}x{h}", synthetic_image(w, h)) for w, h in RESOLUTIONS]
+    models = ["hog", "cnn"] if args.cnn else ["hog"]
+    results = []
+    for model in models:
+        for name, image in images:
+            height, width = image.shape[:2]
+            detect_times, encode_times = [], []
+            faces = 0
+            for _ in range(args.repeats):
+                start = time.perf_counter()
+                boxes = detect_faces(image, model, 1.0, None)
+                detect_times.append(time.perf_counter() - start)
+                faces = len(boxes)
+                if not boxes:
+                    side = min(width, height) // 3
+                    top, left = (height - side) // 2, (width - side) // 2
+                    boxes = [(top, left + side, top + side, left)]
+                start = time.perf_counter()
+                face_recognition.face_encodings(image, known_face_locations=boxes[:1])
+                encode_times.append(time.perf_counter() - start)
+            results.append({
+                "image": name, "width": width, "height": height, "model": model, "faces": faces,
+                "detect": percentiles(detect_times), "encode": percentiles(encode_times),
+            })
+            print(f"detection {model} {name} {width}x{height}: detect p50 {results[-1]['detect']['p50_ms']} ms, "
+                  f"encode p50 {results[-1]['encode']['p50_ms']} ms")
+    return results
+
+# ----- Search -----
+def build_backend(name, ids, gallery, workdir):
+    if name == "qdrant":
+        from qdrant_client import QdrantClient
+        from qdrant_client.models import Distance, VectorParams, PointStruct
+        client = QdrantClient(location=":memory:")
+        client.create_collection("bench", vectors_config=VectorParams(size=gallery.shape[1], distance=Distance.COSINE))
+        for start in range(0, len(ids), 1024):
+            client.upsert("bench", points=[PointStruct(id=int(i), vector=v.tolist())
+                                           for i, v in zip(ids[start:start + 1024], gallery[start:start + 1024])])
+        return lambda queries: [client.query_points("bench", query=q.tolist(), limit=1).points for q in queries]
+    if name == "mapped":
+        from gallery_store import GalleryStore, MappedIndex
+        store = GalleryStore(os.path.join(workdir, "gallery"), gallery.shape[1])
+        store.append(ids, gallery)
+        index = MappedIndex(store)
+    else:
+        from embedding_index import EmbeddingIndex
+        mode, _, precision = name.partition("_")  # e.g. "flat_int8"
+        index = EmbeddingIndex(gallery.shape[1], mode, precision=precision or "float32")
+        index.add(ids, gallery)
+        index.build()
+    return lambda queries: index.search_batch(queries, 1)
+
+def bench_search(args):
+    ids, gallery, queries, truth = synthetic_gallery(args.gallery_size, args.queries, noise=args.query_noise)
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for name in args.backends:
+            try:
+                start = time.perf_counter()
+                search = build_backend(name, ids, gallery, workdir)
+                build_seconds = time.perf_counter() - start
+            except ImportError as e:
+                print(f"search {name}: skipped ({e})")
+                results.append({"backend": name, "skipped": str(e)})
+                continue
+            latencies, hits = [], 0
+            for query, expected in zip(queries, truth):
+                start = time.perf_counter()
+                points = search(query[None, :])[0]
+                latencies.append(time.perf_counter() - start)
+                hits += bool(points) and int(points[0].id) == int(expected)
+            start = time.perf_counter()
+            search(queries)
+            batch_seconds = time.perf_counter() - start
+            results.append({
+                "backend": name, "gallery_size": len(ids), "build_s": round(build_seconds, 3),
+                "recall_at_1": hits / len(queries), "single": percentiles(latencies),
+                "batch_per_query_ms": round(batch_seconds * 1000 / len(queries), 4),
+            })
+            print(f"search {name}: p50 {results[-1]['single']['p50_ms']} ms, recall@1 {results[-1]['recall_at_1']:.3f}")
+    return results
+
+# ----- Liveness -----
+def bench_liveness(args):
+    from liveness import LivenessTracker
+    rng = np.random.default_rng(0)
+    results = []
+    for faces in (1, 4, 16):
+        tracker = LivenessTracker()
+        boxes = [(100 * i, 100 * i + 80, 100 * i + 80, 100 * i) for i in range(faces)]
+        eyes = rng.uniform(0, 80, (args.frames, faces, 2, 6, 2))
+        times = []
+        for frame_eyes in eyes:
+            start = time.perf_counter()
+            tracker.update(boxes, frame_eyes)
+            times.append(time.perf_counter() - start)
+        results.append({"faces": faces, "update": percentiles(times)})
+        print(f"liveness {faces} face(s): p50 {results[-1]['update']['p50_ms']} ms")
+    return results
+
+# ----- End-to-end Server -----
+async def bench_server(args):
+    import httpx
+    import cv2
+    import face_detection_web_server as server
+    from embedding_cache import EmbeddingCache
+    from qdrant_client.models import PointStruct
+
+    server.IN_MEMORY_BACKENDS = True
+    server.SEARCH_BACKEND = "qdrant"
+    server.WORKER_MODE = args.worker_mode
+    server.MAX_PENDING_JOBS = max(server.MAX_PENDING_JOBS, args.concurrency * 2)
+    if not args.server_cache:
+        server.embedding_cache = EmbeddingCache(max_entries=0)  # Measure the real encode path every time
+
+    images = [image for _, image in load_images(args.images)]
+    uploads = [cv2.imencode(".jpg", cv2.cvtColor(image, cv2.COLOR_RGB2BGR))[1].tobytes() for image in images]
+
+    results = []
+    async with server.lifespan(server.app):
+        ids, gallery, _, _ = synthetic_gallery(args.server_gallery_size, 1)
+        for start in range(0, len(ids), 1024):
+            await server.data_access.upsert_points([
+                PointStruct(id=int(i), vector=v.tolist(), payload={"name": f"user{i}"})
+                for i, v in zip(ids[start:start + 1024], gallery[start:start + 1024])
+            ])
+        for i in ids:
+            await server.data_access.save_user({"_id": int(i), "name": f"user{i}", "prn_no": str(i), "face_image": None})
+
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            endpoints = [
+                ("GET /cache_stats", lambda n: client.get("/cache_stats")),
+                ("POST /recognize_face", lambda n: client.post(
+                    "/recognize_face", files={"file": ("face.jpg", uploads[n % len(uploads)], "image/jpeg")})),
+            ]
+            for label, send in endpoints:
+                await send(0)  # Warm-up
+                latencies, statuses = [], {}  # Latencies of 200 responses only, errors are counted apart
+                semaphore = asyncio.Semaphore(args.concurrency)
+
+                async def one(n):
+                    async with semaphore:
+                        start = time.perf_counter()
+                        response = await send(n)
+                        if response.status_code == 200:
+                            latencies.append(time.perf_counter() - start)
+                        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+                start = time.perf_counter()
+                await asyncio.gather(*(one(n) for n in range(args.requests)))
+                elapsed = time.perf_counter() - start
+                errors = args.requests - len(latencies)
+                results.append({
+                    "endpoint": label, "concurrency": args.concurrency, "requests": args.requests,
+                    "throughput_rps": round(len(latencies) / elapsed, 2),
+                    "latency": percentiles(latencies) if latencies else None, "errors": errors,
+                    "status_codes": {str(code): count for code, count in sorted(statuses.items())},
+                })
+                if not latencies:
+                    print(f"server {label}: no successful responses, status codes {results[-1]['status_codes']}")
+                    continue
+                print(f"server {label}: {results[-1]['throughput_rps']} req/s, "
+                      f"p50 {results[-1]['latency']['p50_ms']} ms, p99 {results[-1]['latency']['p99_ms']} ms"
+                      + (f", {errors} errors {results[-1]['status_codes']}" if errors else ""))
+    return results
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark detection, encoding, search and the web server")
+    parser.add_argument("--sections", default=None,
+                        help=f"Comma-separated subset of {SECTIONS} (default: all, server only with --images)")
+    parser.add_argument("--images", default=None,
+                        help="Directory of sample photos (default: generated images; required for server)")
+    parser.add_argument("--repeats", type=int, default=5, help="Detection/encoding repetitions per image")
+    parser.add_argument("--cnn", action="store_true", help="Also time the CNN detector (slow without a GPU)")
+    parser.add_argument("--gallery-size", type=int, default=10_000, help="Synthetic gallery size for search")
+    parser.add_argument("--queries", type=int, default=500, help="Search queries per backend")
+    parser.add_argument("--query-noise", type=float, default=0.05, help="Noise added to gallery vectors to form queries")
+    parser.add_argument("--backends", default=",".join(SEARCH_BACKENDS), help=f"Comma-separated subset of {SEARCH_BACKENDS}")
+    parser.add_argument("--frames", type=int, default=500, help="Frames per liveness run")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per server endpoint")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent server clients")
+    parser.add_argument("--server-gallery-size", type=int, default=1000, help="Users enrolled before the server run")
+    parser.add_argument("--worker-mode", default="process", choices=["process", "thread"])
+    parser.add_argument("--server-cache", action="store_true", help="Keep the embedding cache on for the server run")
+    parser.add_argument("--output", default="benchmark_results.json")
+    args = parser.parse_args()
+    args.backends = [name for name in args.backends.split(",") if name]
+    if args.sections is None:
+        args.sections = ",".join(section for section in SECTIONS if args.images or section != "server")
+    elif "server" in args.sections.split(",") and not args.images:
+        parser.error("The server section needs --images with face photos; generated images contain no faces")
+
+    results = {"environment": environment(), "settings": vars(args)}
+    for section in [name for name in args.sections.split(",") if name]:
+        if section == "detection":
+            results["detection"] = bench_detection(args)
+        elif section == "search":
+            results["search"] = bench_search(args)
+        elif section == "liveness":
+            results["liveness"] = bench_liveness(args)
+        elif section == "server":
+            results["server"] = asyncio.run(bench_server(args))
+        else:
+            parser.error(f"Unknown section: {section}")
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
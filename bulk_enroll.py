@@ -0,0 +1,194 @@
+import argparse
+import contextlib
+import csv
+import io
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from qdrant_client.models import PointStruct
+from pymongo import ReplaceOne
+from core import configure_cloudinary, mongo_client, qdrant_collection
+from enrollment import parse_user_id
+from face_pipeline import decode_image, encode_face, crop_face, encode_jpeg
+from gallery_sync import ChangeLog
+from worker_pool import preload_models
+
+# ----- Bulk Enrollment -----
+# Enrolls a whole directory (or CSV manifest) of photos in one go:
+#   python bulk_enroll.py photos/                 # files named <user_id>_<prn_no>_<name>.jpg
+#   python bulk_enroll.py students.csv            # columns: image,user_id,name,prn_no
+#
+# Faces are encoded across a process pool, crops are uploaded to Cloudinary concurrently,
+# and each batch is written with one Qdrant upsert and one Mongo bulk_write. Finished
+# images are recorded in a checkpoint file, so an interrupted run can simply be restarted.
+# Images that fail are listed with the reason in a CSV report.
+
+# ----- Configuration -----
+QDRANT_URL = "<URL>"  # Update with actual URL
+API_KEY = "<API_key>"  # Replace with your API key
+MONGO_URI = ""  # MongoDB connection URI
+DB_NAME = "FaceDB"
+COLLECTION_NAME = "face_attendance"
+VECTOR_DIM = 128  # face_recognition embeddings
+
+CLOUDINARY_CONFIG = {"cloud_name": "", "api_key": "", "api_secret": "", "secure": True}  # Applied before the first upload
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+# ----- Input -----
+def read_manifest(source):
+    """Returns a list of dicts with image, user_id, name and prn_no."""
+    if os.path.isdir(source):
+        entries = []
+        for filename in sorted(os.listdir(source)):
+            stem, ext = os.path.splitext(filename)
+            if ext.lower() not in IMAGE_EXTENSIONS:
+                continue
+            parts = stem.split("_", 2)
+            entry = {"image": os.path.join(source, filename)}
+            if len(parts) == 3:
+                entry.update(user_id=parts[0], prn_no=parts[1], name=parts[2].replace("_", " "))
+            entries.append(entry)
+        return entries
+    base_dir = os.path.dirname(os.path.abspath(source))
+    with open(source, newline="") as f:
+        entries = list(csv.DictReader(f))
+    for entry in entries:
+        entry["image"] = os.path.join(base_dir, entry["image"])
+    return entries
+
+def validate_entry(entry):
+    if not entry.get("name", "").strip():
+        return "Name cannot be empty"
+    try:
+        parse_user_id(entry.get("user_id", ""))
+    except ValueError as e:
+        return str(e)
+    return None
+
+# ----- Worker -----
+def encode_image_file(path):
+    """Runs in the process pool: returns (embedding as list, JPEG bytes of the face crop)."""
+    with open(path, "rb") as f:
+        image = decode_image(f.read())
+    embedding, face_location = encode_face(image)
+    return embedding.tolist(), encode_jpeg(crop_face(image, face_location))
+
+# ----- Checkpoint / Report -----
+def load_checkpoint(path):
+    if not os.path.exists(path):
+        return set()
+    with open(path) as f:
+        return set(json.load(f)["done"])
+
+def save_checkpoint(path, done):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"done": sorted(done)}, f)
+    os.replace(tmp_path, path)
+
+def write_report(path, failures):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["image", "user_id", "error"])
+        writer.writerows(failures)
+
+# ----- Enrollment -----
+class BulkEnroller:
+    def __init__(self, qdrant_client, users_collection, upload=True, upload_concurrency=8, change_log=None):
+        self.qdrant_client = qdrant_client
+        self.users_collection = users_collection
+        self.change_log = change_log  # Lets running servers pull the new faces (see gallery_sync.py)
+        self.upload = upload
+        self.uploader = ThreadPoolExecutor(max_workers=upload_concurrency)
+
+    def upload_crop(self, jpeg):
+        import cloudinary.uploader
+        configure_cloudinary(**CLOUDINARY_CONFIG)
+        return cloudinary.uploader.upload(io.BytesIO(jpeg))["secure_url"]
+
+    def write_batch(self, batch, failures):
+        """Uploads crops concurrently, then stores the batch. Returns the images written."""
+        urls = [None] * len(batch)
+        if self.upload:
+            futures = {self.uploader.submit(self.upload_crop, jpeg): i for i, (_, _, jpeg) in enumerate(batch)}
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    urls[i] = future.result()
+                except Exception as e:
+                    entry = batch[i][0]
+                    failures.append((entry["image"], entry["user_id"], f"Upload failed: {e}"))
+        stored = [(entry, embedding, url) for (entry, embedding, _), url in zip(batch, urls)
+                  if url is not None or not self.upload]
+        if not stored:
+            return []
+
+        points = [PointStruct(id=int(entry["user_id"]), vector=embedding, payload={"name": entry["name"]})
+                  for entry, embedding, _ in stored]
+        users = [{"_id": int(entry["user_id"]), "name": entry["name"], "prn_no": entry.get("prn_no", ""),
+                  "face_image_url": url}
+                 for entry, _, url in stored]
+        recording = self.change_log.recording(points=points, users=users) if self.change_log else contextlib.nullcontext()
+        with recording:
+            self.qdrant_client.upsert(collection_name=COLLECTION_NAME, points=points, wait=True)
+            # Replace-with-upsert keeps re-runs after a crash idempotent
+            self.users_collection.bulk_write([ReplaceOne({"_id": user["_id"]}, user, upsert=True) for user in users],
+                                             ordered=False)
+        return [entry["image"] for entry, _, _ in stored]
+
+    def run(self, entries, checkpoint_path, workers=None, batch_size=256):
+        done = load_checkpoint(checkpoint_path)
+        failures = []
+        pending = []
+        for entry in entries:
+            if entry["image"] in done:
+                continue
+            error = validate_entry(entry)
+            if error:
+                failures.append((entry["image"], entry.get("user_id", ""), error))
+            else:
+                pending.append(entry)
+        print(f"{len(done)} already enrolled, {len(pending)} to encode, {len(failures)} invalid")
+
+        batch = []
+        with ProcessPoolExecutor(max_workers=workers, initializer=preload_models) as pool:
+            futures = {pool.submit(encode_image_file, entry["image"]): entry for entry in pending}
+            for count, future in enumerate(as_completed(futures), 1):
+                entry = futures[future]
+                try:
+                    embedding, jpeg = future.result()
+                    batch.append((entry, embedding, jpeg))
+                except Exception as e:
+                    failures.append((entry["image"], entry["user_id"], str(e)))
+                if len(batch) >= batch_size or (count == len(futures) and batch):
+                    done.update(self.write_batch(batch, failures))
+                    save_checkpoint(checkpoint_path, done)
+                    batch = []
+                    print(f"{count}/{len(futures)} encoded, {len(done)} enrolled, {len(failures)} failed")
+        self.uploader.shutdown()
+        return done, failures
+
+def main():
+    parser = argparse.ArgumentParser(description="Enroll a directory or CSV manifest of face photos")
+    parser.add_argument("source", help="Directory of <user_id>_<prn_no>_<name>.jpg files or CSV manifest")
+    parser.add_argument("--workers", type=int, default=None, help="Encoding processes (default: CPU count)")
+    parser.add_argument("--batch-size", type=int, default=256, help="Points per Qdrant/Mongo write")
+    parser.add_argument("--upload-concurrency", type=int, default=8, help="Parallel Cloudinary uploads")
+    parser.add_argument("--no-upload", action="store_true", help="Skip uploading face crops")
+    parser.add_argument("--checkpoint", default="bulk_enroll_checkpoint.json")
+    parser.add_argument("--report", default="bulk_enroll_failures.csv")
+    args = parser.parse_args()
+
+    qdrant_client = qdrant_collection(QDRANT_URL, API_KEY, COLLECTION_NAME, VECTOR_DIM)
+    database = mongo_client(MONGO_URI)[DB_NAME]
+    users_collection = database["users"]
+
+    enroller = BulkEnroller(qdrant_client, users_collection, not args.no_upload, args.upload_concurrency,
+                            ChangeLog(database))
+    done, failures = enroller.run(read_manifest(args.source), args.checkpoint, args.workers, args.batch_size)
+    write_report(args.report, failures)
+    print(f"Done: {len(done)} enrolled, {len(failures)} failed (see {args.report})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+import threading
+import time
+from collections import deque, namedtuple
+import cv2
+import numpy as np
+
+# ----- Shared Camera Service -----
+# Opening a camera takes hundreds of milliseconds and the first frames are badly exposed,
+# so instead of opening the device per request, one CameraManager owns it for the life of
+# the process. A reader thread keeps the newest frames in a small ring buffer and every
+# consumer gets the same read-only array (no copies). If the device disconnects, the
+# reader keeps retrying. Sources can be a camera index, a video file or a SyntheticSource.
+
+Snapshot = namedtuple("Snapshot", ["frame_id", "timestamp", "image"])
+
+class SyntheticSource:
+    """Generates moving test frames, for running without a camera. Mimics cv2.VideoCapture."""
+
+    def __init__(self, width=640, height=480, fps=30):
+        self.width = width
+        self.height = height
+        self.interval = 1.0 / fps
+        self.count = 0
+        self.next_time = time.monotonic()
+
+    def isOpened(self):
+        return True
+
+    def read(self):
+        delay = self.next_time - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        self.next_time = max(self.next_time + self.interval, time.monotonic())
+        self.count += 1
+        x = np.arange(self.width, dtype=np.uint16)
+        row = ((x + self.count * 4) % 256).astype(np.uint8)
+        image = np.repeat(np.repeat(row[None, :, None], self.height, axis=0), 3, axis=2)
+        cv2.putText(image, f"frame {self.count}", (20, 40), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
+        return True, image
+
+    def release(self):
+        pass
+
+class CameraManager:
+    """
+    Owns one capture device and continuously buffers its latest frames.
+
+    Args:
+        source: Camera index, video file path, or an object with read()/release() (e.g. SyntheticSource)
+        buffer_size (int): Frames kept in the ring buffer
+        warmup_frames (int): Frames discarded after (re)opening while exposure settles
+        loop_video (bool): Restart video files when they end
+        reconnect_delay (float): Initial wait before reopening a failed device (doubles up to 5s)
+    """
+
+    def __init__(self, source=0, buffer_size=4, warmup_frames=5, loop_video=True, reconnect_delay=0.5):
+        self.source = source
+        self.warmup_frames = warmup_frames
+        self.loop_video = loop_video
+        self.reconnect_delay = reconnect_delay
+        self.buffer = deque(maxlen=buffer_size)
+        self.cond = threading.Condition()
+        self.thread = None
+        self.running = False
+        self.connected = False
+        self.frame_id = 0
+        self.reconnects = 0
+
+    def start(self):
+        if self.thread is None or not self.thread.is_alive():
+            self.running = True
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join(timeout=2)
+
+    def _open(self):
+        if isinstance(self.source, (int, str)):
+            return cv2.VideoCapture(self.source)
+        return self.source
+
+    def _run(self):
+        delay = self.reconnect_delay
+        while self.running:
+            cap = self._open()
+            if not cap.isOpened():
+                self._disconnected(cap)
+                time.sleep(delay)
+                delay = min(delay * 2, 5.0)
+                continue
+            delay = self.reconnect_delay
+            skipped = 0
+            while self.running:
+                ret, image = cap.read()
+                if not ret:
+                    break  # Device unplugged or video ended, reopen
+                if skipped < self.warmup_frames:
+                    skipped += 1
+                    continue
+                image.flags.writeable = False  # Shared with every consumer, never mutated
+                with self.cond:
+                    self.frame_id += 1
+                    self.buffer.append(Snapshot(self.frame_id, time.time(), image))
+                    self.connected = True
+                    self.cond.notify_all()
+            self._disconnected(cap)
+            if isinstance(self.source, str) and not self.loop_video:
+                break
+
+    def _disconnected(self, cap):
+        if cap is not self.source:
+            cap.release()
+        with self.cond:
+            if self.connected:
+                self.reconnects += 1
+            self.connected = False
+
+    def latest(self):
+        """Newest buffered snapshot or None. The image is read-only; copy it before drawing on it."""
+        with self.cond:
+            return self.buffer[-1] if self.buffer else None
+
+    def wait_for_frame(self, after_id=0, timeout=2.0):
+        """Waits for a snapshot newer than after_id. Returns None on timeout."""
+        self.start()
+        with self.cond:
+            self.cond.wait_for(lambda: self.buffer and self.buffer[-1].frame_id > after_id, timeout)
+            if self.buffer and self.buffer[-1].frame_id > after_id:
+                return self.buffer[-1]
+            return None
+
+    def frames(self):
+        """All buffered snapshots, oldest first."""
+        with self.cond:
+            return list(self.buffer)
+
+_cameras = {}
+_cameras_lock = threading.Lock()
+
+def get_camera(source=0, **kwargs):
+    """Process-wide CameraManager per source, started on first use."""
+    key = source if isinstance(source, (int, str)) else id(source)
+    with _cameras_lock:
+        camera = _cameras.get(key)
+        if camera is None:
+            camera = _cameras[key] = CameraManager(source, **kwargs)
+        return camera.start()
+
+def stop_cameras():
+    with _cameras_lock:
+        for camera in _cameras.values():
+            camera.stop()
+        _cameras.clear()
@@ -0,0 +1,130 @@
+import importlib
+import threading
+import time
+
+# ----- Shared Models and Clients -----
+# Importing a module of this project must not touch the network or load models, so tools,
+# tests and freshly forked workers start in milliseconds without live services. Heavy
+# objects are created here on first use instead, once per process, and shared by every
+# module that asks for them:
+#
+#   face_recognition     - the module itself; importing it loads the dlib detector and
+#                          encoder models (about 100 MB, 1-2 s)
+#   shape_predictor()    - dlib's 68-point landmark model
+#   qdrant_client()      - one client per URL; qdrant_collection() also creates the
+#                          collection on first use
+#   mongo_client()       - one pooled client per URI
+#   configure_cloudinary - applied once, right before the first upload
+#
+# Servers call warm_up() at startup (FastAPI lifespan) so the first request does not pay
+# for the models. When it runs before worker processes are forked (gunicorn with
+# preload_app, see gunicorn.conf.py), the workers share the loaded model pages
+# copy-on-write instead of each loading its own copy. The web server's encode pool gets
+# the same from a fork server that preloads the models (see worker_pool.py).
+
+SHAPE_PREDICTOR_PATH = "shape_predictor_68_face_landmarks.dat"
+
+class LazyModule:
+    """Stands in for a module and imports it on first attribute access."""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)  # The import lock serialises concurrent first uses
+        return getattr(self._module, attr)
+
+class Lazy:
+    """
+    Builds factory() on first use and forwards attribute access to the result.
+
+    Lets module-level clients keep their names (users_collection.find_one(...)) while
+    being created only when something actually uses them.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._value = None
+        self._lock = threading.Lock()
+
+    def instance(self):
+        if self._value is None:
+            with self._lock:
+                if self._value is None:
+                    self._value = self._factory()
+        return self._value
+
+    @property
+    def loaded(self):
+        return self._value is not None
+
+    def __getattr__(self, attr):
+        return getattr(self.instance(), attr)
+
+face_recognition = LazyModule("face_recognition")
+
+_shared = {}
+_shared_lock = threading.RLock()  # Re-entrant: factories may use other shared objects
+
+def shared(key, factory):
+    """Returns the process-wide object for key, calling factory() the first time."""
+    value = _shared.get(key)
+    if value is None:
+        with _shared_lock:
+            value = _shared.get(key)
+            if value is None:
+                value = _shared[key] = factory()
+    return value
+
+def shape_predictor(path=SHAPE_PREDICTOR_PATH):
+    import dlib
+    return shared(("shape_predictor", path), lambda: dlib.shape_predictor(path))
+
+def face_detector():
+    import dlib
+    return shared("face_detector", dlib.get_frontal_face_detector)
+
+def qdrant_client(url, api_key=None):
+    from qdrant_client import QdrantClient
+    return shared(("qdrant", url, api_key), lambda: QdrantClient(url=url, api_key=api_key or None))
+
+def qdrant_collection(url, api_key, collection_name, vector_dim):
+    """The shared client for url, after making sure the collection exists (checked once per process)."""
+    def ensure():
+        from qdrant_client.models import Distance, VectorParams
+        client = qdrant_client(url, api_key)
+        if not client.collection_exists(collection_name):
+            client.create_collection(
+                collection_name=collection_name,
+                vectors_config=VectorParams(size=vector_dim, distance=Distance.COSINE),
+            )
+        return client
+    return shared(("qdrant_collection", url, api_key, collection_name), ensure)
+
+def mongo_client(uri):
+    from pymongo import MongoClient
+    return shared(("mongo", uri), lambda: MongoClient(uri))
+
+def configure_cloudinary(**config):
+    def configure():
+        import cloudinary
+        cloudinary.config(**config)
+        return True
+    shared(("cloudinary",) + tuple(sorted(config.items())), configure)
+
+def warm_up(landmarks=False):
+    """
+    Loads the face models and runs one tiny detection, so the first real request does
+    not pay for it. Returns the seconds spent.
+
+    Args:
+        landmarks (bool): Also load the dlib shape predictor (liveness checks)
+    """
+    import numpy as np
+    start = time.perf_counter()
+    face_recognition.face_locations(np.zeros((32, 32, 3), dtype=np.uint8))
+    if landmarks:
+        shape_predictor()
+    return time.perf_counter() - start
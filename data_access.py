@@ -0,0 +1,173 @@
+import threading
+from collections import OrderedDict
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.models import (Distance, VectorParams, QueryRequest, PointIdsList, ScalarQuantization,
+                                  ScalarQuantizationConfig, ScalarType)
+from enrollment import user_id_of
+from gallery_sync import AsyncChangeLog
+
+# ----- Shared Data Access Layer -----
+# One place that owns the pooled async Qdrant and MongoDB clients. User records are kept
+# in an in-process cache keyed by point id (optionally preloaded at startup), so a
+# recognition is one vector query followed by a memory lookup instead of two sequential
+# network calls. For tests, DataAccess.in_memory() runs against Qdrant's ":memory:" mode
+# and mongomock_motor. Writes are also recorded in the gallery change log, so other
+# processes can pull them into their own caches (see gallery_sync.py).
+
+class UserCache:
+    """Thread-safe LRU of user records keyed by Qdrant point id."""
+
+    def __init__(self, max_entries=100_000):
+        self.max_entries = max_entries
+        self.users = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, point_id):
+        with self.lock:
+            user = self.users.get(point_id)
+            if user is None:
+                self.misses += 1
+                return None
+            self.users.move_to_end(point_id)
+            self.hits += 1
+            return user
+
+    def put(self, point_id, user):
+        with self.lock:
+            self.users[point_id] = user
+            self.users.move_to_end(point_id)
+            while len(self.users) > self.max_entries:
+                self.users.popitem(last=False)
+
+    def invalidate(self, point_id):
+        with self.lock:
+            self.users.pop(point_id, None)
+
+    def __len__(self):
+        return len(self.users)
+
+def find_user(users_collection, user_cache, point_id):
+    """Blocking lookup for the desktop app: cache first, MongoDB on a miss."""
+    user = user_cache.get(point_id)
+    if user is None:
+        user = users_collection.find_one({"_id": point_id})
+        if user is not None:
+            user_cache.put(point_id, user)
+    return user
+
+class DataAccess:
+    """
+    Async, pooled access to the face collection and the users collection.
+
+    Args:
+        collection_name (str): Qdrant collection holding the face embeddings
+        qdrant_client (AsyncQdrantClient): Pre-built client, or built from qdrant_url/api_key/location
+        mongo_db: Pre-built async database handle (motor or mongomock_motor), or built from mongo_uri/db_name
+        mongo_pool_size (int): Max pooled MongoDB connections
+        user_cache_size (int): Max cached user records
+    """
+
+    def __init__(self, collection_name, qdrant_client=None, mongo_db=None, qdrant_url=None, api_key=None,
+                 qdrant_location=None, mongo_uri=None, db_name="FaceDB", mongo_pool_size=50,
+                 user_cache_size=100_000):
+        self.collection_name = collection_name
+        if qdrant_client is None:
+            if qdrant_location:
+                qdrant_client = AsyncQdrantClient(location=qdrant_location)
+            else:
+                qdrant_client = AsyncQdrantClient(url=qdrant_url, api_key=api_key)
+        if mongo_db is None:
+            from motor.motor_asyncio import AsyncIOMotorClient
+            mongo_db = AsyncIOMotorClient(mongo_uri, maxPoolSize=mongo_pool_size)[db_name]
+        self.qdrant = qdrant_client
+        self.mongo_db = mongo_db
+        self.users = mongo_db["users"]
+        self.attendance = mongo_db["attendance"]
+        self.change_log = AsyncChangeLog(mongo_db)
+        self.user_cache = UserCache(user_cache_size)
+
+    @classmethod
+    def in_memory(cls, collection_name="face_attendance"):
+        """Local stand-ins for tests: Qdrant ":memory:" and mongomock_motor."""
+        from mongomock_motor import AsyncMongoMockClient
+        return cls(collection_name, AsyncQdrantClient(location=":memory:"), AsyncMongoMockClient()["FaceDB"])
+
+    async def ensure_collection(self, vector_dim=128, quantize=False):
+        """Creates the collection if missing; quantize keeps int8 copies of the vectors in RAM for search."""
+        if not await self.qdrant.collection_exists(self.collection_name):
+            quantization = None
+            if quantize:
+                quantization = ScalarQuantization(scalar=ScalarQuantizationConfig(type=ScalarType.INT8, always_ram=True))
+            await self.qdrant.create_collection(
+                collection_name=self.collection_name,
+                vectors_config=VectorParams(size=vector_dim, distance=Distance.COSINE),
+                quantization_config=quantization,
+            )
+
+    async def warm_user_cache(self, limit=None):
+        """Loads user records into the cache so lookups never leave the process. Returns the count."""
+        count = 0
+        cursor = self.users.find({})
+        if limit:
+            cursor = cursor.limit(limit)
+        async for user in cursor:
+            self.user_cache.put(user["_id"], user)
+            count += 1
+        return count
+
+    # ----- Reads -----
+    async def get_user(self, point_id):
+        user = self.user_cache.get(point_id)
+        if user is None:
+            user = await self.users.find_one({"_id": point_id})
+            if user is not None:
+                self.user_cache.put(point_id, user)
+        return user
+
+    async def search_batch(self, embeddings, limit=1):
+        """One batched vector query. Returns the scored points for each embedding."""
+        responses = await self.qdrant.query_batch_points(
+            collection_name=self.collection_name,
+            requests=[QueryRequest(query=embedding.tolist(), limit=limit, with_payload=True) for embedding in embeddings],
+        )
+        return [response.points for response in responses]
+
+    async def identify(self, points, threshold=None):
+        """
+        Best match and its user record in one step.
+
+        Args:
+            points (list): Scored points for one query, best first (search_batch, a local
+                index or the recognition batcher)
+
+        Returns:
+            (best_match, user): scored point and user record, or (None, None) if nothing passed
+        """
+        if not points or (threshold is not None and points[0].score <= threshold):
+            return None, None
+        return points[0], await self.get_user(user_id_of(points[0].id))
+
+    # ----- Writes -----
+    async def upsert_points(self, points):
+        async with self.change_log.recording(points=points):  # Stamps the payload versions
+            return await self.qdrant.upsert(collection_name=self.collection_name, points=points)
+
+    async def delete_points(self, point_ids):
+        if point_ids:
+            async with self.change_log.recording(deleted_points=point_ids):
+                await self.qdrant.delete(collection_name=self.collection_name,
+                                         points_selector=PointIdsList(points=point_ids))
+
+    async def save_user(self, user):
+        # Replaces the record when a user is enrolled again
+        async with self.change_log.recording(users=[user]):
+            await self.users.replace_one({"_id": user["_id"]}, user, upsert=True)
+        self.user_cache.put(user["_id"], user)
+
+    async def close(self):
+        await self.qdrant.close()
+        client = getattr(self.mongo_db, "client", None)
+        if client is not None:
+            client.close()
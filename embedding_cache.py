@@ -0,0 +1,127 @@
+import hashlib
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+
+# ----- Content-addressed Embedding Cache -----
+# Kiosks and retries keep resubmitting the very same photo. Keyed by a hash of the raw
+# image bytes, this cache returns the stored face boxes/embeddings instead of re-running
+# dlib. The memory tier is LRU, bounded by entry count and bytes; an optional disk tier
+# keeps entries across restarts. stats() reports hit rate and the CPU time saved.
+
+class EmbeddingCache:
+    """
+    LRU cache of expensive per-image results.
+
+    Args:
+        max_entries (int): Memory tier entry limit
+        max_bytes (int): Memory tier size limit (numpy arrays are counted by nbytes)
+        disk_dir (str): Directory for the optional on-disk tier, None to disable
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=64 * 1024 * 1024, disk_dir=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+        self.entries = OrderedDict()  # key -> (value, nbytes, cost_seconds)
+        self.bytes = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+    @staticmethod
+    def key(data):
+        return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                self.saved_seconds += entry[2]
+                return entry[0]
+        entry = self._read_disk(key)
+        with self.lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self.saved_seconds += entry[2]
+            self._store(key, entry)
+        return entry[0]
+
+    def put(self, key, value, cost_seconds=0.0):
+        entry = (value, _size_of(value), cost_seconds)
+        with self.lock:
+            self._store(key, entry)
+        self._write_disk(key, entry)
+
+    def get_or_compute(self, data, compute):
+        """Returns compute() for these bytes, running it only on a cache miss."""
+        key = self.key(data)
+        value = self.get(key)
+        if value is None:
+            start = time.perf_counter()
+            value = compute()
+            self.put(key, value, time.perf_counter() - start)
+        return value
+
+    def _store(self, key, entry):
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.bytes -= old[1]
+        self.entries[key] = entry
+        self.bytes += entry[1]
+        while self.entries and (len(self.entries) > self.max_entries or self.bytes > self.max_bytes):
+            _, evicted = self.entries.popitem(last=False)
+            self.bytes -= evicted[1]
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, key[:2], key + ".pkl")
+
+    def _read_disk(self, key):
+        if not self.disk_dir:
+            return None
+        try:
+            with open(self._disk_path(key), "rb") as f:
+                return pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+
+    def _write_disk(self, key, entry):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                "saved_seconds": round(self.saved_seconds, 3),
+                "entries": len(self.entries),
+                "bytes": self.bytes,
+            }
+
+def _size_of(value):
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (tuple, list)):
+        return sum(_size_of(item) for item in value) + 64
+    return 64
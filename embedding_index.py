@@ -0,0 +1,342 @@
+from collections import namedtuple
+import numpy as np
+
+# ----- Local Embedding Index -----
+# In-process cosine search over the face gallery. Vectors are L2-normalised and kept in
+# one contiguous float32 matrix, so a query is a single matrix-vector product instead of
+# a network round-trip to Qdrant. query_points / query_batch_points / upsert mirror the
+# QdrantClient methods the recognizers use, so an index can be swapped in for the client.
+#
+# Modes:
+#   "flat" - exact brute-force search (default, fine for tens of thousands of faces)
+#   "ivf"  - k-means inverted lists, only the nprobe closest lists are scanned
+#   "hnsw" - graph index, requires the optional hnswlib package
+#
+# Precision: the matrix can be stored as "float16" (half the memory) or "int8" (a quarter,
+# components scaled by 127). Scores are computed in float32 on blocks of dequantised rows,
+# so the cosine error stays well below the usual 0.95 match threshold margin. Dequantising
+# costs search time, so this is for galleries where memory is the limit; combined with
+# "ivf" only the probed lists are dequantised.
+
+ScoredMatch = namedtuple("ScoredMatch", ["id", "score", "payload"])
+QueryResult = namedtuple("QueryResult", ["points"])
+
+PRECISIONS = {"float32": np.float32, "float16": np.float16, "int8": np.int8}
+INT8_SCALE = 127.0
+SCORE_BLOCK = 65536  # Rows dequantised at a time when scoring a quantised matrix
+
+def normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+class QdrantCompatible:
+    """Adds the QdrantClient search/upsert methods on top of search_batch() and add()."""
+
+    def query_points(self, collection_name=None, query=None, limit=10, **kwargs):
+        return QueryResult(self.search(query, limit))
+
+    def query_batch_points(self, collection_name=None, requests=(), **kwargs):
+        # Requests only differ in limit in practice; search once with the largest one
+        limit = max((request.limit or 10 for request in requests), default=10)
+        results = self.search_batch([request.query for request in requests], limit)
+        return [QueryResult(matches[:request.limit or 10]) for request, matches in zip(requests, results)]
+
+    def upsert(self, collection_name=None, points=(), **kwargs):
+        points = list(points)
+        if points:
+            self.add([point.id for point in points], [point.vector for point in points],
+                     [point.payload for point in points])
+        return True
+
+def top_k(scores, k, id_of, payload_of, rows=None):
+    """Best k entries of a score vector as ScoredMatch tuples, highest first."""
+    k = min(k, len(scores))
+    if k == 0:
+        return []
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top])]
+    matches = []
+    for i in top:
+        row = int(rows[i]) if rows is not None else int(i)
+        matches.append(ScoredMatch(id_of(row), float(scores[i]), payload_of(row)))
+    return matches
+
+class EmbeddingIndex(QdrantCompatible):
+    """
+    Cosine top-k index over face embeddings, usable as a drop-in for QdrantClient searches.
+
+    Args:
+        dim (int): Embedding dimension (128 for face_recognition)
+        mode (str): "flat", "ivf" or "hnsw"
+        nlist (int): Number of IVF lists, defaults to ~sqrt(gallery size) at build time
+        nprobe (int): Number of IVF lists scanned per query
+        hnsw_m (int): HNSW graph degree
+        hnsw_ef (int): HNSW search breadth
+        precision (str): Matrix storage, "float32", "float16" or "int8"
+    """
+
+    def __init__(self, dim=128, mode="flat", nlist=None, nprobe=8, hnsw_m=16, hnsw_ef=64, precision="float32"):
+        if mode not in ("flat", "ivf", "hnsw"):
+            raise ValueError(f"Unknown index mode: {mode}")
+        if precision not in PRECISIONS:
+            raise ValueError(f"Unknown precision: {precision}")
+        self.dim = dim
+        self.mode = mode
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.hnsw_m = hnsw_m
+        self.hnsw_ef = hnsw_ef
+        self.precision = precision
+
+        self.matrix = np.empty((0, dim), dtype=PRECISIONS[precision])  # Rows beyond self.size are spare capacity
+        self.size = 0
+        self.ids = []
+        self.payloads = []
+        self.rows = {}  # point id -> row
+
+        self.centroids = None  # IVF
+        self.assignments = np.empty(0, dtype=np.int32)
+        self.hnsw = None
+        self.labels = {}  # point id -> HNSW label
+        self.label_ids = {}  # HNSW label -> point id
+        self.next_label = 0
+        self.store = None  # Backing GalleryStore, when loaded from one
+        self.store_rows = 0  # GalleryStore records already loaded
+        self.store_generation = None
+
+    def __len__(self):
+        return self.size
+
+    # ----- Writes -----
+    def add(self, ids, vectors, payloads=None):
+        """Inserts or replaces points. Vectors are normalised on the way in."""
+        vectors = normalize(np.reshape(vectors, (-1, self.dim)))
+        stored = self._quantize(vectors)
+        payloads = payloads if payloads is not None else [None] * len(ids)
+        self._reserve(self.size + len(ids))
+        for point_id, vector, payload in zip(ids, stored, payloads):
+            row = self.rows.get(point_id)
+            if row is None:
+                row = self.size
+                self.size += 1
+                self.rows[point_id] = row
+                self.ids.append(point_id)
+                self.payloads.append(payload)
+            else:
+                self.payloads[row] = payload
+            self.matrix[row] = vector
+        if self.centroids is not None:
+            rows = np.array([self.rows[point_id] for point_id in ids], dtype=np.int64)
+            self.assignments[rows] = self._nearest_centroids(self._dequantize(self.matrix[rows]))
+        if self.hnsw is not None:
+            self._hnsw_add(ids, vectors)
+
+    def remove(self, ids):
+        for point_id in ids:
+            row = self.rows.pop(point_id, None)
+            if row is None:
+                continue
+            last = self.size - 1
+            if row != last:
+                # Move the last row into the hole to keep the matrix contiguous
+                moved_id = self.ids[last]
+                self.matrix[row] = self.matrix[last]
+                self.ids[row] = moved_id
+                self.payloads[row] = self.payloads[last]
+                self.assignments[row] = self.assignments[last]
+                self.rows[moved_id] = row
+            self.ids.pop()
+            self.payloads.pop()
+            self.size = last
+            if self.hnsw is not None:
+                self.hnsw.mark_deleted(self.labels[point_id])
+
+    def _reserve(self, capacity):
+        if capacity <= len(self.matrix):
+            return
+        capacity = max(capacity, 2 * len(self.matrix), 1024)
+        matrix = np.empty((capacity, self.dim), dtype=self.matrix.dtype)
+        matrix[:self.size] = self.matrix[:self.size]
+        assignments = np.zeros(capacity, dtype=np.int32)
+        assignments[:self.size] = self.assignments[:self.size]
+        self.matrix, self.assignments = matrix, assignments
+        if self.hnsw is not None and capacity > self.hnsw.get_max_elements():
+            self.hnsw.resize_index(capacity)
+
+    # ----- Approximate Modes -----
+    def build(self, iterations=10, seed=0):
+        """Trains the IVF centroids or builds the HNSW graph. A no-op in flat mode."""
+        if self.mode == "ivf" and self.size:
+            self._train_ivf(iterations, seed)
+        elif self.mode == "hnsw":
+            try:
+                import hnswlib
+            except ImportError:
+                raise ImportError("HNSW mode requires the hnswlib package (pip install hnswlib)")
+            self.hnsw = hnswlib.Index(space="ip", dim=self.dim)
+            self.hnsw.init_index(max_elements=max(len(self.matrix), 1024), M=self.hnsw_m, ef_construction=200)
+            self.hnsw.set_ef(self.hnsw_ef)
+            self.labels, self.label_ids, self.next_label = {}, {}, 0
+            self._hnsw_add(self.ids, self._dequantize(self.matrix[:self.size]))
+        return self
+
+    def _train_ivf(self, iterations, seed):
+        # Spherical k-means on the normalised vectors
+        data = self._dequantize(self.matrix[:self.size])
+        nlist = min(self.nlist or max(1, int(np.sqrt(self.size))), self.size)
+        rng = np.random.default_rng(seed)
+        centroids = data[rng.choice(self.size, nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assignments = np.argmax(data @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = data[assignments == c]
+                if len(members):
+                    centroids[c] = members.sum(axis=0)
+            centroids = normalize(centroids)
+        self.centroids = centroids
+        self.assignments[:self.size] = self._nearest_centroids(data)
+
+    def _nearest_centroids(self, vectors):
+        return np.argmax(vectors @ self.centroids.T, axis=1).astype(np.int32)
+
+    def _hnsw_add(self, ids, vectors):
+        labels = []
+        for point_id in ids:
+            label = self.labels.get(point_id)
+            if label is None:
+                label = self.next_label
+                self.next_label += 1
+                self.labels[point_id] = label
+                self.label_ids[label] = point_id
+            else:
+                try:
+                    self.hnsw.unmark_deleted(label)
+                except RuntimeError:
+                    pass  # Label was not deleted
+            labels.append(label)
+        if self.next_label > self.hnsw.get_max_elements():
+            self.hnsw.resize_index(max(self.next_label, 2 * self.hnsw.get_max_elements()))
+        if labels:
+            self.hnsw.add_items(np.asarray(vectors, dtype=np.float32), np.asarray(labels))
+
+    # ----- Search -----
+    def search(self, query, k=1):
+        return self.search_batch([query], k)[0]
+
+    def search_batch(self, queries, k=1):
+        """
+        Finds the k most similar points for each query.
+
+        Returns:
+            results (list[list[ScoredMatch]]): best matches first, score is cosine similarity
+        """
+        queries = normalize(np.reshape(queries, (-1, self.dim)))
+        if not self.size:
+            return [[] for _ in queries]
+        if self.hnsw is not None:
+            return self._search_hnsw(queries, k)
+        if self.centroids is not None:
+            return [self._search_ivf(query, k) for query in queries]
+        scores = self._scores(queries, self.matrix[:self.size])
+        return [self._top_k(row_scores, None, k) for row_scores in scores]
+
+    def _search_ivf(self, query, k):
+        probe = np.argsort(-(self.centroids @ query))[:self.nprobe]
+        rows = np.flatnonzero(np.isin(self.assignments[:self.size], probe))
+        return self._top_k(self._scores(query[None, :], self.matrix[rows])[0], rows, k)
+
+    # ----- Quantisation -----
+    def _quantize(self, vectors):
+        if self.precision == "int8":
+            return np.round(vectors * INT8_SCALE).astype(np.int8)
+        return vectors.astype(self.matrix.dtype, copy=False)
+
+    def _dequantize(self, stored):
+        if self.precision == "int8":
+            return normalize(stored.astype(np.float32) / INT8_SCALE)  # Rounding moved rows off the unit sphere
+        return stored.astype(np.float32, copy=False)
+
+    def _scores(self, queries, stored):
+        if self.precision == "float32":
+            return queries @ stored.T
+        scores = np.empty((len(queries), len(stored)), dtype=np.float32)
+        for start in range(0, len(stored), SCORE_BLOCK):
+            block = stored[start:start + SCORE_BLOCK]
+            scores[:, start:start + len(block)] = queries @ self._dequantize(block).T
+        return scores
+
+    def _search_hnsw(self, queries, k):
+        k = min(k, self.size)
+        labels, distances = self.hnsw.knn_query(queries, k=k)
+        results = []
+        for row_labels, row_distances in zip(labels, distances):
+            matches = []
+            for label, distance in zip(row_labels, row_distances):
+                point_id = self.label_ids[int(label)]
+                matches.append(ScoredMatch(point_id, float(1.0 - distance), self.payloads[self.rows[point_id]]))
+            results.append(matches)
+        return results
+
+    def _top_k(self, scores, rows, k):
+        return top_k(scores, k, self.ids.__getitem__, self.payloads.__getitem__, rows)
+
+    def upsert(self, collection_name=None, points=(), **kwargs):
+        points = list(points)
+        if self.store is not None and points:
+            # Persist new enrollments so other processes and restarts see them too
+            self.store.append([point.id for point in points], [point.vector for point in points],
+                              [point.payload for point in points])
+        return super().upsert(collection_name, points, **kwargs)
+
+    # ----- Loading -----
+    def sync_from_qdrant(self, client, collection_name, batch_size=1024):
+        """Pulls every point of a Qdrant collection into the index (upserting existing ids)."""
+        offset = None
+        while True:
+            points, offset = client.scroll(
+                collection_name=collection_name, limit=batch_size, offset=offset,
+                with_payload=True, with_vectors=True,
+            )
+            if points:
+                self.add([point.id for point in points], [point.vector for point in points],
+                         [point.payload for point in points])
+            if offset is None:
+                break
+        return self
+
+    def sync_from_store(self, store):
+        """Copies records appended to a GalleryStore since the last sync into the index, removing deleted ids."""
+        self.store = store
+        store.refresh()
+        reload = store.generation != self.store_generation
+        if reload:
+            self.store_rows = 0  # Compacted (or first sync): reload everything, add() upserts
+            self.store_generation = store.generation
+        rows = np.array(list(store.latest_rows(self.store_rows).values()), dtype=np.int64)
+        deleted = store.is_tombstone(rows)
+        if deleted.any():
+            self.remove(store.ids[rows[deleted]].tolist())
+            rows = rows[~deleted]
+        if reload:
+            # Compaction dropped the tombstones of ids deleted before it, so remove every id
+            # the store no longer has
+            kept = set(store.ids[rows].tolist())
+            self.remove([point_id for point_id in self.rows if point_id not in kept])
+        if len(rows):
+            self.add(store.ids[rows].tolist(), store.embeddings[rows], [store.payload(row) for row in rows])
+        self.store_rows = store.count
+        return self
+
+    def sync(self):
+        """Picks up records appended to the backing GalleryStore, if there is one."""
+        return self.sync_from_store(self.store) if self.store is not None else self
+
+    @classmethod
+    def from_store(cls, store, mode="flat", **kwargs):
+        return cls(store.dim, mode, **kwargs).sync_from_store(store).build()
+
+    @classmethod
+    def from_qdrant(cls, client, collection_name, dim=128, mode="flat", **kwargs):
+        return cls(dim, mode, **kwargs).sync_from_qdrant(client, collection_name).build()
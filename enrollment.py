@@ -0,0 +1,98 @@
+from collections import namedtuple
+import numpy as np
+from qdrant_client.models import PointStruct
+from embedding_index import normalize
+
+# ----- Multi-sample Enrollment -----
+# Instead of one photo per person, enrollment takes a handful of photos or a short capture
+# burst. Samples that disagree with the rest (wrong person, bad detection, heavy blur) are
+# rejected, and the person is stored as a centroid plus a few prototypes that cover the
+# spread of the remaining samples (pose, glasses, lighting). Storage stays bounded at
+# 1 + MAX_PROTOTYPES points per person however many samples were taken.
+#
+# Point ids: the centroid keeps the user id itself, so single-sample enrollments and
+# existing records are unchanged. Prototype i of a user is stored at
+# (i + 1) * PROTOTYPE_ID_OFFSET + user_id, and every point carries the user id in its
+# payload. Use user_id_of() to map any search hit back to its user.
+
+MAX_PROTOTYPES = 3  # Extra points per user besides the centroid
+MIN_SIMILARITY = 0.85  # Samples less similar than this to the centroid are rejected outright
+OUTLIER_MADS = 3.0  # ... as are samples this many median absolute deviations below the median similarity
+PROTOTYPE_ID_OFFSET = 10 ** 12  # User ids must stay below this
+
+Template = namedtuple("Template", ["centroid", "prototypes", "inliers", "similarities"])
+
+def user_id_of(point_id):
+    """User id for a centroid or prototype point id."""
+    return point_id % PROTOTYPE_ID_OFFSET if isinstance(point_id, int) else point_id
+
+def parse_user_id(user_id):
+    """
+    User id as an int.
+
+    Raises:
+        ValueError: Unless it is a number below PROTOTYPE_ID_OFFSET, where prototype ids start
+    """
+    if not str(user_id).isdigit() or int(user_id) >= PROTOTYPE_ID_OFFSET:
+        raise ValueError(f"User ID must be a number below {PROTOTYPE_ID_OFFSET}")
+    return int(user_id)
+
+def prototype_ids(user_id, count=MAX_PROTOTYPES):
+    return [(i + 1) * PROTOTYPE_ID_OFFSET + user_id for i in range(count)]
+
+def build_template(embeddings, max_prototypes=MAX_PROTOTYPES, min_similarity=MIN_SIMILARITY,
+                   outlier_mads=OUTLIER_MADS):
+    """
+    Reduces the embeddings of several photos of one person to a centroid and prototypes.
+
+    Args:
+        embeddings (array-like): N x 128 embeddings of the samples
+
+    Returns:
+        Template: centroid (unit vector), prototypes (P x 128, at most max_prototypes, each an
+            accepted sample chosen to be far from the centroid and from each other), inliers
+            (N booleans) and similarities (N cosine similarities to the final centroid)
+
+    Raises:
+        ValueError: If no embeddings are given
+    """
+    if not len(embeddings):
+        raise ValueError("No face detected in any sample")
+    vectors = normalize(embeddings)
+    inliers = np.ones(len(vectors), dtype=bool)
+    for _ in range(2):  # Second pass re-checks against the centroid of the accepted samples
+        centroid = normalize(vectors[inliers].mean(axis=0))
+        similarities = vectors @ centroid
+        median = np.median(similarities[inliers])
+        spread = np.median(np.abs(similarities[inliers] - median)) or 1e-3
+        inliers = (similarities >= min_similarity) & (similarities >= median - outlier_mads * spread)
+        if not inliers.any():
+            inliers = similarities == similarities.max()  # Keep the most central sample
+    centroid = normalize(vectors[inliers].mean(axis=0))
+    similarities = vectors @ centroid
+
+    # Farthest-point selection: start with the sample least like the centroid, then keep
+    # adding the sample least like anything chosen so far
+    candidates = np.flatnonzero(inliers)
+    chosen = []
+    if len(candidates) > 1:
+        closest = similarities[candidates].copy()
+        for _ in range(min(max_prototypes, len(candidates))):
+            pick = int(np.argmin(closest))
+            if closest[pick] > 0.999:
+                break  # Remaining samples are duplicates of what is already stored
+            chosen.append(candidates[pick])
+            closest = np.maximum(closest, vectors[candidates] @ vectors[candidates[pick]])
+    return Template(centroid, vectors[chosen], inliers, similarities)
+
+def template_points(user_id, template, payload=None):
+    """PointStructs for a user's centroid and prototypes, all carrying user_id in the payload."""
+    payload = dict(payload or {}, user_id=user_id)
+    points = [PointStruct(id=user_id, vector=template.centroid.tolist(), payload={**payload, "kind": "centroid"})]
+    for point_id, vector in zip(prototype_ids(user_id, len(template.prototypes)), template.prototypes):
+        points.append(PointStruct(id=point_id, vector=vector.tolist(), payload={**payload, "kind": "prototype"}))
+    return points
+
+def stale_prototype_ids(user_id, template):
+    """Prototype slots a re-enrollment no longer uses, to delete from the collection."""
+    return prototype_ids(user_id)[len(template.prototypes):]
@@ -1,60 +1,54 @@
 import cv2
-import dlib
-from scipy.spatial import distance
-from imutils import face_utils
-
-def eye_aspect_ratio(eye):
-    # Compute the euclidean distances between the vertical eye landmarks
-    A = distance.euclidean(eye[1], eye[5])
-    B = distance.euclidean(eye[2], eye[4])
-    # Compute the euclidean distance between the horizontal eye landmarks
-    C = distance.euclidean(eye[0], eye[3])
-    # Compute the eye aspect ratio
-    return (A + B) / (2.0 * C)
-
-# Initialize dlib's face detector and facial landmark predictor
-detector = dlib.get_frontal_face_detector()
-predictor = dlib.shape_predictor("shape_predictor_68_face_landmarks.dat")
-
-# Start video capture
-cap = cv2.VideoCapture(0)
+from core import face_detector, shape_predictor
+from frame_pipeline import FramePipeline
+from face_boxes import dlib_rect_to_box
+from liveness import LivenessTracker, eyes_from_shapes, shapes_to_array
+
 EYE_AR_THRESH = 0.2  # Threshold below which the eye is considered closed
-blink_detected = False
-
-while True:
-    ret, frame = cap.read()
-    if not ret:
-        break
-
-    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-    faces = detector(gray, 0)
-
-    for face in faces:
-        shape = predictor(gray, face)
-        # Convert the shape (facial landmarks) to a NumPy array
-        shape_np = face_utils.shape_to_np(shape)  # You'll need imutils or a similar utility for this conversion
-        
-        # Assume left eye is landmarks [42:48] and right eye is [36:42]
-        leftEye = shape_np[42:48]
-        rightEye = shape_np[36:42]
-        leftEAR = eye_aspect_ratio(leftEye)
-        rightEAR = eye_aspect_ratio(rightEye)
-        ear = (leftEAR + rightEAR) / 2.0
-
-        if ear < EYE_AR_THRESH:
-            blink_detected = True
-        else:
-            blink_detected = False
-
-        # Draw eye contours and display EAR for debug purposes
-        # (Drawing code omitted for brevity)
-
-    cv2.putText(frame, f"Blink Detected: {blink_detected}", (10, 30), 
-                cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
-    cv2.imshow("Liveness Check", frame)
-    
-    if cv2.waitKey(1) & 0xFF == ord('q'):
-        break
-
-cap.release()
-cv2.destroyAllWindows()
\ No newline at end of file
+liveness = LivenessTracker(ear_thresh=EYE_AR_THRESH)
+
+# ----- Pipeline Stages -----
+# Capture, detection and landmarks each run on their own thread (see frame_pipeline.py);
+# the main thread only draws, so the display always shows the newest processed frame.
+def detect_faces(frame):
+    gray = cv2.cvtColor(frame.image, cv2.COLOR_BGR2GRAY)
+    return gray, face_detector()(gray, 0)  # dlib's detector and landmark model load on first use (see core.py)
+
+def check_blink(frame):
+    gray, faces = frame.results["detect"]
+    if not faces:
+        return []
+    # Landmarks for every face, then EAR for all faces and both eyes in one NumPy pass
+    predictor = shape_predictor()
+    landmarks = shapes_to_array([predictor(gray, face) for face in faces])
+    return liveness.update([dlib_rect_to_box(face) for face in faces], eyes_from_shapes(landmarks))
+
+def main():
+    face_detector(), shape_predictor()  # Load the models before the first frames arrive
+    # Start video capture
+    with FramePipeline(0, [("detect", detect_faces), ("blink", check_blink)]) as pipeline:
+        while not pipeline.closed:
+            frame = pipeline.latest()
+            if frame is None:
+                continue
+
+            for state in frame.results["blink"]:
+                top, right, bottom, left = state.box
+                color = (0, 255, 0) if liveness.is_live(state.face_id) else (0, 0, 255)
+                cv2.rectangle(frame.image, (left, top), (right, bottom), color, 2)
+                cv2.putText(frame.image, f"Blinks: {state.blinks} EAR: {state.ear:.2f}", (left, top - 10),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
+            blink_detected = any(state.eyes_closed for state in frame.results["blink"])
+            cv2.putText(frame.image, f"Blink Detected: {blink_detected}", (10, 30), 
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
+            cv2.putText(frame.image, f"Latency: {pipeline.latency * 1000:.0f} ms", (10, 60),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
+            cv2.imshow("Liveness Check", frame.image)
+
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                break
+
+    cv2.destroyAllWindows()
+
+if __name__ == "__main__":
+    main()
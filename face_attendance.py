@@ -1,8 +1,7 @@
-import cv2
-import numpy as np
-import face_recognition
-from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams, PointStruct
+from core import face_recognition, qdrant_collection
+from gallery_store import open_local_index
+from face_pipeline import encode_face
+from live_recognition import run_live_recognition
 
 # ----- Configuration -----
 # Qdrant settings:
@@ -15,26 +14,27 @@ API_KEY = "<API_key>"  # Replace with your actual API key
 COLLECTION_NAME = "face_attendance"
 VECTOR_DIM = 128  # face_recognition produces 128-dim embeddings
 
-# ----- Step 1: Connect to Qdrant -----
-if API_KEY:
-    client = QdrantClient(url=QDRANT_URL, api_key=API_KEY)
-else:
-    client = QdrantClient(url=QDRANT_URL)
-
-# Create the collection if it does not exist
-if not client.collection_exists(COLLECTION_NAME):
-    print(f"Collection {COLLECTION_NAME} does not exist. Creating...")
-    client.create_collection(
-        collection_name=COLLECTION_NAME,
-        vectors_config=VectorParams(size=VECTOR_DIM, distance=Distance.COSINE),
+# Search backend: "qdrant" queries the server, "local" loads the collection into an
+# in-process index once and searches it in memory (see embedding_index.py)
+SEARCH_BACKEND = "qdrant"
+LOCAL_INDEX_MODE = "flat"
+GALLERY_STORE_DIR = None  # Memory-mapped copy of the gallery for fast cold starts (see gallery_store.py)
+LIVE_MODE = False  # Run the real-time webcam recognition loop after the example query
 
-    )
+# ----- Step 1: Connect to Qdrant -----
+# Done in main(), so importing this file (e.g. for get_face_embedding) needs no server
+def connect():
+    # The shared client creates the collection if it does not exist (see core.py)
+    client = qdrant_collection(QDRANT_URL, API_KEY, COLLECTION_NAME, VECTOR_DIM)
+    if SEARCH_BACKEND == "local":
+        return open_local_index(GALLERY_STORE_DIR, client, COLLECTION_NAME, VECTOR_DIM, LOCAL_INDEX_MODE)
+    return client
 
 # ----- Step 2: Define a Function to Get Face Embedding -----
 def get_face_embedding(image_path):
-    # Load the image using face_recognition (which uses RGB format)
     """
-    Loads an image from a file, detects a face in it, and computes the 128-d face embedding.
+    Loads an image from a file, detects the faces in it, and computes the 128-d embedding
+    of the largest one.
 
     Args:
         image_path (str): Path to the image file
@@ -43,16 +43,12 @@ def get_face_embedding(image_path):
         face_embeddings (numpy.ndarray): 128-d face embedding
 
     Raises:
-        ValueError: If no face is detected in the image
+        ValueError: If no face is detected in the image, or it fails the quality gate
     """
+    # Load the image using face_recognition (which uses RGB format)
     image = face_recognition.load_image_file(image_path)
-    # Detect face locations (assuming one face per image)
-    face_locations = face_recognition.face_locations(image)
-    if not face_locations:
-        raise ValueError(f"No face detected in {image_path}")
-    # Compute the face Embeddings (128-d vector)
-    face_encoding = face_recognition.face_encodings(image, known_face_locations=face_locations)
-    face_embeddings = face_encoding[0]  # Assuming one face per image
+    # Detection, quality gate and encoding settings live in face_pipeline.py
+    face_embeddings, _ = encode_face(image)
     return face_embeddings
 
 # ----- Step 3: Insert a Face Embedding into Qdrant -----
@@ -77,91 +73,44 @@ def get_face_embedding(image_path):
 # print("Inserted om face embedding into Qdrant DB.")
 
 # ----- Step 4: Query by Comparing a New Face -----
-# Assume we have a new image (e.g., "balaji1.jpg") for verification
-try:
-    query_embedding = get_face_embedding("omi2.jpg")  # Replace with the path to your image
-except Exception as e:
-    print(e)
-    exit()
-
-# Search for the most similar face in the collection using the correct search method
-search_results = client.query_points(
-    collection_name=COLLECTION_NAME,
-    query=query_embedding,
-    limit=1  # Looking for the closest match
-)
-
-# print("hits:", hits)
-
-if search_results:
-    # Assuming search_results is your list of scored points
-   for point in search_results.points:
-        print("ID:", point.id)
-        print("Score:", point.score)
-        print("Payload:", point.payload)
-        # print("Shard Key:", point.shard_key)
-        # print("Order Value:", point.order_value)
-        # print("-" * 40)
-else:
-    print("No matching face found.")
-
-
-# ----- Optional: Real-Time Webcam Recognition -----
-# Uncomment the following block if you want to run real-time face recognition.
-# It will capture from your webcam, encode the face, and try to match against the stored data.
-
-# # Start webcam
-# cap = cv2.VideoCapture(0)
-
-# while True:
-#     ret, frame = cap.read()
-#     if not ret:
-#         print("Failed to capture frame")
-#         break
-
-#     # Resize frame for faster processing
-#     small_frame = cv2.resize(frame, (0, 0), fx=0.5, fy=0.5)  # Balanced speed vs accuracy
-#     rgb_small_frame = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)  # Convert to RGB
-
-#     # Detect faces and compute embeddings
-#     face_locations = face_recognition.face_locations(rgb_small_frame)
-#     face_encodings = face_recognition.face_encodings(rgb_small_frame, face_locations)
-
-#     for face_encoding, face_location in zip(face_encodings, face_locations):
-#         # Search in Qdrant using `query_points`
-#         search_results = client.query_points(
-#             collection_name=COLLECTION_NAME,
-#             query=face_encoding.tolist(),
-#             limit=1
-#         )
-
-#         name = "Unknown"  # Default label
-
-#         if search_results.points:  # If a match is found
-#             best_match = search_results.points[0]
-#             if best_match.score > 0.95:  # Adjust threshold for accuracy
-#                 name = best_match.payload.get("name", "Unknown")
-
-#         # Scale face location back to original frame size
-#         top, right, bottom, left = [x * 2 for x in face_location]
-
-#         # Draw rectangle & name label
-#         if name != "Unknown":
-#             cv2.rectangle(frame, (left, top), (right, bottom), (0, 255, 0), 2)
-#             cv2.putText(frame, name, (left, top - 10),
-#                     cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 255, 0), 2)
-#         else:
-#             cv2.rectangle(frame, (left, top), (right, bottom), (0, 0, 255), 2)
-#             cv2.putText(frame, name, (left, top - 10),
-#                     cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 0, 255), 2)
-        
-
-#     # Display the frame
-#     cv2.imshow("Webcam Face Recognition", frame)
-
-#     # Exit on pressing 'q'
-#     if cv2.waitKey(1) & 0xFF == ord("q"):
-#         break
-
-# cap.release()
-# cv2.destroyAllWindows()
\ No newline at end of file
+def main():
+    search_client = connect()
+
+    # Assume we have a new image (e.g., "balaji1.jpg") for verification
+    try:
+        query_embedding = get_face_embedding("omi2.jpg")  # Replace with the path to your image
+    except Exception as e:
+        print(e)
+        return
+
+    # Search for the most similar face in the collection using the correct search method
+    search_results = search_client.query_points(
+        collection_name=COLLECTION_NAME,
+        query=query_embedding,
+        limit=1  # Looking for the closest match
+    )
+
+    # print("hits:", hits)
+
+    if search_results:
+        # Assuming search_results is your list of scored points
+        for point in search_results.points:
+            print("ID:", point.id)
+            print("Score:", point.score)
+            print("Payload:", point.payload)
+            # print("Shard Key:", point.shard_key)
+            # print("Order Value:", point.order_value)
+            # print("-" * 40)
+    else:
+        print("No matching face found.")
+
+
+    # ----- Optional: Real-Time Webcam Recognition -----
+    # Set LIVE_MODE = True to run real-time recognition on the webcam. Faces are detected every
+    # few frames, tracked in between and only re-identified when new or stale
+    # (see live_recognition.py for the tuning knobs).
+    if LIVE_MODE:
+        run_live_recognition(search_client, COLLECTION_NAME)
+
+if __name__ == "__main__":
+    main()
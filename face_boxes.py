@@ -0,0 +1,37 @@
+# ----- Face Box Helpers -----
+# Boxes are (top, right, bottom, left) tuples, the order face_recognition uses.
+
+def iou(a, b):
+    """Intersection over union of two (top, right, bottom, left) boxes."""
+    top, bottom = max(a[0], b[0]), min(a[2], b[2])
+    left, right = max(a[3], b[3]), min(a[1], b[1])
+    inter = max(0, bottom - top) * max(0, right - left)
+    area_a = (a[2] - a[0]) * (a[1] - a[3])
+    area_b = (b[2] - b[0]) * (b[1] - b[3])
+    union = area_a + area_b - inter
+    return inter / union if union > 0 else 0.0
+
+def match_boxes(old_boxes, new_boxes, threshold=0.3):
+    """
+    Greedy IoU matching, best overlaps first.
+
+    Returns:
+        pairs (list[tuple[int, int]]): (old index, new index) for every match above threshold
+    """
+    candidates = sorted(
+        ((iou(old, new), o, n) for o, old in enumerate(old_boxes) for n, new in enumerate(new_boxes)),
+        reverse=True,
+    )
+    pairs, used_old, used_new = [], set(), set()
+    for overlap, o, n in candidates:
+        if overlap < threshold:
+            break
+        if o in used_old or n in used_new:
+            continue
+        used_old.add(o)
+        used_new.add(n)
+        pairs.append((o, n))
+    return pairs
+
+def dlib_rect_to_box(rect):
+    return (rect.top(), rect.right(), rect.bottom(), rect.left())
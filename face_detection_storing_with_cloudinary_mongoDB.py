@@ -1,16 +1,26 @@
+import base64
 import cv2
-import face_recognition
 import re
 import pyttsx3
 import tkinter as tk
-import cloudinary
-import cloudinary.uploader
 from tkinter import filedialog, messagebox
-from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams, PointStruct
-from pymongo import MongoClient
+from qdrant_client.models import PointStruct, QueryRequest, PointIdsList
+from core import Lazy, mongo_client, qdrant_collection, warm_up
+from gallery_store import open_local_index, upsert_points, delete_points
+from face_pipeline import decode_image, encode_face, crop_face, encode_jpeg, get_group_embeddings, best_frame
+from embedding_cache import EmbeddingCache
+from data_access import UserCache, find_user
+from camera_service import get_camera
+from group_recognition import match_group, attendance_records
+from attendance import AttendanceLog, MongoSink, SqliteSink
+from ui_jobs import FramePreview, JobRunner, Speaker
+from upload_queue import UploadQueue, CloudinaryBackend, DirectoryBackend
+from enrollment import build_template, template_points, prototype_ids, stale_prototype_ids, user_id_of, parse_user_id
+from gallery_sync import ChangeLog, GallerySync, MongoChangeFeed
+import threading
+import contextlib
 import time
-import numpy as np
+from collections import deque
 
 # ----- Configuration -----
 QDRANT_URL = "<URL>"  # Update with actual URL
@@ -19,38 +29,76 @@ MONGO_URI = ""  # MongoDB connection URI
 DB_NAME = "FaceDB"
 COLLECTION_NAME = "face_attendance"
 VECTOR_DIM = 128  # face_recognition embeddings
+SEARCH_BACKEND = "qdrant"  # "local" searches an in-process copy of the collection instead
+LOCAL_INDEX_MODE = "flat"  # "flat", "ivf" or "hnsw" (see embedding_index.py)
+GALLERY_STORE_DIR = None  # Memory-mapped copy of the gallery for fast cold starts (see gallery_store.py)
+LOCAL_INDEX_PRECISION = "float32"  # "float16" or "int8" shrink the local index 2x / 4x
+CACHE_DISK_DIR = None  # Optional on-disk tier for the embedding cache
+CAMERA_SOURCE = 0  # Camera index or a video file path, kept open between captures
+CAPTURE_CANDIDATES = 5  # Last frames of the countdown compared by face quality, the best one is kept (see quality.py)
+BURST_FRAMES = 6  # Frames captured for a multi-sample enrollment (see enrollment.py)
+BURST_INTERVAL = 0.3  # Seconds between burst frames, so pose and expression vary a little
+ATTENDANCE_OFFLINE_DB = "attendance_offline.db"  # Local SQLite buffer used while MongoDB is unreachable
+UI_WORKERS = 4  # Enrollments/recognitions that may run in the background at once
+GALLERY_SYNC = True  # Pull enrollments made elsewhere into the local index and user cache (see gallery_sync.py)
+GALLERY_SYNC_INTERVAL = 1.0  # Seconds between pulls when MongoDB change streams are unavailable
+GALLERY_CHANGE_RETENTION = 7 * 24 * 3600  # Seconds change log entries are kept before MongoDB expires them
+
+# Face crops are uploaded in the background (see upload_queue.py)
+UPLOAD_BACKEND = "cloudinary"  # "directory" stores crops in UPLOAD_DIR instead, for testing/offline use
+UPLOAD_DIR = "face_uploads"
+UPLOAD_CONCURRENCY = 4
+UPLOAD_RETRIES = 3
+CLOUDINARY_CONFIG = {"cloud_name": "", "api_key": "", "api_secret": "", "secure": True}
+
 
 # ----- Initialize Clients -----
-qdrant_client = QdrantClient(url=QDRANT_URL, api_key=API_KEY)
-mongo_client = MongoClient(MONGO_URI)
-db = mongo_client[DB_NAME]
-users_collection = db["users"]
-
-# Cloudinary Configuration
-cloudinary.config(
-    cloud_name="",
-    api_key="",
-    api_secret="",
-    secure=True
-)
-
-# Initialize TTS engine
-engine = pyttsx3.init()
+# Clients are created on first use (see core.py): the window opens without waiting for
+# Qdrant/MongoDB, and importing this file needs no live services.
+qdrant_client = Lazy(lambda: qdrant_collection(QDRANT_URL, API_KEY, COLLECTION_NAME, VECTOR_DIM))
+users_collection = Lazy(lambda: mongo_client(MONGO_URI)[DB_NAME]["users"])
+# Check-ins are buffered and written to the attendance collection in the background
+attendance_log = Lazy(lambda: AttendanceLog(
+    MongoSink(mongo_client(MONGO_URI)[DB_NAME]["attendance"]), SqliteSink(ATTENDANCE_OFFLINE_DB)
+).start())
+# Every gallery write is also recorded in the change log other processes sync from
+change_log = Lazy(lambda: ChangeLog(mongo_client(MONGO_URI)[DB_NAME]))
+user_cache = UserCache()  # Point id -> user record, saves the Mongo round-trip on repeat visitors
+
+# Re-used photos (e.g. the same captured_face.jpg) skip detection and encoding
+embedding_cache = EmbeddingCache(disk_dir=CACHE_DISK_DIR)
+
+# TTS runs on its own thread so speaking never blocks the window or a background job
+speaker = Lazy(lambda: Speaker(pyttsx3.init))
 def speak(text):
-    engine.say(text)
-    engine.runAndWait()
+    speaker.say(text)
+
+# Searches go to Qdrant or to a local index loaded from it; both expose query_points
+search_client = qdrant_client
+index_lock = contextlib.nullcontext()  # Qdrant handles concurrent calls itself
+if SEARCH_BACKEND == "local":
+    search_client = Lazy(lambda: open_local_index(GALLERY_STORE_DIR, qdrant_client.instance(), COLLECTION_NAME,
+                                                  VECTOR_DIM, LOCAL_INDEX_MODE, LOCAL_INDEX_PRECISION))
+    index_lock = threading.Lock()  # The in-process index is shared by the background jobs
+
+# Enrollment does not wait for the crop upload; face_image_url is filled in when it finishes
+def create_upload_queue():
+    if UPLOAD_BACKEND == "cloudinary":
+        backend = CloudinaryBackend(config=CLOUDINARY_CONFIG)
+    else:
+        backend = DirectoryBackend(UPLOAD_DIR)
+    return UploadQueue(backend, UPLOAD_CONCURRENCY, UPLOAD_RETRIES)
+
+upload_queue = Lazy(create_upload_queue)
 
-# Ensure Qdrant collection exists
-if not qdrant_client.collection_exists(COLLECTION_NAME):
-    qdrant_client.create_collection(
-        collection_name=COLLECTION_NAME,
-        vectors_config=VectorParams(size=VECTOR_DIM, distance=Distance.COSINE),
-    )
+def start_gallery_sync():
+    change_log.expire_after(GALLERY_CHANGE_RETENTION)
+    feed = MongoChangeFeed(mongo_client(MONGO_URI)[DB_NAME])
+    cursor = feed.head()  # Before the index loads, so nothing written meanwhile is missed
+    index = search_client.instance() if search_client is not qdrant_client else None
+    return GallerySync(index, user_cache, cursor, index_lock=index_lock).start(feed, GALLERY_SYNC_INTERVAL)
 
-# Function to upload face image to Cloudinary
-def upload_to_cloudinary(image_path):
-    upload_result = cloudinary.uploader.upload(image_path)
-    return upload_result["secure_url"]
+gallery_sync = Lazy(start_gallery_sync)
 
 # ----- Input Validation -----
 def validate_inputs(name, user_id, prn_no):
@@ -58,9 +106,11 @@ def validate_inputs(name, user_id, prn_no):
         messagebox.showerror("Error", "Name cannot be empty")
         speak("Name cannot be empty")
         return False
-    if not user_id.isdigit():
-        messagebox.showerror("Error", "User ID must be a number")
-        speak("User ID must be a number")
+    try:
+        parse_user_id(user_id)
+    except ValueError as e:
+        messagebox.showerror("Error", str(e))
+        speak("User ID is not valid")
         return False
     if not re.match(r"^[0-9]{3}$", prn_no):
         messagebox.showerror("Error", "PRN No must be a 3-digit number")
@@ -70,198 +120,315 @@ def validate_inputs(name, user_id, prn_no):
 
 # ----- Utility Functions -----
 def get_face_embedding(image_path):
-    image = face_recognition.load_image_file(image_path)
-    face_locations = face_recognition.face_locations(image)
-    if not face_locations:
-        raise ValueError("No face detected")
-    face_encoding = face_recognition.face_encodings(image, known_face_locations=face_locations)
-    
-    # Extract face region
-    top, right, bottom, left = face_locations[0]  # Assuming one face per image
-    face_image = image[top:bottom, left:right]
+    with open(image_path, "rb") as f:
+        data = f.read()
+    image = decode_image(data)
+    # Detection scale/model settings live in face_pipeline.py
+    face_embedding, face_location = embedding_cache.get_or_compute(data, lambda: encode_face(image))
     
-    # Save cropped face image
-    face_image_path = image_path.replace("temp_", "face_")
-    cv2.imwrite(face_image_path, cv2.cvtColor(face_image, cv2.COLOR_RGB2BGR))
+    # Extract face region (kept in memory, encoded once when it is uploaded)
+    face_image = crop_face(image, face_location)
     
-    return face_encoding[0], face_image_path, face_image  # Return embedding and cropped face path
-
-def capture_photo():
-    cap = cv2.VideoCapture(0)
-    start_time = time.time()
-    while time.time() - start_time < 3:
-        ret, frame = cap.read()
-        if not ret:
-            speak("Failed to capture photo")
-            messagebox.showerror("Error", "Failed to capture photo")
-            cap.release()
-            return None
-        countdown = 3 - int(time.time() - start_time)
-        # speak(f"{countdown}")
-        cv2.putText(frame, f"Capturing in {countdown}s", (50, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
-        cv2.imshow("Camera Feed", frame)
-        cv2.waitKey(1)
-    
-    cap.release()
-    cv2.destroyAllWindows()
-    file_path = "captured_face.jpg"
-    cv2.imwrite(file_path, frame)
+    return face_embedding, face_image  # Return embedding and cropped face
+
+# The functions below run on background jobs (see ui_jobs.py): they report problems by
+# raising and return the message to show, and never touch Tk widgets themselves.
+capture_lock = threading.Lock()  # One camera countdown at a time
+
+def show_preview(preview, image, text):
+    """Hands a captioned BGR frame to the Tk preview window (drawn on the Tk thread)."""
+    if preview is None:
+        return
+    frame = image.copy()
+    cv2.putText(frame, text, (50, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+    preview.show(base64.b64encode(cv2.imencode(".png", frame)[1]))
+
+def capture_photo(preview=None):
+    # The camera stays open between captures, so the countdown starts on an already exposed frame
+    with capture_lock:
+        camera = get_camera(CAMERA_SOURCE)
+        start_time = time.time()
+        snapshot = None
+        candidates = deque(maxlen=CAPTURE_CANDIDATES)
+        try:
+            while time.time() - start_time < 3:
+                snapshot = camera.wait_for_frame(snapshot.frame_id if snapshot else 0, timeout=1.0)
+                if snapshot is None:
+                    raise ValueError("Failed to capture photo")
+                candidates.append(snapshot.image)
+                countdown = 3 - int(time.time() - start_time)
+                # speak(f"{countdown}")
+                show_preview(preview, snapshot.image, f"Capturing in {countdown}s")
+        finally:
+            if preview is not None:
+                preview.close()
+        # Keep the sharpest, best lit, most frontal of the last few frames rather than simply the last one
+        images = list(candidates)
+        best, quality = best_frame([cv2.cvtColor(image, cv2.COLOR_BGR2RGB) for image in images])
+        if best is None:
+            raise ValueError("No face detected")
+        if not quality.ok:
+            raise ValueError(f"Face rejected: {quality.reason}, please try again")
+        file_path = "captured_face.jpg"
+        cv2.imwrite(file_path, images[best])
     speak("Photo captured successfully")
     return file_path
 
+def capture_burst(frames=BURST_FRAMES, interval=BURST_INTERVAL, preview=None):
+    """Captures several frames a little apart for multi-sample enrollment. Returns RGB images."""
+    with capture_lock:
+        camera = get_camera(CAMERA_SOURCE)
+        images = []
+        snapshot = None
+        try:
+            while len(images) < frames:
+                snapshot = camera.wait_for_frame(snapshot.frame_id if snapshot else 0, timeout=1.0)
+                if snapshot is None:
+                    raise ValueError("Failed to capture photo")
+                images.append(cv2.cvtColor(snapshot.image, cv2.COLOR_BGR2RGB))
+                show_preview(preview, snapshot.image, f"Capturing {len(images)}/{frames}")
+                time.sleep(interval)
+        finally:
+            if preview is not None:
+                preview.close()
+    speak("Photos captured successfully")
+    return images
+
 def add_face(name, user_id, prn_no, image_path):
-    if not validate_inputs(name, user_id, prn_no):
-        return
-    try:
-        embedding, face_image_path, face_image = get_face_embedding(image_path)
-        
-    except ValueError as e:
-        messagebox.showerror("Error", str(e))
-        speak(str(e))
-        return
+    embedding, face_image = get_face_embedding(image_path)
     
     # Store in Qdrant
     point_id = int(user_id)
-    insert_result = qdrant_client.upsert(
-        collection_name=COLLECTION_NAME,
-        points=[PointStruct(id=point_id, vector=embedding.tolist())]
-    )
-    if not insert_result:
-        speak("Failed to add face to the database")
-        messagebox.showerror("Error", "Failed to add face to the database")
-        return
+    points = [PointStruct(id=point_id, vector=embedding.tolist())]
+    stale_ids = prototype_ids(point_id)  # Left by an earlier burst enrollment, they would still match
+    with change_log.recording(points=points, deleted_points=stale_ids):
+        if not qdrant_client.upsert(collection_name=COLLECTION_NAME, points=points):
+            raise ValueError("Failed to add face to the database")
+        qdrant_client.delete(collection_name=COLLECTION_NAME, points_selector=PointIdsList(points=stale_ids))
+    update_local_index(points, stale_ids)
     
     speak(f"{name}'s, Face added to the Vector DB!")
     print("Face added successfully to the Vector DB!")
+    save_user(point_id, name, prn_no, face_image)
+    return f"{name}'s face added successfully!"
+
+def add_face_burst(name, user_id, prn_no, images):
+    # Several samples -> centroid + prototypes, outlier samples rejected
+    samples = []
+    for image in images:
+        try:
+            samples.append((image, *encode_face(image)))
+        except ValueError:
+            pass  # No face in this frame, or it failed the quality gate
+    if not samples:
+        raise ValueError("No usable face in any frame")
+    template = build_template([embedding for _, embedding, _ in samples])
+
+    point_id = int(user_id)
+    points = template_points(point_id, template, {"name": name})
+    stale_ids = stale_prototype_ids(point_id, template)
+    with change_log.recording(points=points, deleted_points=stale_ids):
+        if not qdrant_client.upsert(collection_name=COLLECTION_NAME, points=points):
+            raise ValueError("Failed to add face to the database")
+        if stale_ids:
+            qdrant_client.delete(collection_name=COLLECTION_NAME, points_selector=PointIdsList(points=stale_ids))
+    update_local_index(points, stale_ids)
+    speak(f"{name}'s, Face added to the Vector DB!")
 
+    # The most typical sample is the one shown on the user's record
+    image, _, face_location = samples[int(template.similarities.argmax())]
+    save_user(point_id, name, prn_no, crop_face(image, face_location))
+    used = int(template.inliers.sum())
+    return f"{name}'s face added from {used} of {len(images)} frames ({len(template.prototypes)} prototypes)"
 
-    # Upload to Cloudinary
-    cv2.imwrite(face_image_path, cv2.cvtColor(face_image, cv2.COLOR_RGB2BGR))
-    cloudinary_url = upload_to_cloudinary(face_image_path)
-    speak(f"{name}'s, Face added to the Cloudinary!")
-    print("Face added to the Cloudinary!")
+def update_local_index(points, deleted_ids):
+    if search_client is not qdrant_client:
+        upsert_points(search_client.instance(), points, index_lock)
+        if deleted_ids:
+            delete_points(search_client.instance(), deleted_ids, index_lock)
 
-    # Store in MongoDB
-    users_collection.insert_one({"_id": point_id, "name": name, "prn_no": prn_no, "face_image_url": cloudinary_url})
+def save_user(point_id, name, prn_no, face_image):
+    # Store in MongoDB; face_image_url is set once the background upload finishes
+    user = {"_id": point_id, "name": name, "prn_no": prn_no, "face_image_url": None}
+    with change_log.recording(users=[user]):
+        users_collection.replace_one({"_id": point_id}, user, upsert=True)  # Re-enrollment replaces the record
+    user_cache.put(point_id, user)
     speak(f"{name}'s, Face added to the database!")
     print("Face added successfully to the database!")
-    messagebox.showinfo("Success", "Face added successfully!")
+
+    # Upload the crop to Cloudinary in the background
+    def uploaded(url):
+        with change_log.recording(users=[{**user, "face_image_url": url}]):
+            users_collection.update_one({"_id": point_id}, {"$set": {"face_image_url": url}})
+        user_cache.put(point_id, {**user, "face_image_url": url})
+        print(f"Face image for {name} uploaded: {url}")
+
+    def upload_failed(e):
+        print(f"Face image upload for {name} failed, face_image_url left empty: {e}")
+
+    upload_queue.submit(encode_jpeg(face_image), on_done=uploaded, on_error=upload_failed)
 
 def recognize_face(image_path):
-    try:
-        query_embedding, _, _ = get_face_embedding(image_path)
-    except ValueError as e:
-        speak(str(e))
-        messagebox.showerror("Error", str(e))
-        return
+    query_embedding, _ = get_face_embedding(image_path)
     speak("Recognizing face, Please wait...")
-    search_results = qdrant_client.query_points(
-        collection_name=COLLECTION_NAME, query=query_embedding.tolist(), limit=1
-    )
+    with index_lock:
+        search_results = search_client.query_points(
+            collection_name=COLLECTION_NAME, query=query_embedding.tolist(), limit=1
+        )
     
     if not search_results.points:
         print(search_results.points)
         speak("No matching face found")
-        messagebox.showinfo("Result", "No matching face found")
-        return
+        return "No matching face found"
     
     best_match = search_results.points[0]
 
     if best_match.score > 0.97:
-        user_data = users_collection.find_one({"_id": best_match.id})
-        speak(f"Welcome {user_data['name']}")
-        messagebox.showinfo("Result", f"User ID: {best_match.id}\nName: {user_data['name']}\nPRN No: {user_data['prn_no']}")
-    else:
-        messagebox.showinfo("Result", "No matching face found")
-        
+        user_id = user_id_of(best_match.id)  # Prototype points map back to their user
+        user_data = find_user(users_collection, user_cache, user_id)
+        if user_data is not None:  # None for a point whose user record is missing
+            attendance_log.record(user_id, user_data["name"], best_match.score)
+            speak(f"Welcome {user_data['name']}")
+            return f"User ID: {user_id}\nName: {user_data['name']}\nPRN No: {user_data['prn_no']}"
+    speak("No matching face found")
+    return "No matching face found"
+
+def recognize_group(image_path):
+    # Every face in the photo, one encode pass and one batched search
+    with open(image_path, "rb") as f:
+        data = f.read()
+    embeddings, face_locations = get_group_embeddings(data)
+    speak(f"Recognizing {len(face_locations)} faces, Please wait...")
+    with index_lock:
+        responses = search_client.query_batch_points(
+            collection_name=COLLECTION_NAME,
+            requests=[QueryRequest(query=embedding.tolist(), limit=1) for embedding in embeddings],
+        )
+    faces = match_group(face_locations, [response.points for response in responses], 0.97)
+    for face in faces:
+        if face["user_id"] is not None:
+            user_data = find_user(users_collection, user_cache, face["user_id"])
+            face["name"] = user_data["name"] if user_data else None
+    records = attendance_records(faces, "group")
+    attendance_log.record_many(records)
+    names = [record["name"] or str(record["user_id"]) for record in records]
+    if names:
+        speak(f"Welcome {', '.join(names)}")
+    return f"{len(faces)} face(s) detected, {len(names)} recognized" + "".join(f"\n{name}" for name in names)
+
+def main():
+    # ----- UI Setup -----
+    root = tk.Tk()
+    root.title("Face Recognition System")
+    root.geometry("600x600")
+    root.configure(bg="#34495E")
+
+    font_style = ("Arial", 14, "bold")
+    button_style = {"font": ("Arial", 12, "bold"), "bg": "#1ABC9C", "fg": "white", "bd": 3, "relief": "raised"}
+
+    def create_label(text):
+        return tk.Label(root, text=text, font=font_style, bg="#34495E", fg="white")
 
-# ----- UI Setup -----
-root = tk.Tk()
-root.title("Face Recognition System")
-root.geometry("600x600")
-root.configure(bg="#34495E")
+    def create_entry():
+        return tk.Entry(root, font=("Arial", 12), bg="white", fg="black", bd=2, relief="solid")
 
-font_style = ("Arial", 14, "bold")
-button_style = {"font": ("Arial", 12, "bold"), "bg": "#1ABC9C", "fg": "white", "bd": 3, "relief": "raised"}
+    # Background job status
+    loading_label = tk.Label(root, text="", font=("Arial", 12, "bold"), bg="#34495E", fg="yellow")
+    loading_label.pack(pady=5)
 
-def create_label(text):
-    return tk.Label(root, text=text, font=font_style, bg="#34495E", fg="white")
+    def show_jobs(active):
+        loading_label.config(text=f"{active} job(s) running..." if active else "")
 
-def create_entry():
-    return tk.Entry(root, font=("Arial", 12), bg="white", fg="black", bd=2, relief="solid")
+    jobs = JobRunner(root, UI_WORKERS, on_change=show_jobs)
+    preview = FramePreview(root)  # Capture jobs draw their countdown through the Tk thread
+    jobs.submit(warm_up)  # Load the face models while the user fills in the form
+    if GALLERY_SYNC:
+        jobs.submit(gallery_sync.instance)
 
-# Loading Animation
-loading_label = tk.Label(root, text="", font=("Arial", 12, "bold"), bg="#34495E", fg="yellow")
-loading_label.pack(pady=5)
+    def show_error(e):
+        speak(str(e))
+        messagebox.showerror("Error", str(e))
 
-def show_loading(message):
-    loading_label.config(text=message)
-    root.update_idletasks()
+    def run_job(fn, *args, title="Result"):
+        # Several jobs may be queued at once, e.g. the next enrollment while one is still uploading
+        jobs.submit(fn, *args, on_done=lambda message: messagebox.showinfo(title, message), on_error=show_error)
 
-def hide_loading():
-    loading_label.config(text="")
+    # ----- Input Fields -----
+    create_label("Name:").pack(pady=5)
+    name_entry = create_entry()
+    name_entry.pack(pady=5)
 
-# ----- Input Fields -----
-create_label("Name:").pack(pady=5)
-name_entry = create_entry()
-name_entry.pack(pady=5)
+    create_label("User ID:").pack(pady=5)
+    user_id_entry = create_entry()
+    user_id_entry.pack(pady=5)
 
-create_label("User ID:").pack(pady=5)
-user_id_entry = create_entry()
-user_id_entry.pack(pady=5)
+    create_label("PRN No:").pack(pady=5)
+    prn_entry = create_entry()
+    prn_entry.pack(pady=5)
 
-create_label("PRN No:").pack(pady=5)
-prn_entry = create_entry()
-prn_entry.pack(pady=5)
+    # ----- Button Functions -----
+    def read_inputs():
+        name, user_id, prn_no = name_entry.get(), user_id_entry.get(), prn_entry.get()
+        return (name, user_id, prn_no) if validate_inputs(name, user_id, prn_no) else None
 
-# ----- Button Functions -----
-def upload_and_add(is_file_path=False, file_path=None):
-    if not is_file_path:
+    def upload_and_add():
+        inputs = read_inputs()
+        if not inputs:
+            return
         file_path = filedialog.askopenfilename()
-        name = name_entry.get()
-        user_id = user_id_entry.get()
-        prn_no = prn_entry.get()
-        speak(f"Adding {name}'s face, Please wait...")
-        show_loading("Adding Face... Please Wait...")
-        add_face(name, user_id, prn_no, file_path)
-        hide_loading()
-    else:
-        name = name_entry.get()
-        user_id = user_id_entry.get()
-        prn_no = prn_entry.get()
-        speak(f"Adding {name}'s face, Please wait...")
-        show_loading("Adding Face... Please Wait...")
-        add_face(name, user_id, prn_no, file_path)
-        hide_loading()
-
-def upload_and_recognize():
-    file_path = filedialog.askopenfilename()
-    if file_path:
-        show_loading("Recognizing Face... Please Wait...")
-        recognize_face(file_path)
-        hide_loading()
-
-def capture_and_add():
-    speak("Capturing photo, Please wait...")
-    show_loading("Capturing Photo... Please Wait...")
-    file_path = capture_photo()
-    hide_loading()
-    if file_path:
-        upload_and_add(file_path = file_path, is_file_path=True)
-
-def capture_and_recognize():
-    speak("Capturing photo, Please wait...")
-    show_loading("Capturing Photo... Please Wait...")
-    file_path = capture_photo()
-    hide_loading()
-    if file_path:
-        recognize_face(file_path)
-
-# ----- Buttons -----
-tk.Button(root, text="Upload & Add Face", command=upload_and_add, **button_style).pack(pady=5)
-tk.Button(root, text="Upload & Recognize Face", command=upload_and_recognize, **button_style).pack(pady=5)
-tk.Button(root, text="Capture & Add Face", command=capture_and_add, **button_style).pack(pady=5)
-tk.Button(root, text="Capture & Recognize Face", command=capture_and_recognize, **button_style).pack(pady=5)
-tk.Button(root, text="Exit", command=root.quit, **button_style).pack(pady=10)
-
-root.mainloop()
\ No newline at end of file
+        if file_path:
+            speak(f"Adding {inputs[0]}'s face, Please wait...")
+            run_job(add_face, *inputs, file_path, title="Success")
+
+    def upload_and_recognize():
+        file_path = filedialog.askopenfilename()
+        if file_path:
+            run_job(recognize_face, file_path)
+
+    def upload_and_recognize_group():
+        file_path = filedialog.askopenfilename()
+        if file_path:
+            run_job(recognize_group, file_path)
+
+    def capture_and_add():
+        inputs = read_inputs()
+        if not inputs:
+            return
+        speak("Capturing photo, Please wait...")
+        run_job(lambda: add_face(*inputs, capture_photo(preview)), title="Success")
+
+    def capture_burst_and_add():
+        inputs = read_inputs()
+        if not inputs:
+            return
+        speak("Capturing photos, Please wait...")
+        run_job(lambda: add_face_burst(*inputs, capture_burst(preview=preview)), title="Success")
+
+    def capture_and_recognize():
+        speak("Capturing photo, Please wait...")
+        run_job(lambda: recognize_face(capture_photo(preview)))
+
+    # ----- Buttons -----
+    tk.Button(root, text="Upload & Add Face", command=upload_and_add, **button_style).pack(pady=5)
+    tk.Button(root, text="Upload & Recognize Face", command=upload_and_recognize, **button_style).pack(pady=5)
+    tk.Button(root, text="Upload & Recognize Group", command=upload_and_recognize_group, **button_style).pack(pady=5)
+    tk.Button(root, text="Capture & Add Face", command=capture_and_add, **button_style).pack(pady=5)
+    tk.Button(root, text="Capture Burst & Add Face", command=capture_burst_and_add, **button_style).pack(pady=5)
+    tk.Button(root, text="Capture & Recognize Face", command=capture_and_recognize, **button_style).pack(pady=5)
+    tk.Button(root, text="Exit", command=root.quit, **button_style).pack(pady=10)
+
+    root.mainloop()
+
+    # Let queued work finish: pending uploads fill in their URLs, the attendance buffer is flushed
+    jobs.shutdown()
+    if gallery_sync.loaded:
+        gallery_sync.stop()
+    if upload_queue.loaded:
+        upload_queue.shutdown()
+    if attendance_log.loaded:
+        attendance_log.stop()
+    if speaker.loaded:
+        speaker.stop()
+
+if __name__ == "__main__":
+    main()
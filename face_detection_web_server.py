@@ -1,12 +1,29 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File
+import asyncio
+import multiprocessing
+import threading
+from contextlib import asynccontextmanager
+from typing import List
+from fastapi import FastAPI, HTTPException, UploadFile, File, WebSocket, Request
+from fastapi.responses import PlainTextResponse
+from fastapi.concurrency import run_in_threadpool
 import cv2
-import numpy as np
-import face_recognition
-import shutil
 import os
-from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams, PointStruct
-from pymongo import MongoClient
+import time
+from qdrant_client.models import PointStruct
+from core import qdrant_client, warm_up
+from face_pipeline import get_face_embedding, get_face_embeddings_batch, get_group_embeddings
+from worker_pool import WorkerPool, PoolSaturated
+from recognition_batcher import RecognitionBatcher
+from gallery_store import open_local_index, upsert_points, delete_points
+from embedding_cache import EmbeddingCache
+from data_access import DataAccess
+from stream_recognition import StreamSession, serve_stream
+from camera_service import get_camera, stop_cameras
+from metrics import metrics, stage, request_timings, server_timing
+from group_recognition import match_group, attendance_records
+from attendance import AttendanceLog, AsyncMongoSink, JsonlSink
+from enrollment import build_template, template_points, prototype_ids, stale_prototype_ids, user_id_of, parse_user_id
+from gallery_sync import GallerySync, AsyncMongoChangeFeed, feed_head
 
 # ----- Configuration -----
 QDRANT_URL = "<URL>"  # Update with actual URL
@@ -15,102 +32,367 @@ MONGO_URI = "<MONGO_URI>"  # MongoDB connection URI
 DB_NAME = "FaceDB"
 COLLECTION_NAME = "face_attendance"
 VECTOR_DIM = 128  # face_recognition embeddings
+FACE_IMAGE_DIR = None  # Directory to persist cropped faces in, None to skip writing them
+SEARCH_BACKEND = "qdrant"  # "local" searches an in-process copy of the collection instead
+LOCAL_INDEX_MODE = "flat"  # "flat", "ivf" or "hnsw" (see embedding_index.py)
+GALLERY_STORE_DIR = None  # Memory-mapped copy of the gallery for fast cold starts (see gallery_store.py)
+LOCAL_INDEX_PRECISION = "float32"  # "float16" or "int8" shrink the local index 2x / 4x
+QDRANT_QUANTIZATION = False  # Create the collection with int8 scalar quantization kept in RAM
+ENROLL_MAX_SAMPLES = 10  # Photos accepted per /enroll request (see enrollment.py)
+
+# Worker pool for detection/encoding
+WORKER_MODE = "process"  # "process" scales with cores, "thread" avoids pickling overhead
+WORKER_COUNT = os.cpu_count()
+MAX_PENDING_JOBS = 32  # Encodes in flight before new requests get a 503
+# Workers are forked from a clean fork server that loaded the models once, so they share them
+# copy-on-write without forking this (multi-threaded) process; None for the platform default
+WORKER_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else None
+WARM_UP_AT_STARTUP = True  # Load the face models in the lifespan instead of on the first request (see core.py)
+
+# Micro-batching for /recognize_face: higher window = more throughput, more latency
+BATCH_WINDOW_MS = 10  # Set to 0 to encode every request on its own
+MAX_BATCH_SIZE = 16
+MAX_BATCH_QUEUE = 256  # Recognitions waiting for a batch before new ones get a 503
+
+# Embedding cache keyed by upload content, so resubmitted photos skip dlib entirely
+CACHE_MAX_ENTRIES = 4096
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+CACHE_DISK_DIR = None  # Optional on-disk tier shared across restarts
+
+# Data access: pooled async clients plus an in-process user cache (see data_access.py)
+MONGO_POOL_SIZE = 50
+USER_CACHE_SIZE = 100_000
+PRELOAD_USERS = True  # Load all user records at startup so identity lookups stay in memory
+IN_MEMORY_BACKENDS = False  # Qdrant ":memory:" + mongomock_motor instead of the servers above (offline runs, benchmark.py)
+
+RECOGNIZE_MATCH_THRESHOLD = 0.95  # Minimum cosine score for /recognize_face, weaker matches are not marked present
+STREAM_MATCH_THRESHOLD = 0.95  # Minimum cosine score for /ws/recognize identities
+GROUP_MATCH_THRESHOLD = 0.95  # Minimum cosine score per face for /recognize_group
+
+# Attendance is buffered and written in bulk in the background (see attendance.py)
+ATTENDANCE_DEDUPE_WINDOW = 300.0  # Seconds during which repeat check-ins of a user are ignored
+ATTENDANCE_FLUSH_INTERVAL = 2.0
+ATTENDANCE_MAX_BATCH = 500
+ATTENDANCE_FALLBACK_PATH = "attendance_pending.jsonl"  # Used while MongoDB is unreachable, None to keep retrying from memory
+
+# /capture_photo reads from a camera kept open for the life of the server (see camera_service.py)
+CAMERA_SOURCE = 0  # Camera index or a video file path
+CAMERA_OPEN_AT_STARTUP = False  # Open the camera in the lifespan instead of on the first capture
+CAMERA_TIMEOUT = 2.0  # Seconds to wait for a frame before failing the request
+
+# Enrollments written by other processes are pulled into the local index and user cache (see gallery_sync.py)
+GALLERY_SYNC = True
+GALLERY_SYNC_INTERVAL = 1.0  # Seconds between pulls when MongoDB change streams are unavailable
+GALLERY_CHANGE_RETENTION = 7 * 24 * 3600  # Seconds change log entries are kept before MongoDB expires them
+
+# Per-stage latency histograms are served on /metrics (see metrics.py)
+SERVER_TIMING = False  # Also report each request's stage timings in a Server-Timing header
 
 # ----- Initialize Clients -----
-app = FastAPI()
-qdrant_client = QdrantClient(url=QDRANT_URL, api_key=API_KEY)
-mongo_client = MongoClient(MONGO_URI)
-db = mongo_client[DB_NAME]
-users_collection = db["users"]
-
-# Ensure Qdrant collection exists
-if not qdrant_client.collection_exists(COLLECTION_NAME):
-    qdrant_client.create_collection(
-        collection_name=COLLECTION_NAME,
-        vectors_config=VectorParams(size=VECTOR_DIM, distance=Distance.COSINE),
-    )
+worker_pool = None
+recognition_batcher = None
+data_access = None
+attendance_log = None
+gallery_sync = None
+local_index = None  # Searches go to Qdrant (through data_access) or to a local index loaded from it
+index_lock = threading.Lock()  # Searches, upserts and gallery sync all run in threads
+embedding_cache = EmbeddingCache(CACHE_MAX_ENTRIES, CACHE_MAX_BYTES, CACHE_DISK_DIR)
+
+@asynccontextmanager
+async def lifespan(app):
+    global worker_pool, recognition_batcher, data_access, attendance_log, local_index, gallery_sync
+    if WARM_UP_AT_STARTUP:
+        # Used as is by thread workers; process workers load theirs once in the fork server
+        print(f"Face models loaded in {await run_in_threadpool(warm_up):.2f}s")
+    if IN_MEMORY_BACKENDS:
+        data_access = DataAccess.in_memory(COLLECTION_NAME)
+    else:
+        data_access = DataAccess(
+            COLLECTION_NAME, qdrant_url=QDRANT_URL, api_key=API_KEY, mongo_uri=MONGO_URI, db_name=DB_NAME,
+            mongo_pool_size=MONGO_POOL_SIZE, user_cache_size=USER_CACHE_SIZE,
+        )
+    await data_access.ensure_collection(VECTOR_DIM, QDRANT_QUANTIZATION)
+    if GALLERY_SYNC:
+        await data_access.change_log.expire_after(GALLERY_CHANGE_RETENTION)
+        gallery_feed = AsyncMongoChangeFeed(data_access.mongo_db)
+        sync_cursor = await feed_head(gallery_feed)  # Read before loading, so nothing written meanwhile is missed
+    if PRELOAD_USERS:
+        await data_access.warm_user_cache()
+    if SEARCH_BACKEND == "local":
+        local_index = await run_in_threadpool(
+            open_local_index, GALLERY_STORE_DIR, qdrant_client(QDRANT_URL, API_KEY), COLLECTION_NAME, VECTOR_DIM,
+            LOCAL_INDEX_MODE, LOCAL_INDEX_PRECISION,
+        )
+    attendance_log = AttendanceLog(
+        AsyncMongoSink(data_access.attendance, asyncio.get_running_loop()),
+        JsonlSink(ATTENDANCE_FALLBACK_PATH) if ATTENDANCE_FALLBACK_PATH else None,
+        ATTENDANCE_DEDUPE_WINDOW, ATTENDANCE_FLUSH_INTERVAL, ATTENDANCE_MAX_BATCH,
+    ).start()
+    sync_task = None
+    if GALLERY_SYNC:
+        gallery_sync = GallerySync(local_index, data_access.user_cache, sync_cursor, index_lock=index_lock)
+        sync_task = asyncio.create_task(gallery_sync.run_async(gallery_feed, GALLERY_SYNC_INTERVAL))
+        metrics.gauge("face_gallery_sync_version", lambda: gallery_sync.cursor, "Newest gallery change applied locally")
+    worker_pool = WorkerPool(WORKER_MODE, WORKER_COUNT, MAX_PENDING_JOBS, start_method=WORKER_START_METHOD)
+    if BATCH_WINDOW_MS > 0:
+        recognition_batcher = RecognitionBatcher(
+            worker_pool, get_face_embeddings_batch, search_faces, BATCH_WINDOW_MS, MAX_BATCH_SIZE, MAX_BATCH_QUEUE
+        )
+        recognition_batcher.start()
+        metrics.gauge("face_batch_queue_depth", recognition_batcher.queue.qsize, "Recognitions waiting for the next batch")
+    metrics.gauge("face_worker_pending_jobs", lambda: worker_pool.pending, "Encode jobs running or queued in the worker pool")
+    metrics.gauge("face_attendance_buffered", lambda: len(attendance_log.buffer), "Attendance entries waiting to be written")
+    metrics.gauge("face_user_cache_entries", lambda: len(data_access.user_cache), "Cached user records")
+    if CAMERA_OPEN_AT_STARTUP:
+        get_camera(CAMERA_SOURCE)
+    yield
+    stop_cameras()
+    if sync_task:
+        sync_task.cancel()
+        await asyncio.gather(sync_task, return_exceptions=True)
+    if recognition_batcher:
+        await recognition_batcher.stop()
+    worker_pool.shutdown()
+    await run_in_threadpool(attendance_log.stop)  # Final flush goes through this loop, so wait off it
+    await data_access.close()
+
+app = FastAPI(lifespan=lifespan)
+
+if SERVER_TIMING:
+    @app.middleware("http")
+    async def add_server_timing(request: Request, call_next):
+        timings = []
+        token = request_timings.set(timings)
+        start = time.perf_counter()
+        try:
+            response = await call_next(request)
+        finally:
+            request_timings.reset(token)
+        timings.append(("total", time.perf_counter() - start))
+        response.headers["Server-Timing"] = server_timing(timings)
+        return response
 
 # ----- Utility Functions -----
-def get_face_embedding(image_path):
-    image = face_recognition.load_image_file(image_path)
-    face_locations = face_recognition.face_locations(image)
-    if not face_locations:
-        raise ValueError("No face detected")
-    face_encoding = face_recognition.face_encodings(image, known_face_locations=face_locations)
-    
-    # Extract face region
-    top, right, bottom, left = face_locations[0]  # Assuming one face per image
-    face_image = image[top:bottom, left:right]
-    
-    # Save cropped face image
-    face_image_path = image_path.replace("temp_", "face_")
-    cv2.imwrite(face_image_path, cv2.cvtColor(face_image, cv2.COLOR_RGB2BGR))
-    
-    return face_encoding[0], face_image_path  # Return embedding and cropped face path
+def server_busy():
+    return HTTPException(status_code=503, detail="Server busy, try again later", headers={"Retry-After": "1"})
 
-# ----- API Routes -----
-@app.post("/add_face")
-async def add_face(name: str, user_id: str, prn_no: str, file: UploadFile = File(...)):
-    file_path = f"temp_{file.filename}"
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    
+async def run_face_embedding(data, face_image_dir=None):
     try:
-        embedding, face_image_path = get_face_embedding(file_path)
+        return await worker_pool.run(get_face_embedding, data, face_image_dir)
+    except PoolSaturated:
+        raise server_busy()
     except ValueError as e:
-        os.remove(file_path)
         raise HTTPException(status_code=400, detail=str(e))
-    
-    os.remove(file_path)
+
+async def group_face_embeddings(data):
+    # Cached next to the single-face entries, under a separate key
+    key = embedding_cache.key(data) + "-group"
+    cached = embedding_cache.get(key)
+    if cached is None:
+        start = time.perf_counter()
+        try:
+            cached = await worker_pool.run(get_group_embeddings, data)
+        except PoolSaturated:
+            raise server_busy()
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        embedding_cache.put(key, cached, time.perf_counter() - start)
+    return cached
+
+async def search_faces(embeddings):
+    with stage("search"):
+        if local_index is not None:
+            # Off the event loop, so a sync holding the lock never stalls other requests
+            return await run_in_threadpool(search_local, embeddings)
+        # One round-trip to Qdrant for the whole batch
+        return await data_access.search_batch(embeddings)
+
+def search_local(embeddings):
+    with index_lock:
+        return local_index.search_batch(embeddings, 1)  # In-memory, microseconds
+
+def update_local(points, deleted_ids=()):
+    # Store writes happen before the lock is taken
+    upsert_points(local_index, points, index_lock)
+    if deleted_ids:
+        delete_points(local_index, deleted_ids, index_lock)
+
+def parse_point_id(user_id):
+    try:
+        return parse_user_id(user_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+async def get_user(point_id):
+    with stage("user_lookup"):
+        return await data_access.get_user(point_id)
+
+async def read_upload(file):
+    with stage("upload"):
+        return await file.read()
+
+async def cached_face_embedding(data):
+    key = embedding_cache.key(data)
+    embedding = embedding_cache.get(key)
+    if embedding is None:
+        start = time.perf_counter()
+        embedding, _ = await run_face_embedding(data)
+        embedding_cache.put(key, embedding, time.perf_counter() - start)
+    return embedding
+
+async def recognize_embedding(data):
+    key = embedding_cache.key(data)
+    query_embedding = embedding_cache.get(key)
+    if query_embedding is None:
+        start = time.perf_counter()
+        try:
+            if recognition_batcher:
+                # The batcher searches too, so a miss is fully answered here
+                with stage("batched_recognize"):
+                    query_embedding, points = await recognition_batcher.recognize(data)
+                embedding_cache.put(key, query_embedding, time.perf_counter() - start)
+                return query_embedding, points
+            query_embedding, _ = await worker_pool.run(get_face_embedding, data)
+        except PoolSaturated:
+            raise server_busy()
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        embedding_cache.put(key, query_embedding, time.perf_counter() - start)
+    return query_embedding, (await search_faces([query_embedding]))[0]
+
+# ----- API Routes -----
+@app.post("/add_face")
+async def add_face(name: str, user_id: str, prn_no: str, file: UploadFile = File(...)):
+    point_id = parse_point_id(user_id)
+    data = await read_upload(file)
+    if FACE_IMAGE_DIR:
+        embedding, face_image_path = await run_face_embedding(data, FACE_IMAGE_DIR)
+    else:
+        embedding, face_image_path = await cached_face_embedding(data), None
     
     # Store in Qdrant
-    point_id = int(user_id)
-    qdrant_client.upsert(
-        collection_name=COLLECTION_NAME,
-        points=[PointStruct(id=point_id, vector=embedding.tolist(), payload={"name": name})]
-    )
+    points = [PointStruct(id=point_id, vector=embedding.tolist(), payload={"name": name})]
+    stale_ids = prototype_ids(point_id)  # Left by an earlier multi-sample enrollment, they would still match
+    with stage("qdrant_upsert"):
+        await data_access.upsert_points(points)
+        await data_access.delete_points(stale_ids)
+    if local_index is not None:
+        await run_in_threadpool(update_local, points, stale_ids)
     
     # Store in MongoDB
-    users_collection.insert_one({"_id": point_id, "name": name, "prn_no": prn_no, "face_image": face_image_path})
+    with stage("mongo_insert"):
+        await data_access.save_user({"_id": point_id, "name": name, "prn_no": prn_no, "face_image": face_image_path})
     return {"message": "Face added successfully", "user_id": user_id, "face_image": face_image_path}
 
 @app.post("/recognize_face")
 async def recognize_face(file: UploadFile = File(...)):
-    file_path = f"temp_{file.filename}"
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    data = await read_upload(file)
+    query_embedding, points = await recognize_embedding(data)
     
-    try:
-        query_embedding, _ = get_face_embedding(file_path)
-    except ValueError as e:
-        os.remove(file_path)
-        raise HTTPException(status_code=400, detail=str(e))
-    
-    os.remove(file_path)
-    search_results = qdrant_client.query_points(
-        collection_name=COLLECTION_NAME, query=query_embedding.tolist(), limit=1
-    )
-    
-    if not search_results.points:
+    with stage("user_lookup"):
+        # Prototype points map back to their user, usually served from the user cache
+        best_match, user_data = await data_access.identify(points, threshold=RECOGNIZE_MATCH_THRESHOLD)
+    if user_data is None:
         return {"message": "No matching face found"}
     
-    best_match = search_results.points[0]
-    user_data = users_collection.find_one({"_id": best_match.id})
-    
-    return {"user_id": best_match.id, "name": user_data["name"], "prn_no": user_data["prn_no"]}
+    user_id = user_id_of(best_match.id)
+    marked = attendance_log.record(user_id, user_data["name"], best_match.score)
+    return {"user_id": user_id, "name": user_data["name"], "prn_no": user_data["prn_no"],
+            "attendance_marked": marked}
+
+@app.post("/enroll")
+async def enroll(name: str, user_id: str, prn_no: str, files: List[UploadFile] = File(...)):
+    """
+    Multi-sample enrollment: all photos are encoded in one worker job, outliers are
+    rejected and the user is stored as a centroid plus a few prototypes.
+    """
+    if len(files) > ENROLL_MAX_SAMPLES:
+        raise HTTPException(status_code=400, detail=f"At most {ENROLL_MAX_SAMPLES} photos per enrollment")
+    point_id = parse_point_id(user_id)
+    datas = [await read_upload(file) for file in files]
+    try:
+        encoded = await worker_pool.run(get_face_embeddings_batch, datas)
+    except PoolSaturated:
+        raise server_busy()
+    found = [i for i, (embedding, _) in enumerate(encoded) if embedding is not None]
+    if not found:
+        raise HTTPException(status_code=400, detail="No usable face in any photo")
+    template = build_template([encoded[i][0] for i in found])
+
+    points = template_points(point_id, template, {"name": name})
+    stale_ids = stale_prototype_ids(point_id, template)
+    with stage("qdrant_upsert"):
+        await data_access.upsert_points(points)
+        await data_access.delete_points(stale_ids)
+    if local_index is not None:
+        await run_in_threadpool(update_local, points, stale_ids)
+    with stage("mongo_insert"):
+        await data_access.save_user({"_id": point_id, "name": name, "prn_no": prn_no, "face_image": None})
+
+    rejected = [{"file": files[i].filename, "reason": error} for i, (embedding, error) in enumerate(encoded) if embedding is None]
+    rejected += [{"file": files[i].filename, "reason": "Outlier"} for i, inlier in zip(found, template.inliers) if not inlier]
+    return {"message": "Face enrolled successfully", "user_id": user_id, "samples_used": int(template.inliers.sum()),
+            "prototypes": len(template.prototypes), "rejected": rejected}
+
+@app.post("/recognize_group")
+async def recognize_group(file: UploadFile = File(...), session: str = None):
+    """
+    Identifies every face in a group photo with one encode pass and one batched search,
+    and marks attendance for everyone recognized.
+    """
+    data = await read_upload(file)
+    embeddings, face_locations = await group_face_embeddings(data)
+    faces = match_group(face_locations, await search_faces(list(embeddings)), GROUP_MATCH_THRESHOLD)
+    matched = [face for face in faces if face["user_id"] is not None]
+    users = await asyncio.gather(*(get_user(face["user_id"]) for face in matched))
+    for face, user in zip(matched, users):
+        if user is None:
+            face["user_id"] = None  # Point without a user record
+        else:
+            face["name"], face["prn_no"] = user["name"], user["prn_no"]
+    records = attendance_records(faces, "group", session)
+    marked = attendance_log.record_many(records)  # Written in the background
+    return {"faces": faces, "present": [record["user_id"] for record in records], "faces_detected": len(faces),
+            "attendance_marked": [record["user_id"] for record in marked]}
+
+@app.get("/cache_stats")
+def cache_stats():
+    user_cache = data_access.user_cache
+    return {**embedding_cache.stats(), "user_cache": {"hits": user_cache.hits, "misses": user_cache.misses,
+                                                      "entries": len(user_cache)},
+            "attendance": attendance_log.stats(), "gallery_sync": gallery_sync.stats() if gallery_sync else None}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics_endpoint():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.websocket("/ws/recognize")
+async def recognize_stream(websocket: WebSocket):
+    """
+    Continuous recognition: send JPEG frames as binary messages, receive one JSON message
+    per processed frame with the tracked faces and any recognition/liveness events.
+    """
+    await websocket.accept()
+    session = StreamSession(worker_pool, search_faces, get_user, STREAM_MATCH_THRESHOLD)
+    await serve_stream(websocket, session, stream_error)
+
+def stream_error(e):
+    if isinstance(e, PoolSaturated):
+        return {"error": "Server busy, frame dropped"}
+    if isinstance(e, ValueError):
+        return {"error": str(e)}
+    return None
 
 @app.get("/capture_photo")
 def capture_photo():
-    cap = cv2.VideoCapture(0)
-    ret, frame = cap.read()
-    cap.release()
-    if not ret:
+    snapshot = get_camera(CAMERA_SOURCE).wait_for_frame(timeout=CAMERA_TIMEOUT)
+    if snapshot is None:
         raise HTTPException(status_code=500, detail="Failed to capture photo")
     file_path = "captured_face.jpg"
-    cv2.imwrite(file_path, frame)
+    cv2.imwrite(file_path, snapshot.image)
     return {"message": "Photo captured", "file_path": file_path}
 
-# Additional routes for real-time recognition and live streaming can be added.
+# Additional routes for live video streaming can be added.
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,291 @@
+import os
+import sys
+import time
+import uuid
+import cv2
+import numpy as np
+from core import face_recognition
+from metrics import stage, count
+from quality import QualityError, assess_face
+
+# ----- Detection Settings -----
+# Detection can run on a downscaled copy of the image; the boxes are mapped back so the
+# 128-d encodings are still computed on the full-resolution face. For 12MP phone photos
+# detection dominates request time, so a max-side cap of ~1000px is usually a big win.
+DETECTION_MODEL = "hog"  # "hog" (CPU) or "cnn" (accurate, wants a GPU build of dlib)
+DETECTION_SCALE = 1.0  # Fixed downscale factor for detection, 1.0 = native resolution
+DETECTION_MAX_SIDE = None  # Downscale further so the longer side is at most this many pixels
+DETECTION_UPSAMPLE = 1  # Times to upsample before detecting (finds smaller faces, slower)
+
+# ----- Quality Settings -----
+# Single-face encodes check the detected face first (see quality.py) and fail with a
+# QualityError (a ValueError carrying a reason code) instead of encoding a useless face.
+QUALITY_GATE = True
+QUALITY_POSE = True  # Include the pose check, from the 5-point landmarks (about 1 ms per face)
+
+def detection_factor(shape, scale=DETECTION_SCALE, max_side=DETECTION_MAX_SIDE):
+    factor = scale
+    longest = max(shape[:2])
+    if max_side and longest * factor > max_side:
+        factor = max_side / longest
+    return min(factor, 1.0)
+
+def scale_box(box, factor, shape):
+    height, width = shape[:2]
+    top, right, bottom, left = (int(round(v / factor)) for v in box)
+    return (max(0, top), min(width, right), min(height, bottom), max(0, left))
+
+def detect_faces(image, model=DETECTION_MODEL, scale=DETECTION_SCALE, max_side=DETECTION_MAX_SIDE,
+                 upsample=DETECTION_UPSAMPLE):
+    """
+    Finds faces, optionally on a downscaled copy of the image.
+
+    Returns:
+        face_locations (list): (top, right, bottom, left) boxes in full-resolution pixels
+    """
+    factor = detection_factor(image.shape, scale, max_side)
+    with stage("detect"):
+        if factor >= 1.0:
+            boxes = face_recognition.face_locations(image, upsample, model)
+        else:
+            small = cv2.resize(image, (0, 0), fx=factor, fy=factor, interpolation=cv2.INTER_AREA)
+            boxes = [scale_box(box, factor, image.shape) for box in face_recognition.face_locations(small, upsample, model)]
+    count("face_detections_total", len(boxes))
+    return boxes
+
+def measure_quality(image, face_location, pose=QUALITY_POSE):
+    """FaceQuality of one detected face, see quality.assess_face."""
+    with stage("quality"):
+        landmarks = face_recognition.face_landmarks(image, [face_location], model="small")[0] if pose else None
+        return assess_face(image, face_location, landmarks)
+
+def check_quality(image, face_location, pose=QUALITY_POSE):
+    """Raises QualityError if the face fails the quality gate."""
+    quality = measure_quality(image, face_location, pose)
+    if not quality.ok:
+        count("face_quality_rejections_total", reason=quality.reason)
+        raise QualityError(quality)
+    return quality
+
+def best_frame(images, model=DETECTION_MODEL, scale=DETECTION_SCALE, max_side=DETECTION_MAX_SIDE):
+    """
+    Picks the image whose first face has the best quality, e.g. from a short capture burst.
+
+    Returns:
+        (index, quality): the chosen image's index and its FaceQuality, (None, None) if no
+            image has a face. A passing face always beats a failing one.
+    """
+    best, best_quality = None, None
+    for i, image in enumerate(images):
+        face_locations = detect_faces(image, model, scale, max_side)
+        if not face_locations:
+            continue
+        quality = measure_quality(image, face_locations[0])
+        if best_quality is None or (quality.ok, quality.score) > (best_quality.ok, best_quality.score):
+            best, best_quality = i, quality
+    return best, best_quality
+
+# ----- In-memory Image Pipeline -----
+# Everything here works on encoded bytes / numpy arrays so uploads never have to
+# touch the filesystem. Cropped faces are only written when a directory is given.
+
+def decode_image(data):
+    """
+    Decodes encoded image bytes (JPEG, PNG, ...) straight into an RGB numpy array.
+
+    Args:
+        data (bytes): Raw contents of the uploaded image
+
+    Returns:
+        image (numpy.ndarray): HxWx3 uint8 RGB image
+
+    Raises:
+        ValueError: If the bytes are not a decodable image
+    """
+    with stage("decode"):
+        buffer = np.frombuffer(data, dtype=np.uint8)
+        image = cv2.imdecode(buffer, cv2.IMREAD_COLOR) if buffer.size else None
+        if image is None:
+            raise ValueError("Could not decode image")
+        return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+def encode_face(image, model=DETECTION_MODEL, scale=DETECTION_SCALE, max_side=DETECTION_MAX_SIDE):
+    """
+    Detects the faces in an RGB image and computes the 128-d embedding of the largest one
+    only. Detection settings are passed to detect_faces; encoding always uses the full image.
+
+    Returns:
+        (face_embedding, face_location): embedding and (top, right, bottom, left) box
+
+    Raises:
+        ValueError: If no face is detected in the image
+        QualityError: If the face fails the quality gate (QUALITY_GATE)
+    """
+    face_locations = detect_faces(image, model, scale, max_side)
+    if not face_locations:
+        count("face_no_face_rejections_total")
+        raise ValueError("No face detected")
+    face_locations = [max(face_locations, key=box_area)]  # The subject, not someone in the background
+    if QUALITY_GATE:
+        check_quality(image, face_locations[0])
+    with stage("encode"):
+        face_encoding = face_recognition.face_encodings(image, known_face_locations=face_locations)
+    return face_encoding[0], face_locations[0]
+
+def encode_faces(image, model=DETECTION_MODEL, scale=DETECTION_SCALE, max_side=DETECTION_MAX_SIDE):
+    """
+    Detects every face in an RGB image and encodes them all in one face_encodings call.
+
+    Returns:
+        (face_embeddings, face_locations): F x 128 array and the F (top, right, bottom, left) boxes
+
+    Raises:
+        ValueError: If no face is detected in the image
+    """
+    face_locations = detect_faces(image, model, scale, max_side)
+    if not face_locations:
+        count("face_no_face_rejections_total")
+        raise ValueError("No face detected")
+    with stage("encode"):
+        face_encodings = face_recognition.face_encodings(image, known_face_locations=face_locations)
+    return np.asarray(face_encodings), face_locations
+
+def box_area(face_location):
+    top, right, bottom, left = face_location
+    return (bottom - top) * (right - left)
+
+def crop_face(image, face_location):
+    top, right, bottom, left = face_location
+    return image[top:bottom, left:right]
+
+def encode_jpeg(face_image, quality=90):
+    """RGB crop -> JPEG bytes, for uploading without touching the disk."""
+    ok, buffer = cv2.imencode(".jpg", cv2.cvtColor(face_image, cv2.COLOR_RGB2BGR), [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise ValueError("Could not encode face crop")
+    return buffer.tobytes()
+
+def save_face_crop(face_image, face_image_dir):
+    # Unique names so concurrent uploads with the same filename never collide
+    os.makedirs(face_image_dir, exist_ok=True)
+    face_image_path = os.path.join(face_image_dir, f"face_{uuid.uuid4().hex}.jpg")
+    with stage("crop_write"):
+        cv2.imwrite(face_image_path, cv2.cvtColor(face_image, cv2.COLOR_RGB2BGR))
+    return face_image_path
+
+def get_face_embedding(data, face_image_dir=None, model=DETECTION_MODEL, scale=DETECTION_SCALE,
+                       max_side=DETECTION_MAX_SIDE):
+    """
+    Decodes an uploaded image from memory and computes the 128-d face embedding.
+
+    Args:
+        data (bytes): Raw contents of the uploaded image
+        face_image_dir (str): Directory to persist the cropped face in, or None to skip
+        model, scale, max_side: Detection settings, see detect_faces
+
+    Returns:
+        (face_embedding, face_image_path): embedding and crop path (None when not persisted)
+
+    Raises:
+        ValueError: If the image cannot be decoded, no face is detected or it fails the quality gate
+    """
+    image = decode_image(data)
+    face_embedding, face_location = encode_face(image, model, scale, max_side)
+    face_image_path = None
+    if face_image_dir:
+        face_image_path = save_face_crop(crop_face(image, face_location), face_image_dir)
+    return face_embedding, face_image_path
+
+def get_group_embeddings(data, model=DETECTION_MODEL, scale=DETECTION_SCALE, max_side=DETECTION_MAX_SIDE):
+    """
+    Decodes an uploaded group photo and computes an embedding for every face in it.
+
+    Returns:
+        (face_embeddings, face_locations): see encode_faces
+
+    Raises:
+        ValueError: If the image cannot be decoded or no face is detected
+    """
+    return encode_faces(decode_image(data), model, scale, max_side)
+
+def get_face_embeddings_batch(datas, model=DETECTION_MODEL, scale=DETECTION_SCALE, max_side=DETECTION_MAX_SIDE):
+    """
+    Decodes and encodes a batch of uploads in a single call (one worker round-trip).
+
+    With the CNN detector and equally sized images, detection runs through
+    face_recognition.batch_face_locations; otherwise each image is detected in turn.
+
+    Args:
+        datas (list[bytes]): Raw contents of the uploaded images
+        model, scale, max_side: Detection settings, see detect_faces
+
+    Returns:
+        results (list): (face_embedding, None) per image, or (None, error message) on failure
+    """
+    images = []
+    results = [None] * len(datas)
+    for i, data in enumerate(datas):
+        try:
+            images.append((i, decode_image(data)))
+        except ValueError as e:
+            results[i] = (None, str(e))
+
+    shapes = {image.shape for _, image in images}
+    if model == "cnn" and len(shapes) == 1:
+        shape = shapes.pop()
+        factor = detection_factor(shape, scale, max_side)
+        small = [cv2.resize(image, (0, 0), fx=factor, fy=factor, interpolation=cv2.INTER_AREA) if factor < 1.0 else image
+                 for _, image in images]
+        with stage("detect"):
+            batch_locations = [[scale_box(box, factor, shape) for box in boxes]
+                               for boxes in face_recognition.batch_face_locations(small, DETECTION_UPSAMPLE)]
+        count("face_detections_total", sum(len(boxes) for boxes in batch_locations))
+    else:
+        batch_locations = [detect_faces(image, model, scale, max_side) for _, image in images]
+
+    for (i, image), face_locations in zip(images, batch_locations):
+        if not face_locations:
+            count("face_no_face_rejections_total")
+            results[i] = (None, "No face detected")
+            continue
+        face_locations = [max(face_locations, key=box_area)]  # The subject, not someone in the background
+        if QUALITY_GATE:
+            try:
+                check_quality(image, face_locations[0])
+            except QualityError as e:
+                results[i] = (None, str(e))
+                continue
+        with stage("encode"):
+            face_encoding = face_recognition.face_encodings(image, known_face_locations=face_locations)
+        results[i] = (face_encoding[0], None)
+    return results
+
+# ----- Detection Benchmark -----
+# python face_pipeline.py photo1.jpg [photo2.jpg ...]
+# Times detection + encoding per image for a few scale/max-side/model settings.
+BENCHMARK_SETTINGS = [
+    ("hog", 1.0, None),
+    ("hog", 0.5, None),
+    ("hog", 1.0, 1024),
+    ("hog", 1.0, 640),
+    ("cnn", 1.0, 640),
+]
+
+def benchmark_detection(paths, settings=BENCHMARK_SETTINGS, repeats=3):
+    images = [(path, face_recognition.load_image_file(path)) for path in paths]
+    for model, scale, max_side in settings:
+        for path, image in images:
+            timings = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                face_locations = detect_faces(image, model, scale, max_side)
+                detected = time.perf_counter()
+                face_recognition.face_encodings(image, known_face_locations=face_locations[:1])
+                timings.append((detected - start, time.perf_counter() - detected))
+            detect_time, encode_time = min(timings)
+            print(f"{model} scale={scale} max_side={max_side} {os.path.basename(path)} "
+                  f"{image.shape[1]}x{image.shape[0]}: {len(face_locations)} face(s), "
+                  f"detect {detect_time * 1000:.1f} ms, encode {encode_time * 1000:.1f} ms")
+
+if __name__ == "__main__":
+    benchmark_detection(sys.argv[1:])
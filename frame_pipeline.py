@@ -0,0 +1,160 @@
+import threading
+import time
+import cv2
+
+# ----- Threaded Frame Pipeline -----
+# capture -> stage 1 -> stage 2 -> ... -> display
+#
+# Every hand-off is a single-slot "latest" queue: a producer that is faster than its
+# consumer overwrites the waiting item instead of queueing behind it. A slow detection
+# stage therefore never slows frame acquisition, and what gets displayed is always the
+# newest frame that made it through, not one from a second ago.
+
+class LatestSlot:
+    """Single-slot queue that keeps only the newest item and counts the ones it dropped."""
+
+    def __init__(self):
+        self.item = None
+        self.dropped = 0
+        self.closed = False
+        self.cond = threading.Condition()
+
+    def put(self, item):
+        with self.cond:
+            if self.item is not None:
+                self.dropped += 1
+            self.item = item
+            self.cond.notify_all()
+
+    def get(self, timeout=None):
+        """Waits for an item and takes it. Returns None on timeout or once closed."""
+        with self.cond:
+            self.cond.wait_for(lambda: self.item is not None or self.closed, timeout)
+            item, self.item = self.item, None
+            return item
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+class Frame:
+    def __init__(self, frame_id, image):
+        self.frame_id = frame_id
+        self.image = image  # BGR frame as read from the camera
+        self.captured_at = time.perf_counter()
+        self.results = {}  # Filled in by the stages, keyed by stage name
+
+    @property
+    def latency(self):
+        """Seconds since the frame was captured."""
+        return time.perf_counter() - self.captured_at
+
+class CaptureThread(threading.Thread):
+    """Reads frames from a cv2.VideoCapture source as fast as it delivers them."""
+
+    def __init__(self, source, outbox):
+        super().__init__(daemon=True)
+        self.source = source
+        self.outbox = outbox
+        self.running = True
+        self.failed = False
+        self.frames = 0
+
+    def run(self):
+        cap = cv2.VideoCapture(self.source)
+        try:
+            while self.running:
+                ret, image = cap.read()
+                if not ret:
+                    self.failed = True
+                    break
+                self.frames += 1
+                self.outbox.put(Frame(self.frames, image))
+        finally:
+            cap.release()
+            self.outbox.close()
+
+class Stage(threading.Thread):
+    """Worker that runs fn(frame) on the newest frame from inbox and passes it on."""
+
+    def __init__(self, name, fn, inbox, outbox):
+        super().__init__(daemon=True)
+        self.name = name
+        self.fn = fn
+        self.inbox = inbox
+        self.outbox = outbox
+        self.running = True
+        self.busy_time = 0.0
+
+    def run(self):
+        try:
+            while self.running:
+                frame = self.inbox.get(timeout=0.5)
+                if frame is None:
+                    if self.inbox.closed:
+                        break
+                    continue
+                start = time.perf_counter()
+                frame.results[self.name] = self.fn(frame)
+                self.busy_time += time.perf_counter() - start
+                self.outbox.put(frame)
+        finally:
+            self.outbox.close()
+
+class FramePipeline:
+    """
+    Capture thread plus a chain of worker stages.
+
+    Args:
+        source: Camera index or video file path for cv2.VideoCapture
+        stages (list): (name, fn) pairs; fn receives a Frame, earlier results are in frame.results
+
+    Usage:
+        with FramePipeline(0, [("detect", detect)]) as pipeline:
+            while True:
+                frame = pipeline.latest()
+                ...
+    """
+
+    def __init__(self, source=0, stages=()):
+        self.slots = [LatestSlot()]
+        self.capture = CaptureThread(source, self.slots[0])
+        self.stages = []
+        for name, fn in stages:
+            self.slots.append(LatestSlot())
+            self.stages.append(Stage(name, fn, self.slots[-2], self.slots[-1]))
+        self.latency = 0.0  # Smoothed capture-to-output latency in seconds
+
+    def start(self):
+        self.capture.start()
+        for stage in self.stages:
+            stage.start()
+        return self
+
+    def stop(self):
+        self.capture.running = False
+        for stage in self.stages:
+            stage.running = False
+        self.capture.join(timeout=2)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @property
+    def closed(self):
+        return self.slots[-1].closed and self.slots[-1].item is None
+
+    def latest(self, timeout=1.0):
+        """Newest fully processed frame, or None on timeout / when the source ended."""
+        frame = self.slots[-1].get(timeout)
+        if frame is not None:
+            self.latency = 0.9 * self.latency + 0.1 * frame.latency if self.latency else frame.latency
+        return frame
+
+    def dropped(self):
+        """Frames dropped at each hand-off, capture first."""
+        return [slot.dropped for slot in self.slots]
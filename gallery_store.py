@@ -0,0 +1,373 @@
+import json
+import os
+import numpy as np
+from embedding_index import EmbeddingIndex, QdrantCompatible, normalize, top_k
+
+try:
+    import fcntl  # Serialises appends from several processes (not available on Windows)
+except ImportError:
+    fcntl = None
+
+# ----- Memory-mapped Gallery Store -----
+# A compact on-disk copy of the face gallery that recognizer processes can open in
+# milliseconds. All workers map the same files, so the OS page cache holds one copy.
+#
+# Layout of a store directory:
+#   meta.json            {"dim": 128, "count": N, "generation": G}  (count is the commit point)
+#   embeddings.f32       N x dim float32, L2-normalised
+#   ids.i64              N int64 point ids
+#   payloads.bin         concatenated UTF-8 JSON payloads
+#   payload_offsets.u64  N uint64 end offsets into payloads.bin
+#
+# Records are only ever appended. Re-enrolling an id appends a new record; the latest
+# record for an id wins when reading, and compact() drops the superseded ones by writing
+# fresh files for the next generation (named e.g. embeddings.f32.3) and then switching
+# meta.json over to them. A reader always maps the files of the generation its meta.json
+# names, so it never pairs the new files with the old count; mapped readers keep the old
+# files until they refresh.
+#
+# Deletions are appended as tombstones (a NaN embedding). Records written from the
+# gallery change log (see gallery_sync.py) carry their change's version in the payload,
+# so several processes pulling the same changes write each of them only once.
+
+class GalleryStore:
+    """
+    Append-only gallery of (id, embedding, payload) records backed by numpy.memmap.
+
+    Args:
+        path (str): Store directory, created if missing
+        dim (int): Embedding dimension
+    """
+
+    def __init__(self, path, dim=128):
+        self.path = path
+        self.dim = dim
+        os.makedirs(path, exist_ok=True)
+        if not os.path.exists(self._file("meta.json")):
+            self._write_meta(0, 0)
+        self.count = 0
+        self.generation = -1
+        self.embeddings = np.empty((0, dim), dtype=np.float32)
+        self.ids = np.empty(0, dtype=np.int64)
+        self.offsets = np.empty(0, dtype=np.uint64)
+        self.payload_data = np.empty(0, dtype=np.uint8)
+        self.refresh()
+
+    def __len__(self):
+        return self.count
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _data_file(self, name, generation):
+        return self._file(f"{name}.{generation}" if generation else name)
+
+    def _read_meta(self):
+        with open(self._file("meta.json")) as f:
+            meta = json.load(f)
+        if meta["dim"] != self.dim:
+            raise ValueError(f"Store has dim {meta['dim']}, expected {self.dim}")
+        return meta
+
+    def _write_meta(self, count, generation):
+        tmp_path = self._file("meta.json.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({"dim": self.dim, "count": count, "generation": generation}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._file("meta.json"))
+
+    def _map(self, name, generation, dtype, count, shape=None):
+        if count == 0:
+            return np.empty(shape or (0,), dtype=dtype)
+        return np.memmap(self._data_file(name, generation), dtype=dtype, mode="r", shape=shape or (count,))
+
+    # ----- Reading -----
+    def refresh(self, retries=3):
+        """Re-maps the files if other processes appended since the last call. Returns the new count."""
+        meta = self._read_meta()
+        count, generation = meta["count"], meta.get("generation", 0)
+        if count != self.count or generation != self.generation:
+            try:
+                embeddings = self._map("embeddings.f32", generation, np.float32, count, (count, self.dim))
+                ids = self._map("ids.i64", generation, np.int64, count)
+                offsets = self._map("payload_offsets.u64", generation, np.uint64, count)
+                payload_size = int(offsets[-1]) if count else 0
+                payload_data = self._map("payloads.bin", generation, np.uint8, payload_size)
+            except FileNotFoundError:
+                if not retries:
+                    raise
+                return self.refresh(retries - 1)  # Compacted (and the old files removed) since meta.json was read
+            self.embeddings, self.ids, self.offsets, self.payload_data = embeddings, ids, offsets, payload_data
+            self.count = count
+            self.generation = generation
+        return self.count
+
+    def _payload_span(self, row):
+        start = int(self.offsets[row - 1]) if row else 0
+        return slice(start, int(self.offsets[row]))
+
+    def payload(self, row):
+        data = self.payload_data[self._payload_span(row)].tobytes()
+        return json.loads(data) if data else None
+
+    def is_tombstone(self, rows):
+        return np.isnan(self.embeddings[rows, 0])
+
+    def latest_rows(self, start=0):
+        """Row of the newest record for every id appended at or after `start`, in append order."""
+        rows = {}
+        for row, point_id in enumerate(self.ids[start:].tolist(), start):
+            rows.pop(point_id, None)
+            rows[point_id] = row
+        return rows
+
+    # ----- Writing -----
+    def append(self, ids, vectors, payloads=None):
+        """Appends records and commits them atomically by bumping the count in meta.json."""
+        with self._lock():
+            self._append_locked(self._read_meta(), ids, vectors, payloads)
+        return self.refresh()
+
+    def delete(self, ids, payloads=None):
+        """Appends tombstones, so the ids stop matching in every process that maps the store."""
+        return self.append(ids, np.full((len(ids), self.dim), np.nan, dtype=np.float32), payloads)
+
+    def apply_changes(self, changes):
+        """
+        Appends gallery change log entries (gallery_sync.Change) the store does not have yet:
+        one is written only if the newest record for its id carries an older payload version,
+        whoever wrote that record (another process applying the same entries, or a local
+        upsert whose payload the change log stamped). Deletions become tombstones carrying
+        their version. Returns the new count.
+        """
+        with self._lock():
+            self.refresh()
+            current = self._record_versions([change.key for change in changes])
+            fresh = []
+            for change in changes:
+                if change.version > current.get(change.key, 0):
+                    current[change.key] = change.version
+                    fresh.append(change)
+            if fresh:
+                ids = [change.key for change in fresh]
+                vectors = [change.vector if change.op == "upsert" else np.full(self.dim, np.nan) for change in fresh]
+                payloads = [change.payload if change.op == "upsert" else {"version": change.version} for change in fresh]
+                self._append_locked(self._read_meta(), ids, vectors, payloads)
+        return self.refresh()
+
+    def _record_versions(self, ids):
+        """Payload version of the newest record of each of ids the store holds."""
+        versions = {}
+        for row in np.flatnonzero(np.isin(self.ids, ids)).tolist():  # Ascending, so newer rows win
+            versions[int(self.ids[row])] = (self.payload(row) or {}).get("version", 0)
+        return versions
+
+    def _append_locked(self, meta, ids, vectors, payloads):
+        vectors = normalize(np.reshape(np.asarray(vectors, dtype=np.float32), (-1, self.dim)))
+        payloads = payloads if payloads is not None else [None] * len(ids)
+        encoded = [json.dumps(p).encode("utf-8") if p is not None else b"" for p in payloads]
+        count, generation = meta["count"], meta.get("generation", 0)
+        payload_size = self._committed_payload_size(count, generation)
+        # Drop anything a crashed writer left behind the commit point
+        self._truncate(self._data_file("embeddings.f32", generation), count * self.dim * 4)
+        self._truncate(self._data_file("ids.i64", generation), count * 8)
+        self._truncate(self._data_file("payload_offsets.u64", generation), count * 8)
+        self._truncate(self._data_file("payloads.bin", generation), payload_size)
+
+        offsets = payload_size + np.cumsum([len(p) for p in encoded], dtype=np.uint64)
+        self._append_bytes(self._data_file("embeddings.f32", generation), vectors.tobytes())
+        self._append_bytes(self._data_file("ids.i64", generation), np.asarray(ids, dtype=np.int64).tobytes())
+        self._append_bytes(self._data_file("payloads.bin", generation), b"".join(encoded))
+        self._append_bytes(self._data_file("payload_offsets.u64", generation), offsets.astype(np.uint64).tobytes())
+        self._write_meta(count + len(ids), generation)
+
+    def _lock(self):
+        return _FileLock(self._file("store.lock"))
+
+    def _committed_payload_size(self, count, generation):
+        if count == 0:
+            return 0
+        offsets = np.memmap(self._data_file("payload_offsets.u64", generation), dtype=np.uint64, mode="r",
+                            shape=(count,))
+        return int(offsets[-1])
+
+    def _truncate(self, path, size):
+        if not os.path.exists(path):
+            open(path, "wb").close()
+        elif os.path.getsize(path) > size:
+            os.truncate(path, size)
+
+    def _append_bytes(self, path, data):
+        with open(path, "ab") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def compact(self):
+        """Rewrites the store keeping only the newest record per id, minus deleted ids. Returns the new count."""
+        with self._lock():
+            self.refresh()
+            rows = np.array(list(self.latest_rows().values()), dtype=np.int64)
+            rows = rows[~self.is_tombstone(rows)]
+            if len(rows) == self.count:
+                return self.count
+            vectors = np.ascontiguousarray(self.embeddings[rows])
+            ids = np.ascontiguousarray(self.ids[rows])
+            encoded = [self.payload_data[self._payload_span(row)].tobytes() for row in rows]
+            offsets = np.cumsum([len(p) for p in encoded], dtype=np.uint64)
+            files = {
+                "embeddings.f32": vectors.tobytes(),
+                "ids.i64": ids.tobytes(),
+                "payloads.bin": b"".join(encoded),
+                "payload_offsets.u64": offsets.tobytes(),
+            }
+            generation = self.generation + 1
+            for name, data in files.items():
+                with open(self._data_file(name, generation), "wb") as f:
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+            self._write_meta(len(rows), generation)  # Readers switch over here
+            for name in files:
+                for old in range(generation):
+                    try:
+                        os.remove(self._data_file(name, old))  # Stays readable where still mapped
+                    except OSError:
+                        pass  # Already gone, or mapped on Windows (the next compaction retries)
+        return self.refresh()
+
+class _FileLock:
+    def __init__(self, path):
+        self.path = path
+
+    def __enter__(self):
+        self.file = open(self.path, "a")
+        if fcntl:
+            fcntl.flock(self.file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        self.file.close()  # Closing releases the flock
+
+def seed_from_qdrant(store, client, collection_name, batch_size=1024):
+    """Copies every point of a Qdrant collection into the store."""
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=collection_name, limit=batch_size, offset=offset,
+            with_payload=True, with_vectors=True,
+        )
+        if points:
+            store.append([point.id for point in points], [point.vector for point in points],
+                         [point.payload for point in points])
+        if offset is None:
+            break
+    return store
+
+# ----- Store-backed Search -----
+class MappedIndex(QdrantCompatible):
+    """
+    Exact cosine search directly over a GalleryStore's mapped embedding matrix.
+
+    Nothing is copied into process memory apart from a liveness mask, so per-worker RSS
+    stays flat however large the gallery grows. upsert() appends to the store, and sync()
+    picks up records (and tombstones) other processes appended.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.live = np.zeros(0, dtype=bool)  # False for records superseded by a newer one
+        self.generation = store.generation
+        self.sync()
+
+    def __len__(self):
+        return int(self.live.sum())
+
+    def sync(self):
+        self.store.refresh()
+        if self.store.generation != self.generation:
+            # Store was compacted, row numbers changed
+            self.generation = self.store.generation
+            self.live = np.zeros(0, dtype=bool)
+        synced = len(self.live)
+        if self.store.count == synced:
+            return self
+        new_ids = np.asarray(self.store.ids[synced:])
+        live = np.zeros(self.store.count, dtype=bool)
+        live[:synced] = self.live & ~np.isin(self.store.ids[:synced], new_ids)
+        latest_rows = list(self.store.latest_rows(synced).values())
+        live[latest_rows] = ~self.store.is_tombstone(latest_rows)
+        self.live = live
+        return self
+
+    def add(self, ids, vectors, payloads=None):
+        self.store.append(ids, vectors, payloads)
+        self.sync()
+
+    def search(self, query, k=1):
+        return self.search_batch([query], k)[0]
+
+    def search_batch(self, queries, k=1):
+        queries = normalize(np.reshape(queries, (-1, self.store.dim)))
+        if self.store.count != len(self.live) or self.store.generation != self.generation:
+            self.sync()  # Someone else refreshed the shared store
+        live = self.live  # One snapshot, so the mask and the rows it covers always agree
+        if not len(live):
+            return [[] for _ in queries]
+        scores = queries @ self.store.embeddings[:len(live)].T
+        scores[:, ~live] = -np.inf
+        k = min(k, int(live.sum()))
+        return [top_k(row_scores, k, self.point_id, self.store.payload) for row_scores in scores]
+
+    def point_id(self, row):
+        return int(self.store.ids[row])
+
+# ----- Shared Index Updates -----
+# Servers search one in-process index from several threads behind a lock. Store appends
+# fsync four files (and wait on the store's file lock), so they happen before the lock is
+# taken; only the in-memory update that follows holds it.
+
+def upsert_points(index, points, lock):
+    """Upserts Qdrant-style points into a local index (and its backing store, if any)."""
+    points = list(points)
+    store = getattr(index, "store", None)
+    if store is None:
+        with lock:
+            index.upsert(points=points)
+        return
+    if points:
+        store.append([point.id for point in points], [point.vector for point in points],
+                     [point.payload for point in points])
+    with lock:
+        index.sync()
+
+def delete_points(index, point_ids, lock):
+    """Removes points from a local index, as tombstones when it is backed by a store."""
+    store = getattr(index, "store", None)
+    if store is None:
+        with lock:
+            index.remove(point_ids)
+        return
+    if point_ids:
+        store.delete(point_ids)
+    with lock:
+        index.sync()
+
+def open_local_index(store_dir, client, collection_name, dim=128, mode="flat", precision="float32"):
+    """
+    Opens the in-process search backend used when SEARCH_BACKEND is "local".
+
+    With a store directory the gallery is read from disk (seeded from Qdrant the first
+    time), so startup needs neither a full download nor a reachable Qdrant. Flat float32
+    mode searches the mapped matrix directly; IVF/HNSW and quantised precisions build an
+    in-memory index from it.
+    """
+    if store_dir is None:
+        return EmbeddingIndex.from_qdrant(client, collection_name, dim, mode, precision=precision)
+    store = GalleryStore(store_dir, dim)
+    if not len(store):
+        seed_from_qdrant(store, client, collection_name)
+    if mode == "flat" and precision == "float32":
+        return MappedIndex(store)
+    return EmbeddingIndex.from_store(store, mode, precision=precision)
@@ -0,0 +1,418 @@
+import asyncio
+import contextlib
+import inspect
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timezone
+
+# ----- Gallery Change Log and Delta Sync -----
+# The Qdrant face collection and the Mongo users collection are written by the web
+# server, the desktop app and bulk_enroll.py. Every such write is also appended to a
+# versioned change log in MongoDB (gallery_changes), one entry per point or user record,
+# numbered from a shared counter. Recognizer processes remember the last version they
+# applied and pull only newer entries into their local index and user cache, so a new
+# enrollment is recognizable everywhere within a poll interval, without anybody
+# re-downloading the collection.
+#
+# Writers (ChangeLog / AsyncChangeLog):
+#   with log.recording(points=..., deleted_points=..., users=...):  # versions reserved,
+#       ...write to Qdrant / Mongo...                              # point payloads stamped
+#   # entries inserted once the block succeeds, nothing if it raises
+#
+# Readers (GallerySync) poll MongoChangeFeed / AsyncMongoChangeFeed for entries above
+# their cursor; change streams wake them as soon as an entry is written where MongoDB
+# supports them (replica sets). The log only holds finished writes, so a slow writer's
+# entries can land below a cursor that already moved past them: readers note versions
+# they skipped over and look them up again on every pull for late_window seconds (a
+# version whose write failed never shows up). A late change older than one already
+# applied to the same point or user is dropped.
+#
+# Entries expire after a retention period (expire_after(), a TTL index on "at").
+
+CHANGES_COLLECTION = "gallery_changes"
+COUNTERS_COLLECTION = "counters"
+VERSION_COUNTER = "gallery_version"
+POLL_INTERVAL = 1.0  # Seconds between pulls when change streams are not available
+LATE_WINDOW = 300.0  # Seconds readers keep looking for a version skipped over (a write still in progress)
+RETENTION = 7 * 24 * 3600  # Seconds entries are kept; a reader that falls further behind must reload
+BATCH_SIZE = 1000  # Entries per pull
+
+WATCH_PIPELINE = [{"$match": {"operationType": "insert"}}]
+
+Change = namedtuple("Change", ["version", "kind", "op", "key", "vector", "payload"])  # kind: "point" or "user"
+
+def build_changes(first_version, points=(), deleted_points=(), users=(), deleted_users=()):
+    """
+    Numbers the changes from first_version, in argument order, and stamps each point's
+    payload with its version (so a shared GalleryStore can tell which record is newer).
+    """
+    changes = []
+    version = first_version
+    for point in points:
+        point.payload = dict(point.payload or {}, version=version)
+        vector = point.vector.tolist() if hasattr(point.vector, "tolist") else list(point.vector)
+        changes.append(Change(version, "point", "upsert", point.id, vector, point.payload))
+        version += 1
+    for point_id in deleted_points:
+        changes.append(Change(version, "point", "delete", point_id, None, None))
+        version += 1
+    for user in users:
+        changes.append(Change(version, "user", "upsert", user["_id"], None, user))
+        version += 1
+    for user_id in deleted_users:
+        changes.append(Change(version, "user", "delete", user_id, None, None))
+        version += 1
+    return changes
+
+def change_document(change):
+    return {"_id": change.version, "kind": change.kind, "op": change.op, "key": change.key,
+            "vector": change.vector, "payload": change.payload, "at": datetime.now(timezone.utc)}
+
+def change_from_document(doc):
+    return Change(doc["_id"], doc["kind"], doc["op"], doc["key"], doc.get("vector"), doc.get("payload"))
+
+def _change_count(points, deleted_points, users, deleted_users):
+    return len(points) + len(deleted_points) + len(users) + len(deleted_users)
+
+def _reserve_update(count):
+    return {"_id": VERSION_COUNTER}, {"$inc": {"version": count}}
+
+# ----- Writers -----
+class ChangeLog:
+    """Writes to the change log with a blocking pymongo database."""
+
+    def __init__(self, database):
+        self.changes = database[CHANGES_COLLECTION]
+        self.counters = database[COUNTERS_COLLECTION]
+
+    def reserve(self, count):
+        """Reserves count consecutive versions and returns the first."""
+        from pymongo import ReturnDocument
+        counter = self.counters.find_one_and_update(*_reserve_update(count), upsert=True,
+                                                    return_document=ReturnDocument.AFTER)
+        return counter["version"] - count + 1
+
+    def prepare(self, points=(), deleted_points=(), users=(), deleted_users=()):
+        """Reserves versions and stamps point payloads, before the data is written. Returns the changes."""
+        args = list(points), list(deleted_points), list(users), list(deleted_users)
+        count = _change_count(*args)
+        return build_changes(self.reserve(count), *args) if count else []
+
+    def commit(self, changes):
+        """Inserts the entries, once the data they describe is written."""
+        if changes:
+            self.changes.insert_many([change_document(change) for change in changes], ordered=False)
+
+    @contextlib.contextmanager
+    def recording(self, **kwargs):
+        """prepare() before the block, commit() if it succeeds."""
+        changes = self.prepare(**kwargs)
+        yield changes
+        self.commit(changes)
+
+    def record(self, **kwargs):
+        """prepare + commit in one step, for changes already written."""
+        changes = self.prepare(**kwargs)
+        self.commit(changes)
+        return changes
+
+    def expire_after(self, seconds=RETENTION):
+        """Lets MongoDB drop entries older than seconds (a TTL index), so the log stays bounded."""
+        self.changes.create_index("at", expireAfterSeconds=int(seconds))
+
+class AsyncChangeLog:
+    """Writes to the change log with an async (motor) database."""
+
+    def __init__(self, database):
+        self.changes = database[CHANGES_COLLECTION]
+        self.counters = database[COUNTERS_COLLECTION]
+
+    async def reserve(self, count):
+        from pymongo import ReturnDocument
+        counter = await self.counters.find_one_and_update(*_reserve_update(count), upsert=True,
+                                                          return_document=ReturnDocument.AFTER)
+        return counter["version"] - count + 1
+
+    async def prepare(self, points=(), deleted_points=(), users=(), deleted_users=()):
+        args = list(points), list(deleted_points), list(users), list(deleted_users)
+        count = _change_count(*args)
+        return build_changes(await self.reserve(count), *args) if count else []
+
+    async def commit(self, changes):
+        if changes:
+            await self.changes.insert_many([change_document(change) for change in changes], ordered=False)
+
+    @contextlib.asynccontextmanager
+    async def recording(self, **kwargs):
+        changes = await self.prepare(**kwargs)
+        yield changes
+        await self.commit(changes)
+
+    async def record(self, **kwargs):
+        changes = await self.prepare(**kwargs)
+        await self.commit(changes)
+        return changes
+
+    async def expire_after(self, seconds=RETENTION):
+        await self.changes.create_index("at", expireAfterSeconds=int(seconds))
+
+# ----- Feeds -----
+class MongoChangeFeed:
+    """Reads the change log with a blocking pymongo database."""
+
+    def __init__(self, database, batch_size=BATCH_SIZE):
+        self.changes = database[CHANGES_COLLECTION]
+        self.counters = database[COUNTERS_COLLECTION]
+        self.batch_size = batch_size
+        self.stream = None
+        self.streams_supported = True
+
+    def head(self):
+        """Newest reserved version, the cursor to start from after a full load."""
+        counter = self.counters.find_one({"_id": VERSION_COUNTER})
+        return counter["version"] if counter else 0
+
+    def fetch(self, cursor):
+        docs = self.changes.find({"_id": {"$gt": cursor}}).sort("_id", 1).limit(self.batch_size)
+        return [change_from_document(doc) for doc in docs]
+
+    def fetch_versions(self, versions):
+        """Entries for specific versions (those a reader skipped over), as far as they exist yet."""
+        if not versions:
+            return []
+        return [change_from_document(doc) for doc in self.changes.find({"_id": {"$in": list(versions)}})]
+
+    def wait(self, timeout):
+        """Blocks until an entry is written or timeout passes. False if change streams are unavailable."""
+        if not self.streams_supported:
+            return False
+        try:
+            if self.stream is None:
+                self.stream = self.changes.watch(WATCH_PIPELINE, max_await_time_ms=int(timeout * 1000))
+            self.stream.try_next()
+            return True
+        except Exception as e:  # Standalone servers and mocks have no change streams
+            print(f"Change streams unavailable, polling the gallery change log instead: {e}")
+            self.close()
+            self.streams_supported = False
+            return False
+
+    def close(self):
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+
+class AsyncMongoChangeFeed:
+    """Reads the change log with an async (motor) database."""
+
+    def __init__(self, database, batch_size=BATCH_SIZE):
+        self.changes = database[CHANGES_COLLECTION]
+        self.counters = database[COUNTERS_COLLECTION]
+        self.batch_size = batch_size
+        self.stream = None
+        self.streams_supported = True
+
+    async def head(self):
+        counter = await self.counters.find_one({"_id": VERSION_COUNTER})
+        return counter["version"] if counter else 0
+
+    async def fetch(self, cursor):
+        docs = self.changes.find({"_id": {"$gt": cursor}}).sort("_id", 1).limit(self.batch_size)
+        return [change_from_document(doc) async for doc in docs]
+
+    async def fetch_versions(self, versions):
+        if not versions:
+            return []
+        return [change_from_document(doc) async for doc in self.changes.find({"_id": {"$in": list(versions)}})]
+
+    async def wait(self, timeout):
+        if not self.streams_supported:
+            return False
+        try:
+            if self.stream is None:
+                self.stream = self.changes.watch(WATCH_PIPELINE, max_await_time_ms=int(timeout * 1000))
+            await self.stream.try_next()
+            return True
+        except Exception as e:
+            print(f"Change streams unavailable, polling the gallery change log instead: {e}")
+            await self.close()
+            self.streams_supported = False
+            return False
+
+    async def close(self):
+        if self.stream is not None:
+            await self.stream.close()
+            self.stream = None
+
+# ----- Reader -----
+class GallerySync:
+    """
+    Applies change log entries to a process's local index and user cache.
+
+    Args:
+        index: Local search index (EmbeddingIndex or MappedIndex), None to skip points
+        user_cache (UserCache): Cache to update with user changes, None to skip users
+        cursor (int): Last version already reflected locally, normally feed.head() read
+            before the index and cache were loaded
+        index_lock: Held while the in-memory index is modified, if other threads use it
+        late_window (float): Seconds to keep looking for a version skipped over
+    """
+
+    def __init__(self, index=None, user_cache=None, cursor=0, index_lock=None, late_window=LATE_WINDOW):
+        self.index = index
+        self.index_lock = index_lock or contextlib.nullcontext()
+        self.user_cache = user_cache
+        self.cursor = cursor
+        self.late_window = late_window
+        self.missing = {}  # Version skipped over -> monotonic time it was first missed
+        self.key_versions = {}  # (kind, key) -> version applied, while late changes may still arrive
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.thread = None
+        self.applied = 0
+        self.stale = 0
+        self.given_up = 0
+        self.errors = 0
+        self.synced_at = None
+
+    def apply(self, changes):
+        """
+        Applies fetched changes: new ones above the cursor and late ones it had skipped.
+        Returns the number of changes applied.
+        """
+        with self.lock:
+            now = time.monotonic()
+            ready = []
+            for change in sorted(changes, key=lambda change: change.version):
+                if change.version > self.cursor:
+                    self.missing.update(dict.fromkeys(range(self.cursor + 1, change.version), now))
+                    self.cursor = change.version
+                elif self.missing.pop(change.version, None) is None:
+                    continue  # Already applied
+                key = (change.kind, change.key)
+                if self.key_versions.get(key, 0) > change.version:
+                    self.stale += 1  # Landed late, after a newer change of the same point or user
+                    continue
+                self.key_versions[key] = change.version
+                ready.append(change)
+
+            expired = [version for version, since in self.missing.items() if now - since >= self.late_window]
+            for version in expired:
+                del self.missing[version]  # Its write failed, or took longer than anyone waits
+            self.given_up += len(expired)
+            # Only changes at or above the oldest missing version can still be overtaken
+            oldest = min(self.missing, default=self.cursor + 1)
+            self.key_versions = {key: version for key, version in self.key_versions.items() if version >= oldest}
+
+            self._apply_points([change for change in ready if change.kind == "point"])
+            self._apply_users([change for change in ready if change.kind == "user"])
+            self.applied += len(ready)
+            self.synced_at = time.time()
+            return len(ready)
+
+    def _apply_points(self, changes):
+        if self.index is None or not changes:
+            return
+        store = getattr(self.index, "store", None)
+        if store is not None:
+            # Shared on-disk gallery: written once by whichever process gets there first,
+            # before taking the lock, which only covers picking the new records up
+            store.apply_changes(changes)
+            with self.index_lock:
+                self.index.sync()
+            return
+        with self.index_lock:
+            # Consecutive runs of the same operation go in one call
+            run = []
+            for change in changes + [None]:
+                if run and (change is None or change.op != run[0].op):
+                    ids = [c.key for c in run]
+                    if run[0].op == "upsert":
+                        self.index.add(ids, [c.vector for c in run], [c.payload for c in run])
+                    else:
+                        self.index.remove(ids)
+                    run = []
+                if change is not None:
+                    run.append(change)
+
+    def _apply_users(self, changes):
+        if self.user_cache is None:
+            return
+        for change in changes:
+            if change.op == "upsert":
+                self.user_cache.put(change.key, change.payload)
+            else:
+                self.user_cache.invalidate(change.key)
+
+    def missing_versions(self):
+        with self.lock:
+            return list(self.missing)
+
+    def pull(self, feed):
+        """Fetches and applies until caught up (blocking feeds). Returns the number applied."""
+        applied = self.apply(feed.fetch_versions(self.missing_versions()))
+        while True:
+            changes = feed.fetch(self.cursor)
+            applied += self.apply(changes)
+            if len(changes) < feed.batch_size:
+                return applied
+
+    async def pull_async(self, feed):
+        """pull() for the event loop: async feeds are awaited, blocking work runs in a thread."""
+        applied = await asyncio.to_thread(self.apply, await _call(feed.fetch_versions, self.missing_versions()))
+        while True:
+            changes = await _call(feed.fetch, self.cursor)
+            applied += await asyncio.to_thread(self.apply, changes)
+            if len(changes) < feed.batch_size:
+                return applied
+
+    # ----- Background Loops -----
+    def start(self, feed, interval=POLL_INTERVAL):
+        """Pulls on a daemon thread until stop()."""
+        self.thread = threading.Thread(target=self._run, args=(feed, interval), daemon=True)
+        self.thread.start()
+        return self
+
+    def _run(self, feed, interval):
+        while not self.stopping.is_set():
+            try:
+                self.pull(feed)
+            except Exception as e:
+                self.errors += 1
+                print(f"Gallery sync failed, retrying: {e!r}")
+            if not feed.wait(interval):
+                self.stopping.wait(interval)
+        feed.close()
+
+    def stop(self):
+        self.stopping.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    async def run_async(self, feed, interval=POLL_INTERVAL):
+        """Pull loop for the event loop; cancel the task to stop it."""
+        try:
+            while True:
+                try:
+                    await self.pull_async(feed)
+                except Exception as e:
+                    self.errors += 1
+                    print(f"Gallery sync failed, retrying: {e!r}")
+                if not await _call(feed.wait, interval):
+                    await asyncio.sleep(interval)
+        finally:
+            await _call(feed.close)
+
+    def stats(self):
+        return {"cursor": self.cursor, "applied": self.applied, "stale": self.stale, "missing": len(self.missing),
+                "given_up": self.given_up, "errors": self.errors, "synced_at": self.synced_at}
+
+async def _call(fn, *args):
+    if inspect.iscoroutinefunction(fn):
+        return await fn(*args)
+    return await asyncio.to_thread(fn, *args)
+
+async def feed_head(feed):
+    """feed.head() from the event loop, for blocking and async feeds alike."""
+    return await _call(feed.head)
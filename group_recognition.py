@@ -0,0 +1,51 @@
+from datetime import datetime, timezone
+from enrollment import user_id_of
+
+# ----- Group Recognition -----
+# A single classroom photo is encoded in one pass (face_pipeline.get_group_embeddings)
+# and all faces are searched with one batched vector query. match_group turns the
+# per-face search results into per-face identities, and attendance_records turns the
+# matches into one attendance entry per person.
+
+GROUP_MATCH_THRESHOLD = 0.95  # Minimum cosine score to accept a face's best match
+
+def match_group(face_locations, results, threshold=GROUP_MATCH_THRESHOLD):
+    """
+    Assigns identities to the faces of one photo.
+
+    A person can only appear once in a photo, so when several faces match the same
+    user (through any of their points) only the highest scoring face keeps it.
+
+    Args:
+        face_locations (list): (top, right, bottom, left) box per face
+        results (list): Scored points per face, best first (as from a batched query)
+        threshold (float): Minimum score to accept a match
+
+    Returns:
+        faces (list[dict]): box, user_id (None if unmatched) and score per face, in input order
+    """
+    faces = []
+    best_face = {}  # user id -> index of the face holding it
+    for i, (box, points) in enumerate(zip(face_locations, results)):
+        face = {"box": list(box), "user_id": None, "score": float(points[0].score) if points else 0.0}
+        faces.append(face)
+        if not points or points[0].score <= threshold:
+            continue
+        user_id = user_id_of(points[0].id)
+        holder = best_face.get(user_id)
+        if holder is not None:
+            if faces[holder]["score"] >= face["score"]:
+                continue
+            faces[holder]["user_id"] = None
+        face["user_id"] = user_id
+        best_face[user_id] = i
+    return faces
+
+def attendance_records(faces, source, session=None):
+    """One attendance entry per matched face, all sharing the same timestamp."""
+    now = datetime.now(timezone.utc)
+    return [
+        {"user_id": face["user_id"], "name": face.get("name"), "score": face["score"],
+         "source": source, "session": session, "timestamp": now}
+        for face in faces if face["user_id"] is not None
+    ]
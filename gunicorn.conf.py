@@ -0,0 +1,19 @@
+import os
+from core import warm_up
+
+# ----- Multi-worker Server -----
+#   gunicorn -c gunicorn.conf.py face_detection_web_server:app
+#
+# The master loads the face models once and then forks the workers, which share those
+# pages copy-on-write instead of each loading ~100 MB of dlib models (see core.py).
+# Every worker still runs the app's lifespan (its own clients and encode pool); its
+# warm-up finds the models already loaded and returns immediately.
+
+bind = os.environ.get("BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True  # Import the app in the master, before forking
+timeout = 120
+
+def on_starting(server):
+    server.log.info("Face models loaded in %.2fs", warm_up())
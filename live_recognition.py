@@ -0,0 +1,230 @@
+import time
+import cv2
+from core import face_recognition
+from qdrant_client.models import QueryRequest
+from face_boxes import match_boxes
+from enrollment import user_id_of
+from face_pipeline import detect_faces
+from liveness import LivenessTracker, eyes_from_landmark_dicts
+from quality import assess_face, clip_box
+
+try:
+    import dlib  # correlation_tracker follows faces between detections
+except ImportError:
+    dlib = None
+
+# ----- Live Multi-face Recognition -----
+# Full HOG detection only runs every DETECT_EVERY frames; in between, faces are followed
+# by a cheap tracker. A face is encoded and searched only when its track is new or its
+# identity has gone stale, and the identity is cached on the track. With several people
+# in view that turns N encodes + N vector queries per frame into a handful per second.
+#
+# Before a track is encoded, its crop is quality-checked on each of QUALITY_BURST frames
+# (see quality.py) and only the best passing crop is encoded. Blurry, tiny, dark or
+# turned-away faces are never encoded; their track shows the reason instead.
+
+DETECT_EVERY = 5  # Run face detection every N frames
+DETECTION_SCALE = 0.5  # Detect on a downscaled frame, boxes are mapped back to full size
+IOU_MATCH = 0.3  # Minimum overlap for a detection to continue an existing track
+MAX_MISSES = 2  # Detection rounds a track may go unmatched before it is dropped
+IDENTITY_TTL = 3.0  # Seconds before a track's identity is re-checked
+MATCH_THRESHOLD = 0.95  # Minimum cosine score to accept a match
+REQUIRE_LIVENESS = False  # Only accept a match once the face has blinked (see liveness.py)
+QUALITY_BURST = 4  # Frames a track is quality-checked over before its best crop is encoded, 1 = current frame
+QUALITY_POSE = True  # Include the landmark pose check (5-point model, about 1 ms per face)
+
+class Track:
+    def __init__(self, track_id, box):
+        self.track_id = track_id
+        self.box = box  # (top, right, bottom, left) in full-frame pixels
+        self.tracker = None
+        self.misses = 0
+        self.name = None  # None until identified, "Unknown" when no match passed the threshold
+        self.user_id = None
+        self.score = 0.0
+        self.identified_at = None
+        self.best = None  # (quality score, rgb frame, box) of the best crop in the current burst
+        self.burst_frames = 0
+        self.quality_reason = None  # Why the last crop was skipped, None if it passed
+
+    def needs_identity(self, now, ttl):
+        return self.identified_at is None or now - self.identified_at > ttl
+
+    def start_tracker(self, rgb_frame):
+        if dlib is None:
+            return
+        top, right, bottom, left = self.box
+        self.tracker = dlib.correlation_tracker()
+        self.tracker.start_track(rgb_frame, dlib.rectangle(left, top, right, bottom))
+
+    def follow(self, rgb_frame):
+        if self.tracker is None:
+            return  # IoU-only mode, keep the last detected box
+        self.tracker.update(rgb_frame)
+        pos = self.tracker.get_position()
+        self.box = (int(pos.top()), int(pos.right()), int(pos.bottom()), int(pos.left()))
+
+class FaceTracker:
+    """
+    Detection/tracking split with a per-track identity cache.
+
+    Args:
+        detect_every (int): Detection interval in frames
+        detection_scale (float): Downscale factor for detection
+        use_correlation (bool): Follow faces with dlib.correlation_tracker between detections,
+            otherwise boxes stay where they were last detected (IoU matching only)
+    """
+
+    def __init__(self, detect_every=DETECT_EVERY, detection_scale=DETECTION_SCALE,
+                 iou_match=IOU_MATCH, max_misses=MAX_MISSES, identity_ttl=IDENTITY_TTL,
+                 use_correlation=True):
+        self.detect_every = detect_every
+        self.detection_scale = detection_scale
+        self.iou_match = iou_match
+        self.max_misses = max_misses
+        self.identity_ttl = identity_ttl
+        self.use_correlation = use_correlation and dlib is not None
+        self.tracks = []
+        self.frame_index = 0
+        self.next_track_id = 1
+
+    def detect(self, rgb_frame):
+        return detect_faces(rgb_frame, scale=self.detection_scale)
+
+    def update(self, rgb_frame):
+        """
+        Advances the tracker by one frame.
+
+        Returns:
+            tracks (list[Track]): Tracks that need to be (re-)identified on this frame
+        """
+        if self.frame_index % self.detect_every == 0:
+            self._match_detections(rgb_frame, self.detect(rgb_frame))
+        else:
+            for track in self.tracks:
+                track.follow(rgb_frame)
+        self.frame_index += 1
+        now = time.monotonic()
+        return [track for track in self.tracks if track.needs_identity(now, self.identity_ttl)]
+
+    def _match_detections(self, rgb_frame, boxes):
+        pairs = match_boxes([track.box for track in self.tracks], boxes, self.iou_match)
+        matched_tracks = {t for t, _ in pairs}
+        matched_boxes = {b for _, b in pairs}
+        for t, b in pairs:
+            track = self.tracks[t]
+            track.box = boxes[b]
+            track.misses = 0
+            if self.use_correlation:
+                track.start_tracker(rgb_frame)
+
+        survivors = []
+        for t, track in enumerate(self.tracks):
+            if t not in matched_tracks:
+                track.misses += 1
+                if track.misses > self.max_misses:
+                    continue
+            survivors.append(track)
+        for b, box in enumerate(boxes):
+            if b not in matched_boxes:
+                track = Track(self.next_track_id, box)
+                self.next_track_id += 1
+                if self.use_correlation:
+                    track.start_tracker(rgb_frame)
+                survivors.append(track)
+        self.tracks = survivors
+
+def select_best_frames(rgb_frame, tracks, burst=QUALITY_BURST, pose=QUALITY_POSE):
+    """
+    Quality-checks this frame's crop of each track awaiting identity and keeps the best one.
+
+    Returns:
+        tracks (list[Track]): Tracks whose burst is complete and that have a passing crop
+    """
+    if not tracks:
+        return []
+    boxes = [clip_box(track.box, rgb_frame.shape) for track in tracks]
+    landmarks = face_recognition.face_landmarks(rgb_frame, boxes, model="small") if pose else [None] * len(tracks)
+    ready = []
+    for track, box, face_landmarks in zip(tracks, boxes, landmarks):
+        quality = assess_face(rgb_frame, box, face_landmarks)
+        track.quality_reason = quality.reason
+        if quality.ok and (track.best is None or quality.score > track.best[0]):
+            track.best = (quality.score, rgb_frame, box)
+        track.burst_frames += 1
+        if track.burst_frames >= burst:
+            track.burst_frames = 0
+            if track.best is not None:
+                ready.append(track)
+    return ready
+
+def identify_tracks(tracks, search_client, collection_name, threshold=MATCH_THRESHOLD):
+    """Encodes the best crop of each track and searches them all in one batched query."""
+    if not tracks:
+        return
+    encodings = []
+    for track in tracks:
+        _, frame, box = track.best
+        track.best = None
+        encodings.extend(face_recognition.face_encodings(frame, known_face_locations=[box]))
+    responses = search_client.query_batch_points(
+        collection_name=collection_name,
+        requests=[QueryRequest(query=encoding.tolist(), limit=1, with_payload=True) for encoding in encodings],
+    )
+    now = time.monotonic()
+    for track, response in zip(tracks, responses):
+        track.name, track.user_id, track.score = "Unknown", None, 0.0
+        if response.points and response.points[0].score > threshold:
+            best_match = response.points[0]
+            track.user_id, track.score = user_id_of(best_match.id), best_match.score
+            track.name = (best_match.payload or {}).get("name", str(track.user_id))
+        track.identified_at = now
+
+def update_liveness(rgb_frame, tracks, liveness):
+    """Feeds eye landmarks of all tracked faces to the liveness tracker, keyed by track id."""
+    if not tracks:
+        return
+    landmarks = face_recognition.face_landmarks(rgb_frame, [track.box for track in tracks])
+    liveness.update_ids([track.track_id for track in tracks], eyes_from_landmark_dicts(landmarks))
+
+def draw_tracks(frame, tracks, liveness=None):
+    for track in tracks:
+        top, right, bottom, left = track.box
+        label = track.name or (f"... ({track.quality_reason})" if track.quality_reason else "...")
+        accepted = track.user_id is not None
+        if accepted and liveness is not None and not liveness.is_live(track.track_id):
+            accepted = False
+            label = f"{label} (blink to verify)"
+        color = (0, 255, 0) if accepted else (0, 0, 255)
+        cv2.rectangle(frame, (left, top), (right, bottom), color, 2)
+        cv2.putText(frame, label, (left, top - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.9, color, 2)
+
+def run_live_recognition(search_client, collection_name, camera=0, threshold=MATCH_THRESHOLD,
+                         require_liveness=REQUIRE_LIVENESS):
+    """Webcam loop: press 'q' to quit."""
+    cap = cv2.VideoCapture(camera)
+    face_tracker = FaceTracker()
+    liveness = LivenessTracker() if require_liveness else None
+    last = time.perf_counter()
+    fps = 0.0
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            print("Failed to capture frame")
+            break
+        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        ready = select_best_frames(rgb_frame, face_tracker.update(rgb_frame))
+        identify_tracks(ready, search_client, collection_name, threshold)
+        if liveness is not None:
+            update_liveness(rgb_frame, face_tracker.tracks, liveness)
+        draw_tracks(frame, face_tracker.tracks, liveness)
+
+        now = time.perf_counter()
+        fps = 0.9 * fps + 0.1 / max(now - last, 1e-6)
+        last = now
+        cv2.putText(frame, f"FPS: {fps:.1f}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 0), 2)
+        cv2.imshow("Webcam Face Recognition", frame)
+        if cv2.waitKey(1) & 0xFF == ord("q"):
+            break
+    cap.release()
+    cv2.destroyAllWindows()
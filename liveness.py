@@ -0,0 +1,136 @@
+import time
+from collections import deque
+import numpy as np
+from face_boxes import match_boxes
+
+# ----- Blink-based Liveness -----
+# Eye aspect ratio (EAR) for every face and both eyes is computed in one NumPy operation,
+# and blink state is kept per face, so several people can be checked at once and the
+# cost per frame stays nearly flat as faces are added. Recognizers should only accept a
+# match once is_live() is True for that face.
+
+EYE_AR_THRESH = 0.2  # EAR below which the eye is considered closed
+EYE_AR_CONSEC_FRAMES = 2  # Frames the eyes must stay closed to count as a blink
+REQUIRED_BLINKS = 1  # Blinks needed before a face counts as live
+HISTORY_FRAMES = 30  # EAR samples kept per face
+MAX_AGE = 2.0  # Seconds a face may go unseen before its state is dropped
+
+# 68-point landmark indices: right eye 36-41, left eye 42-47
+EYE_LANDMARKS = np.array([list(range(42, 48)), list(range(36, 42))])
+
+def eyes_from_shapes(landmarks):
+    """(F, 68, 2) landmark array -> (F, 2, 6, 2) eye points (left eye, right eye)."""
+    return np.asarray(landmarks, dtype=np.float32)[:, EYE_LANDMARKS]
+
+def eyes_from_landmark_dicts(landmark_dicts):
+    """face_recognition.face_landmarks() output -> (F, 2, 6, 2) eye points."""
+    return np.array([[face["left_eye"], face["right_eye"]] for face in landmark_dicts], dtype=np.float32).reshape(-1, 2, 6, 2)
+
+def shapes_to_array(shapes):
+    """dlib full_object_detection list -> (F, 68, 2) array."""
+    return np.array([[(p.x, p.y) for p in shape.parts()] for shape in shapes], dtype=np.float32).reshape(-1, 68, 2)
+
+def eye_aspect_ratios(eyes):
+    """
+    EAR for every face in one pass.
+
+    Args:
+        eyes (numpy.ndarray): (F, 2, 6, 2) eye landmark points
+
+    Returns:
+        ears (numpy.ndarray): (F,) mean EAR of both eyes
+    """
+    # Vertical distances p2-p6, p3-p5 and the horizontal distance p1-p4, for all eyes at once
+    vertical = np.linalg.norm(eyes[:, :, [1, 2]] - eyes[:, :, [5, 4]], axis=-1).sum(axis=-1)
+    horizontal = np.linalg.norm(eyes[:, :, 0] - eyes[:, :, 3], axis=-1)
+    return (vertical / (2.0 * np.maximum(horizontal, 1e-6))).mean(axis=1)
+
+class FaceLiveness:
+    def __init__(self, face_id, history=HISTORY_FRAMES):
+        self.face_id = face_id
+        self.box = None
+        self.closed_frames = 0
+        self.blinks = 0
+        self.ear_history = deque(maxlen=history)
+        self.closed_history = deque(maxlen=history)
+        self.last_seen = 0.0
+        self.ear = 0.0
+
+    @property
+    def eyes_closed(self):
+        return bool(self.closed_history) and self.closed_history[-1]
+
+class LivenessTracker:
+    """
+    Per-face blink state for many faces at once.
+
+    Faces are identified either by ids the caller already has (update_ids, e.g. track ids)
+    or by matching boxes against the faces seen on the previous frame (update).
+    """
+
+    def __init__(self, ear_thresh=EYE_AR_THRESH, consec_frames=EYE_AR_CONSEC_FRAMES,
+                 required_blinks=REQUIRED_BLINKS, history=HISTORY_FRAMES, max_age=MAX_AGE, iou_match=0.3):
+        self.ear_thresh = ear_thresh
+        self.consec_frames = consec_frames
+        self.required_blinks = required_blinks
+        self.history = history
+        self.max_age = max_age
+        self.iou_match = iou_match
+        self.faces = {}
+        self.next_face_id = 1
+
+    def update(self, boxes, eyes):
+        """Assigns face ids by box overlap with the previous frame, then updates them."""
+        previous = [face for face in self.faces.values() if face.box is not None]
+        pairs = dict((n, o) for o, n in match_boxes([face.box for face in previous], boxes, self.iou_match))
+        face_ids = []
+        for n in range(len(boxes)):
+            if n in pairs:
+                face_ids.append(previous[pairs[n]].face_id)
+            else:
+                face_ids.append(self.next_face_id)
+                self.next_face_id += 1
+        states = self.update_ids(face_ids, eyes)
+        for state, box in zip(states, boxes):
+            state.box = box
+        return states
+
+    def update_ids(self, face_ids, eyes):
+        """
+        Feeds one frame of eye landmarks for the given faces.
+
+        Returns:
+            states (list[FaceLiveness]): Updated state per face, in input order
+        """
+        now = time.monotonic()
+        ears = eye_aspect_ratios(eyes) if len(face_ids) else np.empty(0)
+        closed = ears < self.ear_thresh
+        states = []
+        for face_id, ear, is_closed in zip(face_ids, ears.tolist(), closed.tolist()):
+            state = self.faces.get(face_id)
+            if state is None:
+                state = self.faces[face_id] = FaceLiveness(face_id, self.history)
+            if is_closed:
+                state.closed_frames += 1
+            else:
+                if state.closed_frames >= self.consec_frames:
+                    state.blinks += 1
+                state.closed_frames = 0
+            state.ear = ear
+            state.ear_history.append(ear)
+            state.closed_history.append(is_closed)
+            state.last_seen = now
+            states.append(state)
+        self._prune(now)
+        return states
+
+    def _prune(self, now):
+        for face_id in [fid for fid, state in self.faces.items() if now - state.last_seen > self.max_age]:
+            del self.faces[face_id]
+
+    def is_live(self, face_id):
+        state = self.faces.get(face_id)
+        return state is not None and state.blinks >= self.required_blinks
+
+    def reset(self, face_id):
+        self.faces.pop(face_id, None)
@@ -0,0 +1,164 @@
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+# ----- Stage Metrics -----
+# Times each step of a recognition (decode, detect, encode, search, ...) into per-stage
+# histograms and keeps a few counters and gauges, rendered in the Prometheus text format
+# for the /metrics endpoint. An observation is a perf_counter pair, a bisect and a lock,
+# so it is cheap enough to leave on in production.
+#
+# Stages timed inside pool workers are collected into a StageRecord and sent back with
+# the result (see run_with_stages), because a worker process has its own copy of the
+# registry. Stages recorded while a request is active also go into that request's
+# Server-Timing header.
+
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Histogram:
+    def __init__(self, buckets=STAGE_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+class Metrics:
+    """Process-wide registry of stage histograms, counters and gauges."""
+
+    def __init__(self, buckets=STAGE_BUCKETS):
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.stages = {}  # stage -> Histogram
+        self.counters = {}  # (name, labels) -> value
+        self.gauges = {}  # name -> (help, callable)
+        self.help = {}
+
+    def observe(self, stage, seconds):
+        with self.lock:
+            histogram = self.stages.get(stage)
+            if histogram is None:
+                histogram = self.stages[stage] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def describe(self, name, help):
+        self.help[name] = help
+
+    def gauge(self, name, fn, help=""):
+        """Registers a gauge read by calling fn() at scrape time (e.g. a queue length)."""
+        self.gauges[name] = (help, fn)
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = ["# HELP face_stage_seconds Time spent in each recognition stage",
+                 "# TYPE face_stage_seconds histogram"]
+        with self.lock:
+            for stage, histogram in sorted(self.stages.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), histogram.counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f'face_stage_seconds_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+                lines.append(f'face_stage_seconds_sum{{stage="{stage}"}} {histogram.sum}')
+                lines.append(f'face_stage_seconds_count{{stage="{stage}"}} {histogram.count}')
+            counters = sorted(self.counters.items())
+        described = set()
+        for (name, labels), value in counters:
+            if name not in described:
+                described.add(name)
+                if name in self.help:
+                    lines.append(f"# HELP {name} {self.help[name]}")
+                lines.append(f"# TYPE {name} counter")
+            label_text = ",".join(f'{key}="{label}"' for key, label in labels)
+            lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+        for name, (help, fn) in sorted(self.gauges.items()):
+            try:
+                value = fn()
+            except Exception:
+                continue  # e.g. the pool is not running yet
+            if help:
+                lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+metrics = Metrics()
+metrics.describe("face_detections_total", "Faces found by the detector")
+metrics.describe("face_no_face_rejections_total", "Images rejected because no face was detected")
+metrics.describe("face_quality_rejections_total", "Faces skipped before encoding by the quality gate, by reason")
+
+# Per-request list of (stage, seconds), set by the Server-Timing middleware
+request_timings = contextvars.ContextVar("request_timings", default=None)
+_worker = threading.local()
+
+class StageRecord:
+    """Stage timings and counts collected inside a worker, applied by the caller."""
+
+    def __init__(self):
+        self.stages = []
+        self.counts = {}  # (name, labels) -> amount
+
+    def apply(self):
+        for name, seconds in self.stages:
+            record_stage(name, seconds)
+        for (name, labels), amount in self.counts.items():
+            metrics.inc(name, amount, **dict(labels))
+
+def record_stage(name, seconds):
+    record = getattr(_worker, "record", None)
+    if record is not None:
+        record.stages.append((name, seconds))
+        return
+    metrics.observe(name, seconds)
+    timings = request_timings.get()
+    if timings is not None:
+        timings.append((name, seconds))
+
+@contextmanager
+def stage(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - start)
+
+def count(name, amount=1, **labels):
+    record = getattr(_worker, "record", None)
+    if record is not None:
+        key = (name, tuple(sorted(labels.items())))
+        record.counts[key] = record.counts.get(key, 0) + amount
+    else:
+        metrics.inc(name, amount, **labels)
+
+def run_with_stages(fn, *args):
+    """
+    Worker-side wrapper: runs fn and returns (result, StageRecord). If fn raises, the
+    record travels back on the exception as stage_record.
+    """
+    record = StageRecord()
+    _worker.record = record
+    try:
+        return fn(*args), record
+    except Exception as e:
+        e.stage_record = record
+        raise
+    finally:
+        _worker.record = None
+
+def server_timing(timings):
+    """Server-Timing header value; repeated stages (e.g. several detections) are summed."""
+    totals = {}
+    for name, seconds in timings:
+        totals[name] = totals.get(name, 0.0) + seconds
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in totals.items())
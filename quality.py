@@ -0,0 +1,128 @@
+import math
+from collections import namedtuple
+import numpy as np
+
+# ----- Face Quality Gate -----
+# Cheap checks on a detected face before it is encoded. A face that is tiny, blurry,
+# badly lit or turned away still costs a full 128-d encoding (10-20 ms) and a vector
+# search, only to score below the match threshold. The checks below work on the crop in
+# NumPy and take well under a millisecond; the pose check needs eye and nose landmarks
+# (face_recognition.face_landmarks, the 5-point "small" model costs about 1 ms per face).
+#
+# A failing face gets a reason code (REASONS) for callers to report and count. The
+# score ranks passing faces, so live loops can keep the best frame of a short burst.
+
+MIN_FACE_SIZE = 60  # Pixels, shorter side of the box
+MIN_SHARPNESS = 30.0  # Variance of the Laplacian of the crop downsampled to SHARPNESS_SIZE
+MIN_BRIGHTNESS = 40.0  # Mean grey level of the crop (0-255)
+MAX_BRIGHTNESS = 220.0
+MAX_YAW = 0.35  # Sideways nose offset from the eye midpoint, in eye distances
+MAX_ROLL = 25.0  # Degrees the eye line may tilt
+# Crops are downsampled to this size so sharpness compares across face sizes. Kept at or
+# below MIN_FACE_SIZE: upsampling a small crop would invent (or smear) the edges being measured
+SHARPNESS_SIZE = 48
+
+REASONS = ("too_small", "too_dark", "too_bright", "blurry", "turned_away", "tilted")
+
+FaceQuality = namedtuple("FaceQuality", ["ok", "reason", "score", "size", "sharpness", "brightness", "yaw", "roll"])
+
+class QualityError(ValueError):
+    """A face failed the quality gate; reason is one of REASONS."""
+
+    def __init__(self, quality):
+        super().__init__(f"Face rejected: {quality.reason}")
+        self.reason = quality.reason
+        self.quality = quality
+
+    def __reduce__(self):
+        # Rebuilt from the quality, not the message, when it crosses a process pool boundary;
+        # the instance dict keeps attributes added on the way (metrics' stage_record)
+        return QualityError, (self.quality,), self.__dict__
+
+def clip_box(box, shape):
+    height, width = shape[:2]
+    top, right, bottom, left = box
+    return (max(0, int(top)), min(width, int(right)), min(height, int(bottom)), max(0, int(left)))
+
+def to_grey(crop):
+    if crop.ndim == 2:
+        return crop.astype(np.float32)
+    return crop[..., :3].astype(np.float32) @ np.array([0.299, 0.587, 0.114], dtype=np.float32)  # RGB
+
+def _sample_points(length, size):
+    # Pixel-centre coordinates of the output grid in input pixels, split into index and weight
+    position = np.clip((np.arange(size) + 0.5) * (length / size) - 0.5, 0, length - 1)
+    low = np.minimum(position.astype(np.intp), length - 2) if length > 1 else np.zeros(size, dtype=np.intp)
+    return low, np.minimum(low + 1, length - 1), (position - low).astype(np.float32)
+
+def resample(grey, size):
+    """
+    Bilinear resize to size x size. There is deliberately no area averaging (which would
+    make a blurry large face look sharp once shrunk): neighbouring output pixels keep the
+    edge contrast of the input pixels they are sampled from.
+    """
+    top, bottom, dy = _sample_points(grey.shape[0], size)
+    left, right, dx = _sample_points(grey.shape[1], size)
+    rows = grey[top] * (1 - dy)[:, None] + grey[bottom] * dy[:, None]
+    return rows[:, left] * (1 - dx) + rows[:, right] * dx
+
+def laplacian_variance(grey, size=SHARPNESS_SIZE):
+    """Variance of the 4-neighbour Laplacian of the crop resampled to size x size."""
+    g = resample(grey, size)
+    laplacian = g[:-2, 1:-1] + g[2:, 1:-1] + g[1:-1, :-2] + g[1:-1, 2:] - 4 * g[1:-1, 1:-1]
+    return float(laplacian.var())
+
+def estimate_pose(landmarks):
+    """
+    Rough head pose from a face_landmarks() dict (5-point "small" or 68-point model).
+
+    Returns:
+        (yaw, roll): yaw as the nose's offset along the eye line from the eye midpoint, in
+            eye distances (0 when frontal), and roll as the eye line's tilt in degrees
+    """
+    left = np.mean(landmarks["left_eye"], axis=0)
+    right = np.mean(landmarks["right_eye"], axis=0)
+    nose = np.mean(landmarks["nose_tip"], axis=0)
+    eye_line = right - left
+    distance_sq = float(eye_line @ eye_line) or 1.0
+    yaw = float((nose - (left + right) / 2) @ eye_line) / distance_sq
+    roll = math.degrees(math.atan2(eye_line[1], eye_line[0]))
+    return yaw, roll
+
+def assess_face(image, box, landmarks=None, min_size=MIN_FACE_SIZE, min_sharpness=MIN_SHARPNESS,
+                min_brightness=MIN_BRIGHTNESS, max_brightness=MAX_BRIGHTNESS, max_yaw=MAX_YAW, max_roll=MAX_ROLL):
+    """
+    Checks one detected face.
+
+    Args:
+        image (numpy.ndarray): HxWx3 RGB frame (or greyscale)
+        box (tuple): (top, right, bottom, left), clipped to the frame
+        landmarks (dict): face_landmarks() entry for the face, None to skip the pose check
+
+    Returns:
+        FaceQuality: ok, reason (first failed check in REASONS order, None if ok), score
+            (0-1, higher is better, for ranking), and the measured values
+    """
+    top, right, bottom, left = clip_box(box, image.shape)
+    size = min(bottom - top, right - left)
+    if size < 3:
+        return FaceQuality(False, "too_small", 0.0, max(size, 0), 0.0, 0.0, 0.0, 0.0)
+    grey = to_grey(image[top:bottom, left:right])
+    brightness = float(grey.mean())
+    sharpness = laplacian_variance(grey)
+    yaw, roll = estimate_pose(landmarks) if landmarks else (0.0, 0.0)
+
+    failed = [
+        size < min_size,
+        brightness < min_brightness,
+        brightness > max_brightness,
+        sharpness < min_sharpness,
+        abs(yaw) > max_yaw,
+        abs(roll) > max_roll,
+    ]
+    reason = next((reason for reason, fail in zip(REASONS, failed) if fail), None)
+    score = (min(1.0, size / (2 * min_size))
+             * min(1.0, sharpness / (4 * min_sharpness))
+             * max(0.0, 1.0 - abs(brightness - 128.0) / 128.0)
+             * max(0.0, 1.0 - abs(yaw) / (2 * max_yaw)))
+    return FaceQuality(reason is None, reason, score, size, sharpness, brightness, yaw, roll)
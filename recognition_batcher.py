@@ -0,0 +1,126 @@
+import asyncio
+import inspect
+from fastapi.concurrency import run_in_threadpool
+from worker_pool import PoolSaturated
+
+# ----- Micro-batching Recognition -----
+# Requests arriving within a short window are encoded together in one worker job and
+# searched with one batched vector query; each caller still gets its own result back.
+# A larger window trades a little latency for more recognitions per second.
+
+class RecognitionBatcher:
+    """
+    Collects recognition requests into micro-batches.
+
+    Args:
+        worker_pool (WorkerPool): Pool that runs encode_batch
+        encode_batch (callable): list[bytes] -> list of (embedding, error message)
+        search_batch (callable): list[embedding] -> list of scored points per embedding;
+            coroutine functions are awaited, plain functions run in the threadpool
+        window_ms (float): How long to wait for more requests after the first one arrives
+        max_batch_size (int): Flush early once this many requests are collected
+        max_queued (int): Requests waiting for a batch before new ones get PoolSaturated,
+            defaults to 8 batches
+    """
+
+    def __init__(self, worker_pool, encode_batch, search_batch, window_ms=10, max_batch_size=16, max_queued=None):
+        self.worker_pool = worker_pool
+        self.encode_batch = encode_batch
+        self.search_batch = search_batch
+        self.window = window_ms / 1000.0
+        self.max_batch_size = max_batch_size
+        self.queue = asyncio.Queue(maxsize=max_queued or max_batch_size * 8)
+        self.collector = None
+        self.collecting = []  # Batch being collected, failed by stop() if it never runs
+        self.stopped = False
+        self.in_flight = set()  # Batch tasks, referenced so they are not garbage-collected mid-run
+
+    def start(self):
+        self.collector = asyncio.create_task(self._collect())
+
+    async def stop(self):
+        self.stopped = True
+        if self.collector:
+            self.collector.cancel()
+            try:
+                await self.collector
+            except asyncio.CancelledError:
+                pass
+        # Requests that never reached the pool would otherwise wait forever
+        waiting = self.collecting
+        while not self.queue.empty():
+            waiting.append(self.queue.get_nowait())
+        for _, future in waiting:
+            if not future.done():
+                future.set_exception(PoolSaturated("Server shutting down"))
+        self.collecting = []
+        # Let batches already handed to the pool finish before it is shut down
+        if self.in_flight:
+            await asyncio.gather(*self.in_flight, return_exceptions=True)
+
+    async def recognize(self, data):
+        """
+        Queues one upload for the next batch.
+
+        Returns:
+            (embedding, points): query embedding and its scored points, best first
+
+        Raises:
+            ValueError: If the image cannot be decoded or no face is detected
+            PoolSaturated: If the queue is full, the worker pool rejected the batch or the
+                batcher is stopping
+        """
+        if self.stopped:
+            raise PoolSaturated("Server shutting down")
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait((data, future))
+        except asyncio.QueueFull:
+            raise PoolSaturated(f"{self.queue.qsize()} recognitions already queued")
+        return await future
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = self.collecting = [await self.queue.get()]
+            deadline = loop.time() + self.window
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            # Process in the background so the next window starts collecting right away
+            self.collecting = []
+            task = asyncio.create_task(self._process(batch))
+            self.in_flight.add(task)
+            task.add_done_callback(self.in_flight.discard)
+
+    async def _process(self, batch):
+        futures = [future for _, future in batch]
+        try:
+            encoded = await self.worker_pool.run(self.encode_batch, [data for data, _ in batch])
+            found = [i for i, (embedding, _) in enumerate(encoded) if embedding is not None]
+            hits = []
+            if found:
+                embeddings = [encoded[i][0] for i in found]
+                if inspect.iscoroutinefunction(self.search_batch):
+                    hits = await self.search_batch(embeddings)
+                else:
+                    hits = await run_in_threadpool(self.search_batch, embeddings)
+        except Exception as e:
+            for future in futures:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        points_by_index = dict(zip(found, hits))
+        for i, (future, (embedding, error)) in enumerate(zip(futures, encoded)):
+            if future.done():
+                continue  # Caller went away
+            if embedding is None:
+                future.set_exception(ValueError(error))
+            else:
+                future.set_result((embedding, points_by_index[i]))
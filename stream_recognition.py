@@ -0,0 +1,241 @@
+import asyncio
+import time
+import numpy as np
+from core import face_recognition
+from starlette.websockets import WebSocketDisconnect
+from face_boxes import match_boxes
+from enrollment import user_id_of
+from face_pipeline import decode_image, detect_faces
+from liveness import LivenessTracker, eyes_from_landmark_dicts
+from quality import assess_face
+
+# ----- Streaming Recognition -----
+# A client sends a stream of JPEG frames over one WebSocket and gets back, per processed
+# frame, the tracked faces plus incremental events (face appeared / identified / live /
+# lost). Tracking and identity state live on the connection, so a face that was already
+# identified is not encoded or searched again until its identity goes stale. If frames
+# arrive faster than they can be processed, older ones are dropped.
+#
+# Faces awaiting identity are quality-checked first (see quality.py). Over a burst of
+# QUALITY_BURST frames a face is only encoded when its crop beats the best one so far,
+# and the best embedding of the burst is searched once the burst is over.
+
+IOU_MATCH = 0.3  # Minimum overlap to continue a track
+MAX_MISSES = 5  # Frames a track may go undetected before it is reported lost
+IDENTITY_TTL = 5.0  # Seconds before an identified track is searched again
+MATCH_THRESHOLD = 0.95  # Minimum cosine score to accept a match
+QUALITY_BURST = 3  # Frames over which the best crop of a face is kept before it is searched
+
+def analyze_frame(data, tracks, iou_match=IOU_MATCH):
+    """
+    Worker-side half of a stream step: stateless, so it runs in the process pool.
+
+    Args:
+        data (bytes): Encoded frame
+        tracks (list): (track_id, box, needs_identity, best_quality) for the connection's
+            current tracks, best_quality being the score of the best crop in its current burst
+
+    Returns:
+        faces (list[dict]): box, matched track_id (None when new), eye points and, for new or
+            stale faces, the quality reason code and score, plus the 128-d embedding when the
+            crop passed and beats best_quality
+    """
+    image = decode_image(data)
+    boxes = detect_faces(image)
+    if not boxes:
+        return []
+    matches = {n: o for o, n in match_boxes([track[1] for track in tracks], boxes, iou_match)}
+    landmarks = face_recognition.face_landmarks(image, boxes)
+    faces = []
+    to_encode = []
+    for n, (box, face_landmarks) in enumerate(zip(boxes, landmarks)):
+        track_id, needs_identity, best_quality = None, True, 0.0
+        if n in matches:
+            track_id, _, needs_identity, best_quality = tracks[matches[n]]
+        face = {"box": box, "track_id": track_id, "needs_identity": needs_identity, "quality": None,
+                "quality_score": 0.0, "embedding": None}
+        if needs_identity:
+            # The liveness landmarks double as the pose landmarks
+            quality = assess_face(image, box, face_landmarks)
+            face["quality"], face["quality_score"] = quality.reason, quality.score
+            if quality.ok and quality.score > best_quality:
+                to_encode.append(face)
+        faces.append(face)
+
+    eyes = eyes_from_landmark_dicts(landmarks)
+    encodings = face_recognition.face_encodings(image, known_face_locations=[face["box"] for face in to_encode])
+    for face, face_eyes in zip(faces, eyes):
+        face["eyes"] = face_eyes
+    for face, encoding in zip(to_encode, encodings):
+        face["embedding"] = encoding
+    return faces
+
+class StreamTrack:
+    def __init__(self, track_id, box):
+        self.track_id = track_id
+        self.box = box
+        self.misses = 0
+        self.user_id = None
+        self.name = None
+        self.score = 0.0
+        self.identified_at = None
+        self.live = False
+        self.best = None  # (quality score, embedding) of the best crop in the current burst
+        self.burst_frames = 0
+        self.quality = None  # Reason code of the last crop that failed the quality gate
+
+    def needs_identity(self, now, ttl):
+        return self.identified_at is None or now - self.identified_at > ttl
+
+class StreamSession:
+    """
+    Per-connection tracking, identity and liveness state.
+
+    Args:
+        worker_pool (WorkerPool): Runs analyze_frame
+        search_faces (coroutine function): list[embedding] -> scored points per embedding
+        get_user (coroutine function): point id -> user record or None
+    """
+
+    def __init__(self, worker_pool, search_faces, get_user, threshold=MATCH_THRESHOLD,
+                 identity_ttl=IDENTITY_TTL, max_misses=MAX_MISSES, quality_burst=QUALITY_BURST):
+        self.worker_pool = worker_pool
+        self.search_faces = search_faces
+        self.get_user = get_user
+        self.threshold = threshold
+        self.identity_ttl = identity_ttl
+        self.max_misses = max_misses
+        self.quality_burst = quality_burst
+        self.tracks = {}
+        self.liveness = LivenessTracker()
+        self.next_track_id = 1
+        self.frame_index = 0
+
+    async def process(self, data):
+        """Runs one frame through the pipeline and returns the message for the client."""
+        started = time.perf_counter()
+        now = time.monotonic()
+        self.frame_index += 1
+        track_list = [(t.track_id, t.box, t.needs_identity(now, self.identity_ttl), t.best[0] if t.best else 0.0)
+                      for t in self.tracks.values()]
+        faces = await self.worker_pool.run(analyze_frame, data, track_list)
+
+        events = []
+        seen = []
+        ready = []
+        for face in faces:
+            track = self.tracks.get(face["track_id"])
+            if track is None:
+                track = StreamTrack(self.next_track_id, face["box"])
+                self.next_track_id += 1
+                self.tracks[track.track_id] = track
+                events.append({"type": "face_appeared", "track_id": track.track_id})
+            track.box = face["box"]
+            track.misses = 0
+            face["track_id"] = track.track_id
+            seen.append(track.track_id)
+            if face["needs_identity"] and self._collect(track, face):
+                ready.append(track)
+
+        if faces:
+            self.liveness.update_ids(seen, np.stack([face["eyes"] for face in faces]))
+        for track_id in seen:
+            track = self.tracks[track_id]
+            if not track.live and self.liveness.is_live(track_id):
+                track.live = True
+                events.append({"type": "live", "track_id": track_id})
+
+        events.extend(await self._identify(ready, now))
+
+        for track_id in [tid for tid in self.tracks if tid not in seen]:
+            track = self.tracks[track_id]
+            track.misses += 1
+            if track.misses > self.max_misses:
+                del self.tracks[track_id]
+                self.liveness.reset(track_id)
+                events.append({"type": "face_lost", "track_id": track_id})
+
+        return {
+            "frame": self.frame_index,
+            "processing_ms": round((time.perf_counter() - started) * 1000, 1),
+            "faces": [self._describe(self.tracks[track_id]) for track_id in seen],
+            "events": events,
+        }
+
+    def _collect(self, track, face):
+        """Keeps the track's best embedding of the burst; True once the burst is over and one passed."""
+        track.quality = face["quality"]
+        if face["embedding"] is not None:
+            track.best = (face["quality_score"], face["embedding"])
+        track.burst_frames += 1
+        if track.burst_frames < self.quality_burst:
+            return False
+        track.burst_frames = 0
+        return track.best is not None
+
+    async def _identify(self, tracks, now):
+        if not tracks:
+            return []
+        events = []
+        embeddings = [track.best[1] for track in tracks]
+        for track in tracks:
+            track.best = None
+        results = await self.search_faces(embeddings)
+        for track, points in zip(tracks, results):
+            first_time, previous = track.identified_at is None, track.user_id
+            track.identified_at = now
+            track.user_id, track.name, track.score = None, None, 0.0
+            if points and points[0].score > self.threshold:
+                track.user_id, track.score = user_id_of(points[0].id), points[0].score
+                user = await self.get_user(track.user_id)
+                track.name = user["name"] if user else (points[0].payload or {}).get("name")
+            if first_time or track.user_id != previous:
+                events.append({"type": "identified", "track_id": track.track_id, "user_id": track.user_id,
+                               "name": track.name, "score": track.score})
+        return events
+
+    @staticmethod
+    def _describe(track):
+        return {"track_id": track.track_id, "box": list(track.box), "user_id": track.user_id,
+                "name": track.name, "score": track.score, "live": track.live, "quality": track.quality}
+
+async def serve_stream(websocket, session, error_message):
+    """
+    Receives frames and answers with the newest processed frame's results.
+
+    A receiver task keeps only the latest unprocessed frame, so a slow pipeline drops
+    frames instead of building up latency. error_message(exception) turns an expected
+    per-frame failure into a message for the client, or returns None to re-raise it.
+    """
+    latest = []
+    ready = asyncio.Event()
+
+    async def receive():
+        while True:
+            data = await websocket.receive_bytes()
+            latest[:] = [data]
+            ready.set()
+
+    receiver = asyncio.create_task(receive())
+    try:
+        while True:
+            waiter = asyncio.create_task(ready.wait())
+            await asyncio.wait({receiver, waiter}, return_when=asyncio.FIRST_COMPLETED)
+            if receiver.done():
+                waiter.cancel()
+                break
+            ready.clear()
+            data = latest.pop()
+            try:
+                message = await session.process(data)
+            except Exception as e:
+                message = error_message(e)
+                if message is None:
+                    raise
+            await websocket.send_json(message)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        receiver.cancel()
+        if receiver.done() and not receiver.cancelled():
+            receiver.exception()  # Normally WebSocketDisconnect; retrieved so it is not logged as unhandled
@@ -0,0 +1,78 @@
+from datetime import datetime, timezone
+import pytest
+
+from attendance import AttendanceLog, JsonlSink, SqliteSink
+
+class ListSink:
+    """Collects the batches it is given; failing=True makes every write raise."""
+
+    def __init__(self, failing=False):
+        self.failing = failing
+        self.batches = []
+
+    def write(self, records):
+        if self.failing:
+            raise ConnectionError("MongoDB unreachable")
+        self.batches.append(list(records))
+
+    @property
+    def user_ids(self):
+        return [record["user_id"] for batch in self.batches for record in batch]
+
+def test_repeat_sightings_inside_the_window_are_dropped():
+    sink = ListSink()
+    log = AttendanceLog(sink, dedupe_window=300)
+    assert log.record(1, "a") and log.record(2, "b")
+    assert not log.record(1, "a")
+    assert [record["user_id"] for record in log.record_many([{"user_id": 2}, {"user_id": 3}])] == [3]
+    assert log.flush() == 3
+    assert sink.user_ids == [1, 2, 3]
+    assert log.stats()["duplicates"] == 2
+
+def test_sightings_after_the_window_are_recorded_again():
+    log = AttendanceLog(ListSink(), dedupe_window=0)
+    assert log.record(1) and log.record(1)
+
+def test_flush_writes_in_batches_of_max_batch():
+    sink = ListSink()
+    log = AttendanceLog(sink, max_batch=2)
+    log.record_many([{"user_id": i} for i in range(5)])
+    assert log.flush() == 5
+    assert [len(batch) for batch in sink.batches] == [2, 2, 1]
+
+def test_failed_writes_stay_buffered_without_a_fallback():
+    sink = ListSink(failing=True)
+    log = AttendanceLog(sink)
+    log.record(1)
+    assert log.flush() == 0
+    assert log.stats()["buffered"] == 1 and log.stats()["failures"] == 1
+    sink.failing = False
+    assert log.flush() == 1
+    assert sink.user_ids == [1]
+
+@pytest.mark.parametrize("make_fallback", [
+    lambda tmp_path: JsonlSink(str(tmp_path / "pending.jsonl")),
+    lambda tmp_path: SqliteSink(str(tmp_path / "pending.db")),
+])
+def test_fallback_takes_failed_batches_and_replays_them_first(tmp_path, make_fallback):
+    sink = ListSink(failing=True)
+    log = AttendanceLog(sink, make_fallback(tmp_path))
+    log.record(1, "a", 0.99, timestamp=datetime(2024, 1, 1, tzinfo=timezone.utc))
+    assert log.flush() == 1
+    assert log.stats()["fallback_written"] == 1 and log.stats()["buffered"] == 0
+
+    sink.failing = False
+    log.record(2, "b")
+    log.flush()
+    assert sink.user_ids == [1, 2]  # Replayed before the new entry
+    assert sink.batches[0][0]["timestamp"] == datetime(2024, 1, 1, tzinfo=timezone.utc)
+    assert log.stats()["written"] == 2
+
+def test_entries_left_in_the_fallback_by_a_previous_run_are_replayed(tmp_path):
+    path = str(tmp_path / "pending.jsonl")
+    JsonlSink(path).write([{"user_id": 7, "timestamp": datetime.now(timezone.utc)}])
+    sink = ListSink()
+    log = AttendanceLog(sink, JsonlSink(path))
+    log.record(8)
+    log.stop()
+    assert sink.user_ids == [7, 8]
@@ -0,0 +1,80 @@
+import threading
+from types import SimpleNamespace
+import numpy as np
+import pytest
+
+from embedding_index import EmbeddingIndex
+from gallery_store import GalleryStore, MappedIndex, delete_points, upsert_points
+
+DIM = 16
+
+def gallery(count=200, seed=0):
+    return np.random.default_rng(seed).normal(size=(count, DIM)).astype(np.float32)
+
+def noisy(vectors, seed=1):
+    return vectors + 0.05 * np.random.default_rng(seed).normal(size=vectors.shape).astype(np.float32)
+
+def build(vectors, **kwargs):
+    index = EmbeddingIndex(DIM, **kwargs)
+    index.add(list(range(len(vectors))), vectors, [{"row": i} for i in range(len(vectors))])
+    return index.build()
+
+@pytest.mark.parametrize("kwargs", [
+    {"mode": "flat"},
+    {"mode": "ivf", "nlist": 8, "nprobe": 8},
+    {"precision": "float16"},
+    {"precision": "int8"},
+    {"mode": "ivf", "nlist": 8, "nprobe": 8, "precision": "int8"},
+])
+def test_finds_the_enrolled_point(kwargs):
+    vectors = gallery()
+    index = build(vectors, **kwargs)
+    results = index.search_batch(noisy(vectors[:20]), 3)
+    assert [matches[0].id for matches in results] == list(range(20))
+    assert all(matches[0].payload == {"row": matches[0].id} for matches in results)
+    assert all(matches[0].score >= matches[1].score for matches in results)
+
+@pytest.mark.parametrize("precision", ["float16", "int8"])
+def test_quantised_scores_stay_close_to_float32(precision):
+    vectors = gallery()
+    exact, quantised = build(vectors), build(vectors, precision=precision)
+    queries = noisy(vectors[:20])
+    for exact_matches, matches in zip(exact.search_batch(queries, 1), quantised.search_batch(queries, 1)):
+        assert abs(exact_matches[0].score - matches[0].score) < 0.01
+
+def test_remove_keeps_the_other_points_searchable():
+    vectors = gallery(50)
+    index = build(vectors, mode="ivf", nlist=4, nprobe=4)
+    index.remove([0, 10, 49, 1234])
+    assert len(index) == 47
+    found = [matches[0].id for matches in index.search_batch(vectors, 1)]
+    assert all(found[i] == i for i in range(50) if i not in (0, 10, 49))
+    assert not {0, 10, 49} & set(found)
+
+def test_upsert_replaces_a_point():
+    vectors = gallery(10)
+    index = build(vectors)
+    index.add([3], vectors[7:8], [{"row": "moved"}])
+    assert len(index) == 10
+    assert [match.id for match in index.search(vectors[7], 2)] in ([3, 7], [7, 3])
+
+def test_empty_index_returns_no_matches():
+    assert EmbeddingIndex(DIM).search_batch(gallery(2), 1) == [[], []]
+
+@pytest.mark.parametrize("mapped", [False, True])
+def test_store_writes_happen_outside_the_index_lock(tmp_path, mapped):
+    store = GalleryStore(str(tmp_path), DIM)
+    index = MappedIndex(store) if mapped else EmbeddingIndex.from_store(store)
+    vectors = gallery(3)
+    lock = threading.Lock()
+    append = store.append
+
+    def checked_append(*args, **kwargs):
+        assert not lock.locked()
+        return append(*args, **kwargs)
+
+    store.append = checked_append
+    upsert_points(index, [SimpleNamespace(id=i, vector=vectors[i], payload=None) for i in range(3)], lock)
+    delete_points(index, [1], lock)
+    assert len(index) == 2
+    assert [matches[0].id for matches in index.search_batch(vectors[[0, 2]], 1)] == [0, 2]
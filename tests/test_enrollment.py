@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("qdrant_client")
+
+from enrollment import (MAX_PROTOTYPES, PROTOTYPE_ID_OFFSET, build_template, parse_user_id, prototype_ids,
+                        stale_prototype_ids, template_points, user_id_of)
+
+DIM = 128
+
+def samples(count, spread=0.1, seed=0):
+    rng = np.random.default_rng(seed)
+    person = rng.normal(size=DIM)
+    return person + spread * np.linalg.norm(person) / np.sqrt(DIM) * rng.normal(size=(count, DIM))
+
+def test_outlier_sample_is_rejected():
+    embeddings = np.vstack([samples(6), np.random.default_rng(9).normal(size=(1, DIM))])  # Someone else
+    template = build_template(embeddings)
+    assert template.inliers.tolist() == [True] * 6 + [False]
+    assert np.isclose(np.linalg.norm(template.centroid), 1.0)
+    assert template.similarities[:6].min() > 0.9 > template.similarities[6]
+
+def test_prototypes_are_bounded_distinct_inliers():
+    template = build_template(samples(10))
+    assert 0 < len(template.prototypes) <= MAX_PROTOTYPES
+    pairwise = template.prototypes @ template.prototypes.T
+    assert (pairwise[~np.eye(len(pairwise), dtype=bool)] < 0.999).all()
+
+def test_duplicate_samples_add_no_prototypes():
+    template = build_template(np.repeat(samples(1), 4, axis=0))
+    assert len(template.prototypes) == 0 and template.inliers.all()
+
+def test_no_samples_is_an_error():
+    with pytest.raises(ValueError):
+        build_template(np.empty((0, DIM)))
+
+def test_point_ids_map_back_to_the_user():
+    template = build_template(samples(10))
+    points = template_points(42, template, {"name": "a"})
+    assert [point.id for point in points] == [42] + prototype_ids(42, len(template.prototypes))
+    assert {user_id_of(point.id) for point in points} == {42}
+    assert all(point.payload["user_id"] == 42 and point.payload["name"] == "a" for point in points)
+    assert [point.payload["kind"] for point in points] == ["centroid"] + ["prototype"] * len(template.prototypes)
+
+def test_stale_prototype_ids_are_the_unused_slots():
+    template = build_template(samples(10))
+    used = len(template.prototypes)
+    assert stale_prototype_ids(7, template) == prototype_ids(7)[used:]
+    assert stale_prototype_ids(7, build_template(samples(1))) == prototype_ids(7)  # Single sample: all of them
+    assert set(stale_prototype_ids(7, template)).isdisjoint(point.id for point in template_points(7, template))
+
+@pytest.mark.parametrize("user_id", ["abc", "-1", "1.5", str(PROTOTYPE_ID_OFFSET)])
+def test_parse_user_id_rejects_ids_outside_the_centroid_range(user_id):
+    with pytest.raises(ValueError):
+        parse_user_id(user_id)
+
+def test_parse_user_id():
+    assert parse_user_id("123") == 123
@@ -0,0 +1,72 @@
+import os
+import numpy as np
+
+from gallery_store import GalleryStore, MappedIndex
+
+DIM = 4
+
+def vectors(*axes):
+    return np.eye(DIM, dtype=np.float32)[list(axes)]
+
+def test_append_is_visible_to_other_handles(tmp_path):
+    writer, reader = GalleryStore(str(tmp_path), DIM), GalleryStore(str(tmp_path), DIM)
+    assert writer.append([1, 2], vectors(0, 1), [{"name": "a"}, None]) == 2
+    assert len(reader) == 0
+    assert reader.refresh() == 2
+    assert reader.ids.tolist() == [1, 2]
+    assert reader.payload(0) == {"name": "a"} and reader.payload(1) is None
+    np.testing.assert_allclose(reader.embeddings, vectors(0, 1))
+
+def test_latest_record_wins_and_tombstones_delete(tmp_path):
+    store = GalleryStore(str(tmp_path), DIM)
+    store.append([1, 2, 1], vectors(0, 1, 2))
+    store.delete([2])
+    assert store.latest_rows() == {1: 2, 2: 3}
+    assert store.is_tombstone(np.array([2, 3])).tolist() == [False, True]
+    index = MappedIndex(store)
+    assert len(index) == 1
+    assert [match.id for match in index.search(vectors(2)[0], 5)] == [1]
+
+def test_uncommitted_bytes_are_dropped_on_the_next_append(tmp_path):
+    store = GalleryStore(str(tmp_path), DIM)
+    store.append([1], vectors(0))
+    with open(os.path.join(str(tmp_path), "ids.i64"), "ab") as f:
+        f.write(b"\0" * 8)  # A writer that crashed before updating meta.json
+    store.append([2], vectors(1))
+    assert store.ids.tolist() == [1, 2]
+
+def test_compact_keeps_the_newest_live_records(tmp_path):
+    store = GalleryStore(str(tmp_path), DIM)
+    store.append([1, 2, 3, 1], vectors(0, 1, 2, 3), [{"v": 1}, {"v": 2}, {"v": 3}, {"v": 4}])
+    store.delete([2])
+    assert store.compact() == 2
+    assert dict(zip(store.ids.tolist(), (store.payload(row) for row in range(2)))) == {1: {"v": 4}, 3: {"v": 3}}
+    assert store.generation == 1
+    store.append([4], vectors(0))  # Appends go to the compacted files
+    assert GalleryStore(str(tmp_path), DIM).ids.tolist() == [3, 1, 4]
+
+def test_refresh_racing_a_compaction_maps_a_consistent_generation(tmp_path):
+    writer, reader = GalleryStore(str(tmp_path), DIM), GalleryStore(str(tmp_path), DIM)
+    writer.append([1, 1, 1, 2], vectors(0, 1, 2, 3))
+    read_meta = reader._read_meta
+
+    def compact_after_reading_meta():
+        meta = read_meta()
+        reader._read_meta = read_meta
+        writer.compact()  # Old files are replaced and removed before the reader maps them
+        return meta
+
+    reader._read_meta = compact_after_reading_meta
+    assert reader.refresh() == 2
+    assert reader.generation == 1
+    assert reader.ids.tolist() == [1, 2]
+    np.testing.assert_allclose(reader.embeddings, vectors(2, 3))
+
+def test_mapped_readers_keep_their_generation_until_they_refresh(tmp_path):
+    writer, reader = GalleryStore(str(tmp_path), DIM), GalleryStore(str(tmp_path), DIM)
+    writer.append([1, 1], vectors(0, 1))
+    reader.refresh()
+    writer.compact()
+    assert reader.ids.tolist() == [1, 1]  # Old generation still mapped
+    reader.refresh()
+    assert reader.ids.tolist() == [1]
@@ -0,0 +1,131 @@
+import threading
+from types import SimpleNamespace
+import numpy as np
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+
+from embedding_index import EmbeddingIndex
+from gallery_store import GalleryStore, MappedIndex, upsert_points
+from gallery_sync import CHANGES_COLLECTION, Change, ChangeLog, GallerySync, MongoChangeFeed
+
+DIM = 4
+
+class DictCache(dict):
+    def put(self, key, value):
+        self[key] = value
+
+    def invalidate(self, key):
+        self.pop(key, None)
+
+def point(point_id, axis):
+    return SimpleNamespace(id=point_id, vector=np.eye(DIM)[axis].tolist(), payload={"name": f"user{point_id}"})
+
+def upsert_change(version, point_id, axis=None):
+    axis = point_id if axis is None else axis
+    return Change(version, "point", "upsert", point_id, np.eye(DIM)[axis].tolist(), {"version": version})
+
+@pytest.fixture
+def database():
+    return mongomock.MongoClient().db
+
+def reader(database, **kwargs):
+    feed = MongoChangeFeed(database)
+    feed.streams_supported = False
+    return GallerySync(EmbeddingIndex(DIM), DictCache(), feed.head(), **kwargs), feed
+
+def nearest(index, axis):
+    return index.search(np.eye(DIM)[axis])[0].id
+
+def test_applies_recorded_changes_in_order(database):
+    log = ChangeLog(database)
+    sync, feed = reader(database)
+    with log.recording(points=[point(1, 0)], users=[{"_id": 1, "name": "user1"}]):
+        pass
+    with log.recording(deleted_points=[1]):
+        pass
+    assert sync.pull(feed) == 3
+    assert sync.cursor == 3
+    assert 1 not in sync.index.rows
+    assert sync.user_cache[1]["name"] == "user1"
+
+def test_failed_write_records_nothing(database):
+    log = ChangeLog(database)
+    with pytest.raises(RuntimeError):
+        with log.recording(points=[point(1, 0)]):
+            raise RuntimeError("Qdrant unavailable")
+    assert database[CHANGES_COLLECTION].count_documents({}) == 0
+
+def test_slow_write_is_applied_once_it_lands(database):
+    log = ChangeLog(database)
+    sync, feed = reader(database)
+    slow = log.prepare(points=[point(1, 0)])  # Writer still busy with Qdrant
+    log.record(points=[point(2, 1)])
+    assert sync.pull(feed) == 1
+    assert sync.cursor == 2 and sync.missing_versions() == [1]
+
+    log.commit(slow)
+    assert sync.pull(feed) == 1
+    assert sorted(sync.index.rows) == [1, 2]
+    assert sync.missing_versions() == []
+
+def test_late_change_does_not_overwrite_a_newer_one(database):
+    log = ChangeLog(database)
+    sync, feed = reader(database)
+    slow = log.prepare(points=[point(1, 0)])
+    log.record(points=[point(1, 2)])  # Re-enrolled meanwhile
+    sync.pull(feed)
+    log.commit(slow)
+    assert sync.pull(feed) == 0
+    assert nearest(sync.index, 2) == 1 and sync.stats()["stale"] == 1
+
+def test_missing_version_is_given_up_after_the_late_window(database):
+    log = ChangeLog(database)
+    sync, feed = reader(database, late_window=0)
+    log.prepare(points=[point(1, 0)])  # Its writer failed
+    log.record(points=[point(2, 1)])
+    sync.pull(feed)
+    assert sync.missing_versions() == [] and sync.stats()["given_up"] == 1
+    assert sync.key_versions == {}
+
+def test_expire_after_adds_a_ttl_index(database):
+    ChangeLog(database).expire_after(3600)
+    indexes = database[CHANGES_COLLECTION].index_information().values()
+    assert any(index.get("expireAfterSeconds") == 3600 and index["key"] == [("at", 1)] for index in indexes)
+
+def test_shared_store_writes_each_change_once(tmp_path):
+    first, second = (GallerySync(MappedIndex(GalleryStore(str(tmp_path), DIM))) for _ in range(2))
+    for sync in (first, second):
+        sync.apply([upsert_change(1, 1), upsert_change(3, 3)])
+    for sync in (first, second):
+        sync.apply([upsert_change(2, 2)])  # Found late
+    store = first.index.store
+    store.refresh()
+    assert sorted(store.ids.tolist()) == [1, 2, 3]
+    assert nearest(first.index, 2) == 2
+
+def test_local_writes_are_not_appended_again_by_sync(tmp_path, database):
+    log = ChangeLog(database)
+    index = MappedIndex(GalleryStore(str(tmp_path), DIM))
+    sync, feed = GallerySync(index, cursor=0), MongoChangeFeed(database)
+    feed.streams_supported = False
+    points = [point(1, 0)]
+    with log.recording(points=points):  # Stamps the payload version the store compares against
+        pass
+    upsert_points(index, points, threading.Lock())
+    sync.pull(feed)
+    assert index.store.ids.tolist() == [1]
+
+def test_store_is_written_outside_the_index_lock(tmp_path):
+    lock = threading.Lock()
+    store = GalleryStore(str(tmp_path), DIM)
+    apply_changes = store.apply_changes
+
+    def checked_apply_changes(changes):
+        assert not lock.locked()
+        return apply_changes(changes)
+
+    store.apply_changes = checked_apply_changes
+    sync = GallerySync(EmbeddingIndex.from_store(store), index_lock=lock)
+    sync.apply([upsert_change(1, 1), Change(2, "point", "delete", 1, None, None), upsert_change(3, 3)])
+    assert list(sync.index.rows) == [3]
@@ -0,0 +1,52 @@
+import numpy as np
+
+from liveness import LivenessTracker, eye_aspect_ratios, eyes_from_landmark_dicts, eyes_from_shapes
+
+def eye(openness):
+    """Six landmark points of a 30 px wide eye whose lids are `openness` * 30 px apart."""
+    half = openness * 15
+    return [(0, 0), (10, -half), (20, -half), (30, 0), (20, half), (10, half)]
+
+def face(left=0.3, right=0.3):
+    return [eye(left), eye(right)]
+
+def reference_ear(points):
+    p = np.asarray(points, dtype=np.float64)
+    vertical = np.linalg.norm(p[1] - p[5]) + np.linalg.norm(p[2] - p[4])
+    return vertical / (2.0 * np.linalg.norm(p[0] - p[3]))
+
+def test_vectorised_ear_matches_the_per_eye_formula():
+    rng = np.random.default_rng(0)
+    eyes = rng.uniform(0, 100, size=(5, 2, 6, 2)).astype(np.float32)
+    expected = [(reference_ear(left) + reference_ear(right)) / 2 for left, right in eyes]
+    np.testing.assert_allclose(eye_aspect_ratios(eyes), expected, rtol=1e-5)
+
+def test_ear_of_open_and_closed_eyes():
+    ears = eye_aspect_ratios(np.array([face(0.3, 0.3), face(0.05, 0.05), face(0.3, 0.05)], dtype=np.float32))
+    np.testing.assert_allclose(ears, [0.3, 0.05, 0.175], rtol=1e-5)
+
+def test_degenerate_eye_does_not_divide_by_zero():
+    assert np.isfinite(eye_aspect_ratios(np.zeros((1, 2, 6, 2), dtype=np.float32))).all()
+
+def test_landmark_layouts_give_the_same_eyes():
+    shapes = np.zeros((1, 68, 2), dtype=np.float32)
+    shapes[0, 42:48], shapes[0, 36:42] = eye(0.2), eye(0.4)
+    from_dicts = eyes_from_landmark_dicts([{"left_eye": eye(0.2), "right_eye": eye(0.4)}])
+    np.testing.assert_array_equal(eyes_from_shapes(shapes), from_dicts)
+
+def test_blink_is_counted_per_face():
+    tracker = LivenessTracker(ear_thresh=0.2, consec_frames=2, required_blinks=1)
+    frames = [(0.3, 0.3), (0.05, 0.3), (0.05, 0.05), (0.3, 0.3), (0.3, 0.3)]  # Face 1 blinks, face 2 closes only once
+    for first, second in frames:
+        tracker.update_ids([1, 2], np.array([face(first, first), face(second, second)], dtype=np.float32))
+    assert tracker.is_live(1) and not tracker.is_live(2)
+    assert tracker.faces[1].blinks == 1 and tracker.faces[2].blinks == 0
+
+def test_faces_are_followed_by_box_overlap():
+    tracker = LivenessTracker()
+    boxes = [(0, 100, 100, 0), (0, 400, 100, 300)]
+    first = tracker.update(boxes, np.array([face(), face()], dtype=np.float32))
+    moved = [(5, 105, 105, 5), (0, 400, 100, 300)]
+    second = tracker.update(moved[::-1], np.array([face(), face()], dtype=np.float32))
+    assert [state.face_id for state in second] == [first[1].face_id, first[0].face_id]
+    assert second[1].box == moved[0]
@@ -0,0 +1,66 @@
+import pickle
+import numpy as np
+import pytest
+
+from quality import MIN_FACE_SIZE, QualityError, assess_face, estimate_pose, laplacian_variance
+
+def face(size, level=130.0, seed=0):
+    """RGB stand-in for a face crop: shading plus feature-sized light and dark patches."""
+    rng = np.random.default_rng(seed)
+    patches = rng.uniform(-50, 50, size=(12, 12))
+    cells = np.minimum(np.mgrid[0:size, 0:size] * 12 // size, 11)
+    grey = level + 20 * np.linspace(-1, 1, size)[None, :] + patches[cells[0], cells[1]]
+    return np.repeat(np.clip(grey, 0, 255)[..., None], 3, axis=2).astype(np.uint8)
+
+def blur(image, sigma):
+    radius = int(3 * sigma) + 1
+    kernel = np.exp(-np.arange(-radius, radius + 1) ** 2 / (2 * sigma ** 2))
+    kernel /= kernel.sum()
+    padded = np.pad(image.astype(np.float32), ((radius, radius), (radius, radius), (0, 0)), mode="edge")
+    padded = np.apply_along_axis(np.convolve, 0, padded, kernel, "valid")
+    return np.apply_along_axis(np.convolve, 1, padded, kernel, "valid").astype(np.uint8)
+
+def box(image):
+    height, width = image.shape[:2]
+    return (0, width, height, 0)
+
+def assess(image, landmarks=None):
+    return assess_face(image, box(image), landmarks)
+
+@pytest.mark.parametrize("size", [MIN_FACE_SIZE, 61, 63, 64, 120, 240])
+def test_sharp_face_passes(size):
+    quality = assess(face(size))
+    assert quality.ok and quality.reason is None and quality.size == size
+
+@pytest.mark.parametrize("size", [MIN_FACE_SIZE, 61, 63, 64, 120, 240])
+def test_blurry_face_fails_at_any_size(size):
+    quality = assess(blur(face(size), 0.05 * size))
+    assert quality.reason == "blurry"
+
+def test_sharpness_does_not_depend_on_face_size():
+    sharpness = [laplacian_variance(blur(face(size), 0.02 * size)[..., 0].astype(np.float32))
+                 for size in (MIN_FACE_SIZE, 63, 64, 120, 480)]
+    assert max(sharpness) < 1.25 * min(sharpness)
+
+def test_small_dark_and_bright_faces_fail():
+    assert assess(face(MIN_FACE_SIZE - 1)).reason == "too_small"
+    assert assess(face(80, level=10)).reason == "too_dark"
+    assert assess(face(80, level=245)).reason == "too_bright"
+    assert assess(face(2)).reason == "too_small"
+
+def test_pose_checks():
+    frontal = {"left_eye": [(20, 30)], "right_eye": [(60, 30)], "nose_tip": [(40, 50)]}
+    turned = {**frontal, "nose_tip": [(58, 50)]}
+    tilted = {**frontal, "right_eye": [(60, 60)]}
+    assert estimate_pose(frontal) == (0.0, 0.0)
+    assert assess(face(80), frontal).ok
+    assert assess(face(80), turned).reason == "turned_away"
+    assert assess(face(80), tilted).reason == "tilted"
+
+def test_score_prefers_the_sharper_face():
+    assert assess(face(120)).score > assess(blur(face(120), 4.0)).score  # Close to the threshold
+
+def test_quality_error_survives_pickling():
+    quality = assess(blur(face(80), 4.0))
+    error = pickle.loads(pickle.dumps(QualityError(quality)))
+    assert isinstance(error, ValueError) and error.reason == "blurry" and error.quality == quality
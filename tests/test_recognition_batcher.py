@@ -0,0 +1,80 @@
+import asyncio
+import pytest
+
+pytest.importorskip("fastapi")
+
+from recognition_batcher import RecognitionBatcher
+from worker_pool import PoolSaturated
+
+class InlinePool:
+    """Runs jobs on the event loop thread, counting calls; saturated=True rejects them."""
+
+    def __init__(self, saturated=False):
+        self.saturated = saturated
+        self.calls = []
+
+    async def run(self, fn, *args):
+        if self.saturated:
+            raise PoolSaturated("busy")
+        self.calls.append(args)
+        return fn(*args)
+
+def encode_batch(datas):
+    return [(None, "No face detected") if data == b"blank" else (len(data), None) for data in datas]
+
+async def search_batch(embeddings):
+    return [[f"match-{embedding}"] for embedding in embeddings]
+
+def run(coro):
+    return asyncio.run(coro)
+
+def test_concurrent_requests_share_one_batch():
+    async def scenario():
+        pool = InlinePool()
+        batcher = RecognitionBatcher(pool, encode_batch, search_batch, window_ms=20)
+        batcher.start()
+        results = await asyncio.gather(batcher.recognize(b"a"), batcher.recognize(b"bb"),
+                                       batcher.recognize(b"blank"), return_exceptions=True)
+        await batcher.stop()
+        return pool, results
+
+    pool, results = run(scenario())
+    assert len(pool.calls) == 1
+    assert results[0] == (1, ["match-1"]) and results[1] == (2, ["match-2"])
+    assert isinstance(results[2], ValueError)
+
+def test_saturated_pool_fails_every_request_in_the_batch():
+    async def scenario():
+        batcher = RecognitionBatcher(InlinePool(saturated=True), encode_batch, search_batch, window_ms=20)
+        batcher.start()
+        results = await asyncio.gather(batcher.recognize(b"a"), batcher.recognize(b"b"), return_exceptions=True)
+        await batcher.stop()
+        return results
+
+    assert all(isinstance(result, PoolSaturated) for result in run(scenario()))
+
+def test_full_queue_rejects_new_requests():
+    async def scenario():
+        batcher = RecognitionBatcher(InlinePool(), encode_batch, search_batch, max_batch_size=1, max_queued=2)
+        waiting = [asyncio.ensure_future(batcher.recognize(b"a")) for _ in range(2)]  # Not started: nobody collects
+        await asyncio.sleep(0)
+        with pytest.raises(PoolSaturated):
+            await batcher.recognize(b"a")
+        await batcher.stop()
+        return await asyncio.gather(*waiting, return_exceptions=True)
+
+    assert all(isinstance(result, PoolSaturated) for result in run(scenario()))
+
+def test_stop_fails_requests_that_never_reached_the_pool():
+    async def scenario():
+        batcher = RecognitionBatcher(InlinePool(), encode_batch, search_batch, window_ms=10_000)
+        batcher.start()
+        pending = asyncio.ensure_future(batcher.recognize(b"a"))
+        await asyncio.sleep(0.01)  # Picked up by the collector, which is still waiting for more
+        await batcher.stop()
+        with pytest.raises(PoolSaturated):
+            await pending
+        with pytest.raises(PoolSaturated):
+            await batcher.recognize(b"a")
+
+    run(scenario())
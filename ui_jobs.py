@@ -0,0 +1,147 @@
+import queue
+import threading
+import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
+
+# ----- Background Jobs for the Desktop App -----
+# Tk is single-threaded: anything slow run from a button callback (camera capture,
+# encoding, Qdrant/Mongo/Cloudinary calls, text-to-speech) freezes the window. JobRunner
+# runs that work on a thread pool and hands results back to the Tk thread, which polls a
+# queue with root.after; only that thread touches widgets and message boxes. Speech goes
+# through its own thread, because pyttsx3's runAndWait blocks until the sentence is spoken.
+# Camera previews from jobs are drawn by FramePreview on the Tk thread too: OpenCV's own
+# windows (cv2.imshow) are not safe to drive from a job thread next to the Tk mainloop.
+
+class Speaker:
+    """Speaks queued sentences one after another on a dedicated thread."""
+
+    def __init__(self, init_engine):
+        self.init_engine = init_engine  # The engine is created on the speech thread, which then owns it
+        self.sentences = queue.Queue()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def say(self, text):
+        self.sentences.put(text)
+
+    def stop(self):
+        self.sentences.put(None)
+
+    def _run(self):
+        engine = self.init_engine()
+        while True:
+            text = self.sentences.get()
+            if text is None:
+                break
+            try:
+                engine.say(text)
+                engine.runAndWait()
+            except Exception as e:
+                print(f"Speech failed: {e}")
+
+class JobRunner:
+    """
+    Runs blocking jobs off the Tk thread.
+
+    Args:
+        root (tk.Tk): Window whose event loop receives the results
+        workers (int): Jobs that may run at the same time
+        on_change (callable): Called on the Tk thread with the number of running jobs
+        poll_ms (int): How often the Tk thread checks for finished jobs
+    """
+
+    def __init__(self, root, workers=4, on_change=None, poll_ms=50):
+        self.root = root
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ui-job")
+        self.finished = queue.Queue()
+        self.on_change = on_change
+        self.poll_ms = poll_ms
+        self.active = 0
+        self.root.after(self.poll_ms, self._poll)
+
+    def submit(self, fn, *args, on_done=None, on_error=None):
+        """
+        Queues fn(*args). on_done(result) or on_error(exception) then runs on the Tk thread,
+        so they may update widgets and show message boxes.
+        """
+        self.active += 1
+        self._changed()
+        future = self.executor.submit(fn, *args)
+        future.add_done_callback(lambda f: self.finished.put((f, on_done, on_error)))
+        return future
+
+    def _poll(self):
+        while True:
+            try:
+                future, on_done, on_error = self.finished.get_nowait()
+            except queue.Empty:
+                break
+            self.active -= 1
+            self._changed()
+            error = future.exception()
+            if error is not None:
+                if on_error is not None:
+                    on_error(error)
+                else:
+                    print(f"Background job failed: {error!r}")
+            elif on_done is not None:
+                on_done(future.result())
+        self.root.after(self.poll_ms, self._poll)
+
+    def _changed(self):
+        if self.on_change is not None:
+            self.on_change(self.active)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+class FramePreview:
+    """
+    Shows frames handed over by job threads in a Tk window.
+
+    show() and close() may be called from any thread; the Tk thread picks up the newest
+    frame every poll_ms, so a slow redraw drops frames instead of queueing them.
+
+    Args:
+        root (tk.Tk): Window whose event loop draws the preview
+        title (str): Preview window title
+    """
+
+    _CLOSE = object()
+
+    def __init__(self, root, title="Camera Feed", poll_ms=30):
+        self.root = root
+        self.title = title
+        self.poll_ms = poll_ms
+        self.pending = None
+        self.lock = threading.Lock()
+        self.window = None
+        self.label = None
+        self.photo = None  # Tk drops images nothing in Python references
+        self.root.after(self.poll_ms, self._poll)
+
+    def show(self, data):
+        """Queues a frame as PNG or GIF data (bytes or base64), as tk.PhotoImage accepts it."""
+        with self.lock:
+            self.pending = data
+
+    def close(self):
+        with self.lock:
+            self.pending = self._CLOSE
+
+    def _poll(self):
+        with self.lock:
+            data, self.pending = self.pending, None
+        if data is self._CLOSE:
+            if self.window is not None:
+                self.window.destroy()
+            self.window = self.label = self.photo = None
+        elif data is not None:
+            if self.window is None:
+                self.window = tk.Toplevel(self.root)
+                self.window.title(self.title)
+                self.label = tk.Label(self.window)
+                self.label.pack()
+            self.photo = tk.PhotoImage(data=data)
+            self.label.configure(image=self.photo)
+        self.root.after(self.poll_ms, self._poll)
@@ -0,0 +1,145 @@
+import hashlib
+import io
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from core import configure_cloudinary
+
+# ----- Face Crop Upload Queue -----
+# Enrollment hands the JPEG-encoded crop to this queue and moves on; uploads happen in
+# the background with bounded concurrency and retries, and the caller's callback fills
+# in the stored URL (e.g. the user's face_image_url) once it is known. Crops are keyed
+# by a hash of their bytes, so an identical crop is uploaded only once, and a second
+# submit while the first is still in flight shares its result.
+#
+# Backends: CloudinaryBackend for production, DirectoryBackend (a local folder) for
+# testing and offline use.
+
+class CloudinaryBackend:
+    """
+    Uploads to Cloudinary from memory. The content hash is the public id, so re-uploads overwrite in place.
+
+    config (dict) holds the cloudinary.config() arguments, applied once before the first upload.
+    """
+
+    def __init__(self, folder="faces", config=None):
+        self.folder = folder
+        self.config = config or {}
+
+    def upload(self, data, key):
+        import cloudinary.uploader
+        configure_cloudinary(**self.config)
+        result = cloudinary.uploader.upload(io.BytesIO(data), public_id=key, folder=self.folder, overwrite=False)
+        return result["secure_url"]
+
+class DirectoryBackend:
+    """Stores crops as <key>.jpg in a local directory; returns base_url + name, or the file path."""
+
+    def __init__(self, directory, base_url=None):
+        self.directory = directory
+        self.base_url = base_url
+        os.makedirs(directory, exist_ok=True)
+
+    def upload(self, data, key):
+        name = f"{key}.jpg"
+        path = os.path.join(self.directory, name)
+        if not os.path.exists(path):
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        return f"{self.base_url.rstrip('/')}/{name}" if self.base_url else path
+
+class UploadQueue:
+    """
+    Background, deduplicated uploads.
+
+    Args:
+        backend: Object with upload(data, key) -> url (CloudinaryBackend, DirectoryBackend)
+        concurrency (int): Uploads running at the same time
+        retries (int): Extra attempts after a failed upload
+        backoff (float): Delay before the first retry, doubled for every further one
+    """
+
+    def __init__(self, backend, concurrency=4, retries=3, backoff=0.5):
+        self.backend = backend
+        self.retries = retries
+        self.backoff = backoff
+        self.executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="upload")
+        self.lock = threading.Lock()
+        self.urls = {}  # content key -> url of finished uploads
+        self.in_flight = {}  # content key -> Future
+        self.uploaded = 0
+        self.deduplicated = 0
+        self.retried = 0
+        self.failed = 0
+
+    @staticmethod
+    def key(data):
+        return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+    def submit(self, data, on_done=None, on_error=None):
+        """
+        Queues data for upload and returns a Future for its URL.
+
+        on_done(url) / on_error(exception) run on the upload thread when it finishes, or
+        right away if these bytes were already uploaded.
+        """
+        key = self.key(data)
+        with self.lock:
+            future = self.in_flight.get(key)
+            if future is None and key in self.urls:
+                future = Future()
+                future.set_result(self.urls[key])
+            if future is not None:
+                self.deduplicated += 1
+            else:
+                future = self.executor.submit(self._upload, data, key)
+                self.in_flight[key] = future
+        if on_done is not None or on_error is not None:
+            future.add_done_callback(lambda f: _report(f, on_done, on_error))
+        return future
+
+    def _upload(self, data, key):
+        delay = self.backoff
+        try:
+            for attempt in range(self.retries + 1):
+                try:
+                    url = self.backend.upload(data, key)
+                    break
+                except Exception:
+                    if attempt == self.retries:
+                        with self.lock:
+                            self.failed += 1
+                        raise
+                    with self.lock:
+                        self.retried += 1
+                    time.sleep(delay)
+                    delay *= 2
+            with self.lock:
+                self.urls[key] = url
+                self.uploaded += 1
+            return url
+        finally:
+            with self.lock:
+                self.in_flight.pop(key, None)
+
+    def stats(self):
+        with self.lock:
+            return {"pending": len(self.in_flight), "uploaded": self.uploaded, "deduplicated": self.deduplicated,
+                    "retried": self.retried, "failed": self.failed}
+
+    def shutdown(self, wait=True):
+        """Stops accepting uploads; with wait=True, returns once queued uploads have finished."""
+        self.executor.shutdown(wait=wait)
+
+def _report(future, on_done, on_error):
+    error = future.exception()
+    if error is None:
+        if on_done is not None:
+            on_done(future.result())
+    elif on_error is not None:
+        on_error(error)
+    else:
+        print(f"Upload failed: {error!r}")
@@ -0,0 +1,77 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from core import warm_up
+from metrics import run_with_stages
+
+# ----- Bounded Worker Pool -----
+# Runs the CPU-heavy dlib detection/encoding off the asyncio event loop. The number of
+# jobs in flight (running + queued) is capped so a burst of uploads is rejected early
+# instead of piling up behind slow HOG detections. Stage timings recorded inside a job
+# (see metrics.py) come back with its result and are applied on the caller's side.
+
+PRELOAD_MODULES = ["face_recognition", "face_pipeline"]  # Importing face_recognition loads the dlib models
+
+class PoolSaturated(Exception):
+    """Raised when the pool already has max_pending jobs in flight."""
+
+def preload_models():
+    # Each worker pays for loading the models up front instead of on its first request.
+    # Forked from a process that already warmed up, this is a no-op.
+    warm_up()
+
+class WorkerPool:
+    """
+    Executes blocking functions in a process or thread pool with backpressure.
+
+    Args:
+        mode (str): "process" (default, scales across cores) or "thread"
+        workers (int): Number of workers, defaults to the CPU count
+        max_pending (int): Maximum jobs in flight before PoolSaturated is raised
+        initializer (callable): Run once in every worker, defaults to preload_models
+        start_method (str): Process start method, None for the platform default. With
+            "forkserver" the preload modules are imported once in the fork server, whose
+            workers then share them copy-on-write. Avoid "fork" once the process runs other
+            threads (event loop threadpool, database clients): a lock held by one of them at
+            fork time stays locked forever in the worker
+        preload (list): Modules the fork server imports before forking workers
+    """
+
+    def __init__(self, mode="process", workers=None, max_pending=None, initializer=preload_models, start_method=None,
+                 preload=PRELOAD_MODULES):
+        workers = workers or os.cpu_count() or 1
+        if mode == "process":
+            context = multiprocessing.get_context(start_method) if start_method else None
+            if start_method == "forkserver":
+                context.set_forkserver_preload(list(preload))
+            self.executor = ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=initializer)
+        elif mode == "thread":
+            self.executor = ThreadPoolExecutor(max_workers=workers, initializer=initializer)
+        else:
+            raise ValueError(f"Unknown worker mode: {mode}")
+        self.mode = mode
+        self.workers = workers
+        self.max_pending = max_pending or workers * 4
+        self.pending = 0  # Only touched from the event loop thread
+
+    async def run(self, fn, *args):
+        if self.pending >= self.max_pending:
+            raise PoolSaturated(f"{self.pending} jobs already pending")
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            result, record = await loop.run_in_executor(self.executor, run_with_stages, fn, *args)
+        except Exception as e:
+            record = getattr(e, "stage_record", None)
+            if record is not None:
+                record.apply()
+            raise
+        else:
+            record.apply()
+            return result
+        finally:
+            self.pending -= 1
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)